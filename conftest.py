@@ -0,0 +1,7 @@
+import pytest
+
+
+@pytest.fixture(autouse=True)
+def thumbnails_inline(settings):
+    # фоновая задача пула миниатюр пережила бы тест и его базу
+    settings.THUMBNAIL_WORKERS = 0
@@ -0,0 +1,62 @@
+"""Сериализация лент в JSON без экземпляров моделей.
+
+Строки выбираются через ``values()`` только с запрошенными полями и
+перекладываются в словари ответа по таблице полей — без форм, шаблонов и
+создания объекта модели на каждую строку.
+"""
+from posts.storage import post_images
+
+
+def image_url(name):
+    return post_images.url(name) if name else None
+
+
+# Поле ответа: путь в ORM и преобразование значения
+POST_FIELDS = {
+    'id': ('pk', None),
+    'text': ('text', None),
+    'pub_date': ('pub_date', None),
+    'author': ('author__username', None),
+    'group': ('group__slug', None),
+    'image': ('image', image_url),
+    'comments_count': ('comments_count', None),
+}
+
+COMMENT_FIELDS = {
+    'id': ('pk', None),
+    'post': ('post_id', None),
+    'author': ('author__username', None),
+    'text': ('text', None),
+    'created': ('created', None),
+}
+
+
+class FieldsError(ValueError):
+    pass
+
+
+def select_fields(fields, requested):
+    """Поля ответа из параметра ``?fields=``; без него — все поля."""
+    if not requested:
+        return list(fields)
+    names = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in names if name not in fields]
+    if unknown:
+        raise FieldsError(f'Неизвестные поля: {", ".join(unknown)}. '
+                          f'Доступны: {", ".join(fields)}.')
+    return list(dict.fromkeys(names))
+
+
+def value_paths(fields, names, extra=()):
+    """Аргументы ``values()``: пути выбранных полей и ``extra``."""
+    return list(dict.fromkeys(
+        [fields[name][0] for name in names] + list(extra)))
+
+
+def serialize(rows, fields, names):
+    columns = [(name, *fields[name]) for name in names]
+    return [
+        {name: convert(row[path]) if convert else row[path]
+         for name, path, convert in columns}
+        for row in rows
+    ]
@@ -0,0 +1,160 @@
+import gzip
+import json
+from http import HTTPStatus
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from posts.models import Comment, Follow, Group, Post
+
+User = get_user_model()
+
+
+class FeedApiTest(TestCase):
+    POSTS_COUNT = settings.POSTS_LIMIT + 3
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        for number in range(cls.POSTS_COUNT):
+            Post.objects.create(text=f'Запись {number}', author=cls.author,
+                                group=cls.group if number % 2 else None)
+        cls.post = Post.objects.latest('pk')
+        for number in range(3):
+            Comment.objects.create(post=cls.post, author=cls.reader,
+                                   text=f'Комментарий {number}')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def get_json(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        return response.json()
+
+    def test_posts_are_paginated_by_cursor(self):
+        """Лента отдаётся страницами, следующая — по ссылке next"""
+        first = self.get_json(reverse('api:posts'))
+        self.assertEqual(len(first['results']), settings.POSTS_LIMIT)
+        self.assertEqual(first['results'][0]['text'],
+                         f'Запись {self.POSTS_COUNT - 1}')
+        self.assertIsNone(first['previous'])
+
+        second = self.get_json(first['next'])
+        self.assertEqual(len(second['results']), 3)
+        self.assertIsNone(second['next'])
+        self.assertEqual(second['results'][-1]['text'], 'Запись 0')
+
+    def test_fields_selection(self):
+        """Параметр fields оставляет в ответе только выбранные поля"""
+        data = self.get_json(reverse('api:posts'), fields='id,author')
+        self.assertEqual(data['results'][0],
+                         {'id': self.post.pk, 'author': 'author'})
+        response = self.client.get(reverse('api:posts'),
+                                   {'fields': 'id,password'})
+        self.assertEqual(response.status_code, HTTPStatus.BAD_REQUEST)
+        self.assertIn('password', response.json()['detail'])
+
+    def test_feed_is_one_query(self):
+        """Страница ленты выбирается одним запросом без запросов на
+        каждую запись"""
+        with self.assertNumQueries(1):
+            self.client.get(reverse('api:posts'))
+
+    def test_group_and_profile_feeds(self):
+        """Ленты группы и автора отдают только свои записи"""
+        data = self.get_json(reverse('api:group_posts', args=['group']),
+                             fields='group')
+        self.assertEqual({row['group'] for row in data['results']},
+                         {'group'})
+        data = self.get_json(reverse('api:profile_posts', args=['reader']))
+        self.assertEqual(data['results'], [])
+
+    def test_missing_objects_are_json_404(self):
+        """Несуществующие группа, автор и запись дают 404 в JSON"""
+        for url in (reverse('api:group_posts', args=['missing']),
+                    reverse('api:profile_posts', args=['missing']),
+                    reverse('api:post_detail', args=[0]),
+                    reverse('api:post_comments', args=[0])):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
+                self.assertIn('detail', response.json())
+
+    def test_post_detail_and_comments(self):
+        """Запись отдаётся объектом, комментарии — по порядку создания"""
+        data = self.get_json(reverse('api:post_detail', args=[self.post.pk]))
+        self.assertEqual(data['comments_count'], 3)
+        self.assertIsNone(data['image'])
+        comments = self.get_json(
+            reverse('api:post_comments', args=[self.post.pk]))['results']
+        self.assertEqual([comment['text'] for comment in comments],
+                         [f'Комментарий {number}' for number in range(3)])
+
+    def test_follow_feed_requires_login(self):
+        """Лента подписок доступна только авторизованным"""
+        url = reverse('api:follow_posts')
+        self.assertEqual(self.client.get(url).status_code,
+                         HTTPStatus.UNAUTHORIZED)
+        data = self.reader_client.get(url).json()
+        self.assertEqual(len(data['results']), settings.POSTS_LIMIT)
+
+    def test_only_get_is_allowed(self):
+        """API только для чтения"""
+        response = self.reader_client.post(reverse('api:posts'))
+        self.assertEqual(response.status_code, HTTPStatus.METHOD_NOT_ALLOWED)
+
+
+class ExportApiTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = User.objects.create_user(username='staff', is_staff=True)
+        cls.user = User.objects.create_user(username='user')
+        cls.posts = [Post.objects.create(text=f'Запись {number}',
+                                         author=cls.user)
+                     for number in range(3)]
+
+    def setUp(self):
+        self.staff_client = Client()
+        self.staff_client.force_login(self.staff)
+
+    def test_export_is_for_staff_only(self):
+        """Выгрузка недоступна гостям и обычным пользователям"""
+        url = reverse('api:export', args=['posts'])
+        self.assertEqual(self.client.get(url).status_code,
+                         HTTPStatus.UNAUTHORIZED)
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(url).status_code,
+                         HTTPStatus.FORBIDDEN)
+
+    def test_export_streams_ndjson_after_id(self):
+        """Выгрузка отдаётся потоком строк JSON начиная после after"""
+        response = self.staff_client.get(
+            reverse('api:export', args=['posts']),
+            {'after': self.posts[0].pk})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines],
+                         [post.pk for post in self.posts[1:]])
+
+    def test_export_is_gzipped(self):
+        """Клиенту, принимающему gzip, выгрузка отдаётся сжатой"""
+        response = self.staff_client.get(
+            reverse('api:export', args=['follows']),
+            HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)), b'')
+
+    def test_unknown_model(self):
+        """Неизвестная модель — 404"""
+        response = self.staff_client.get(
+            reverse('api:export', args=['users']))
+        self.assertEqual(response.status_code, HTTPStatus.NOT_FOUND)
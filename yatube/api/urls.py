@@ -0,0 +1,18 @@
+from django.urls import path
+
+from . import views
+
+app_name = 'api'
+
+urlpatterns = [
+    path('posts/', views.posts, name='posts'),
+    path('posts/<int:post_id>/', views.post_detail, name='post_detail'),
+    path('posts/<int:post_id>/comments/', views.post_comments,
+         name='post_comments'),
+    path('groups/<slug:slug>/posts/', views.group_posts,
+         name='group_posts'),
+    path('profiles/<str:username>/posts/', views.profile_posts,
+         name='profile_posts'),
+    path('follow/', views.follow_posts, name='follow_posts'),
+    path('export/<str:model>/', views.export, name='export'),
+]
@@ -0,0 +1,129 @@
+from functools import wraps
+from http import HTTPStatus
+
+from django.conf import settings
+from django.http import Http404, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.views.decorators.http import require_GET
+
+from posts import feeds
+from posts.export import EXPORT_MODELS, export_lines
+from posts.models import Group, Post, User
+from posts.paginators import CursorPaginator
+from .serializers import (COMMENT_FIELDS, POST_FIELDS, FieldsError,
+                          select_fields, serialize, value_paths)
+
+POSTS_LIMIT = settings.POSTS_LIMIT
+COMMENTS_LIMIT = settings.COMMENTS_LIMIT
+CURSOR_PARAMS = ('after', 'before', 'page')
+
+
+def error(message, status):
+    return JsonResponse({'detail': message}, status=status)
+
+
+def api_view(view):
+    """Только GET; ошибки отдаются JSON, а не HTML-страницами."""
+    @require_GET
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        try:
+            return view(request, *args, **kwargs)
+        except FieldsError as exception:
+            return error(str(exception), HTTPStatus.BAD_REQUEST)
+        except Http404:
+            return error('Не найдено.', HTTPStatus.NOT_FOUND)
+    return wrapper
+
+
+def page_link(request, param, cursor):
+    if cursor is None:
+        return None
+    params = request.GET.copy()
+    for name in CURSOR_PARAMS:
+        params.pop(name, None)
+    params[param] = cursor
+    return f'{request.path}?{params.urlencode()}'
+
+
+def paginate(request, queryset, fields, per_page,
+             ordering=('-pub_date', '-pk')):
+    names = select_fields(fields, request.GET.get('fields'))
+    rows = queryset.values(*value_paths(
+        fields, names, [name.lstrip('-') for name in ordering]))
+    paginator = CursorPaginator(rows, per_page, ordering=ordering)
+    page_obj = paginator.page_for(request.GET)
+    return JsonResponse({
+        'results': serialize(page_obj, fields, names),
+        'next': page_link(request, 'after', paginator.next_cursor),
+        'previous': page_link(request, 'before',
+                              paginator.previous_cursor),
+    })
+
+
+@api_view
+def posts(request):
+    return paginate(request, feeds.index_feed(), POST_FIELDS, POSTS_LIMIT)
+
+
+@api_view
+def group_posts(request, slug):
+    group = get_object_or_404(Group.objects.only('pk'), slug=slug)
+    return paginate(request, feeds.group_feed(group), POST_FIELDS,
+                    POSTS_LIMIT)
+
+
+@api_view
+def profile_posts(request, username):
+    author = get_object_or_404(User.objects.only('pk'), username=username)
+    return paginate(request, feeds.profile_feed(author), POST_FIELDS,
+                    POSTS_LIMIT)
+
+
+@api_view
+def follow_posts(request):
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация.', HTTPStatus.UNAUTHORIZED)
+    return paginate(request, feeds.follow_feed(request.user), POST_FIELDS,
+                    POSTS_LIMIT, ordering=feeds.FOLLOW_ORDERING)
+
+
+@api_view
+def post_detail(request, post_id):
+    names = select_fields(POST_FIELDS, request.GET.get('fields'))
+    row = feeds.feed_posts(Post.objects.filter(pk=post_id)).values(
+        *value_paths(POST_FIELDS, names)).first()
+    if row is None:
+        raise Http404
+    return JsonResponse(serialize([row], POST_FIELDS, names)[0])
+
+
+@api_view
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    return paginate(request, feeds.post_comments(post), COMMENT_FIELDS,
+                    COMMENTS_LIMIT, ordering=('created', 'pk'))
+
+
+@api_view
+def export(request, model):
+    """Выгрузка модели в NDJSON для сотрудников; ``?after=`` продолжает
+    прерванную выгрузку. Ответ сжимается gzip, если клиент его принимает.
+    """
+    if not request.user.is_authenticated:
+        return error('Нужна авторизация.', HTTPStatus.UNAUTHORIZED)
+    if not request.user.is_staff:
+        return error('Выгрузка доступна только сотрудникам.',
+                     HTTPStatus.FORBIDDEN)
+    if model not in EXPORT_MODELS:
+        raise Http404
+    try:
+        after = int(request.GET.get('after', 0))
+    except ValueError:
+        return error('after должен быть числом.', HTTPStatus.BAD_REQUEST)
+    response = StreamingHttpResponse(
+        export_lines(model, after),
+        content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = (
+        f'attachment; filename="{model}.ndjson"')
+    return response
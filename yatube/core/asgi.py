@@ -0,0 +1,191 @@
+"""ASGI-приложение поверх WSGI-обработчика Django.
+
+Django 2.2 не умеет ни ASGI, ни асинхронных представлений, поэтому
+``ASGIHandler`` запускает обычный ``WSGIHandler`` в ограниченном пуле
+потоков. Событийный цикл сервера (uvicorn, daphne, hypercorn) принимает
+соединения, читает тело запроса и отдаёт байты ответа. Поток пула
+складывает куски ответа в очередь, не дожидаясь клиента, и освобождается,
+как только представление закончило работу; медленный клиент держит
+корутину и до ``ASGI_RESPONSE_BUFFER`` кусков ответа. Поток ждёт клиента,
+только когда очередь полна. Число потоков — а значит, и одновременных
+соединений с базой — задаёт ``ASGI_THREADS``.
+"""
+import asyncio
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+
+
+def _header(name, value):
+    return name.lower().encode('latin1'), value.encode('latin1')
+
+
+def wsgi_environ(scope, body):
+    """Окружение WSGI (PEP 3333) для HTTP-запроса ASGI."""
+    server = scope.get('server') or ('localhost', 80)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': scope.get('root_path', ''),
+        # В WSGI путь — байты URL, прочитанные как latin-1
+        'PATH_INFO': scope['path'].encode('utf-8').decode('latin1'),
+        'QUERY_STRING': scope['query_string'].decode('latin1'),
+        'SERVER_NAME': str(server[0]),
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': f"HTTP/{scope.get('http_version', '1.1')}",
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': False,
+        'wsgi.run_once': False,
+    }
+    if scope.get('client'):
+        environ['REMOTE_ADDR'] = scope['client'][0]
+    for name, value in scope['headers']:
+        name = name.decode('latin1').upper().replace('-', '_')
+        value = value.decode('latin1')
+        if name not in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+            name = f'HTTP_{name}'
+        if name in environ:
+            separator = '; ' if name == 'HTTP_COOKIE' else ','
+            value = environ[name] + separator + value
+        environ[name] = value
+    return environ
+
+
+class _Response:
+    """Очередь сообщений ответа от потока пула к событийному циклу.
+
+    Поток кладёт сообщение без перехода в цикл, пока в очереди меньше
+    ``size`` сообщений, и ждёт, только когда клиент отстал на ``size``.
+    """
+
+    def __init__(self, loop, size):
+        self.loop = loop
+        self.queue = asyncio.Queue()
+        self.slots = threading.Semaphore(size)
+        self.closed = threading.Event()
+
+    def put(self, message):
+        self.slots.acquire()
+        if self.closed.is_set():
+            # Клиента уже нет: остаток ответа выбрасывается
+            self.slots.release()
+            return
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, message)
+
+    def finish(self):
+        self.loop.call_soon_threadsafe(self.queue.put_nowait, None)
+
+    async def send_to(self, send):
+        try:
+            while True:
+                message = await self.queue.get()
+                if message is None:
+                    return
+                await send(message)
+                self.slots.release()
+        finally:
+            self.closed.set()
+            self.slots.release()
+
+
+class ASGIHandler:
+    """ASGI 3.0-приложение, выполняющее ``wsgi_application`` в пуле из
+    ``max_workers`` потоков; ``buffer`` — сколько кусков ответа поток
+    отдаёт, не дожидаясь клиента."""
+
+    def __init__(self, wsgi_application, max_workers=None, buffer=None):
+        self.application = wsgi_application
+        self.buffer = buffer or settings.ASGI_RESPONSE_BUFFER
+        self.executor = ThreadPoolExecutor(
+            max_workers=max_workers or settings.ASGI_THREADS,
+            thread_name_prefix='asgi')
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            return await self.lifespan(receive, send)
+        if scope['type'] != 'http':
+            raise ValueError(f"Неподдерживаемый тип соединения "
+                             f"{scope['type']}")
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        loop = asyncio.get_running_loop()
+        response = _Response(loop, self.buffer)
+        worker = loop.run_in_executor(
+            self.executor, self.run, wsgi_environ(scope, body), response)
+        await response.send_to(send)
+        await worker
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def read_body(self, receive):
+        """Тело запроса целиком; большое — во временном файле. ``None``,
+        если клиент отключился раньше."""
+        body = tempfile.SpooledTemporaryFile(
+            max_size=settings.FILE_UPLOAD_MAX_MEMORY_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body'):
+                body.seek(0)
+                return body
+
+    def run(self, environ, response):
+        """Выполняет запрос в потоке пула и передаёт ответ в цикл."""
+        start = []
+
+        def send_body(body, more_body):
+            # Заголовки уходят перед первым куском тела (PEP 3333)
+            for message in start:
+                response.put(message)
+            start.clear()
+            response.put({'type': 'http.response.body',
+                          'body': body, 'more_body': more_body})
+
+        def start_response(status, headers, exc_info=None):
+            start[:] = [{
+                'type': 'http.response.start',
+                'status': int(status.split(' ', 1)[0]),
+                'headers': [_header(name, value) for name, value in headers],
+            }]
+            return lambda data: send_body(data, True)
+
+        try:
+            result = self.application(environ, start_response)
+            try:
+                # Кусок придерживается до следующего, чтобы последний ушёл
+                # с more_body=False без лишнего пустого сообщения
+                previous = b''
+                for chunk in result:
+                    if not chunk:
+                        continue
+                    if previous:
+                        send_body(previous, True)
+                    previous = chunk
+                send_body(previous, False)
+            finally:
+                # close() отправляет request_finished, который закрывает
+                # соединения с базой этого потока
+                close = getattr(result, 'close', None)
+                if close is not None:
+                    close()
+        finally:
+            environ['wsgi.input'].close()
+            response.finish()
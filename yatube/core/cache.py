@@ -0,0 +1,427 @@
+"""Кеш-бэкенды для нескольких воркеров.
+
+``RedisCache`` — минимальный клиент протокола RESP без внешних зависимостей,
+работающий с Redis и совместимыми серверами. ``TieredCache`` ставит перед
+общим кешем небольшой LRU в памяти процесса. ``MeteredCache`` считает
+попадания и промахи для метрик запроса.
+
+Ключи версий (по умолчанию с префиксом ``feed-version:``) локально не
+кешируются и всегда читаются из общего кеша. Ключи фрагментов содержат номер
+версии, поэтому смена версии в одном воркере сразу делает недостижимыми
+устаревшие копии во всех остальных.
+"""
+import pickle
+import socket
+import threading
+import time
+from collections import OrderedDict
+from urllib.parse import urlparse
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+
+from . import metrics
+
+
+# INCRBY только существующего ключа за одну команду: проверка и увеличение
+# не разделены запросами других клиентов
+INCR_SCRIPT = """
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return false
+"""
+
+
+class RedisError(Exception):
+    pass
+
+
+class _Connection:
+    def __init__(self, host, port, db, timeout):
+        self.sock = socket.create_connection((host, port), timeout)
+        self.file = self.sock.makefile('rb')
+        if db:
+            self.execute('SELECT', db)
+
+    def close(self):
+        self.file.close()
+        self.sock.close()
+
+    def execute(self, *args):
+        return self.pipeline([args])[0]
+
+    def pipeline(self, commands):
+        self.sock.sendall(b''.join(self._pack(args) for args in commands))
+        replies = [self._read() for _ in commands]
+        for reply in replies:
+            if isinstance(reply, RedisError):
+                raise reply
+        return replies
+
+    def _pack(self, args):
+        parts = [b'*%d\r\n' % len(args)]
+        for arg in args:
+            if not isinstance(arg, bytes):
+                arg = str(arg).encode()
+            parts += [b'$%d\r\n' % len(arg), arg, b'\r\n']
+        return b''.join(parts)
+
+    def _read(self):
+        line = self.file.readline()
+        if not line.endswith(b'\r\n'):
+            raise ConnectionError('Соединение с кешем закрыто')
+        prefix, rest = line[:1], line[1:-2]
+        if prefix == b'+':
+            return rest.decode()
+        if prefix == b'-':
+            return RedisError(rest.decode())
+        if prefix == b':':
+            return int(rest)
+        if prefix == b'$':
+            length = int(rest)
+            if length < 0:
+                return None
+            return self.file.read(length + 2)[:-2]
+        if prefix == b'*':
+            length = int(rest)
+            if length < 0:
+                return None
+            return [self._read() for _ in range(length)]
+        raise RedisError(f'Неизвестный ответ сервера: {line!r}')
+
+
+class RedisCache(BaseCache):
+    """Кеш в Redis: ``LOCATION = 'redis://host:port/db'``.
+
+    Целые числа хранятся строкой, чтобы ``incr`` выполнялся на сервере
+    атомарно, остальные значения сериализуются pickle.
+    """
+
+    def __init__(self, server, params):
+        super().__init__(params)
+        url = urlparse(server)
+        self._host = url.hostname or 'localhost'
+        self._port = url.port or 6379
+        self._db = int(url.path.lstrip('/') or 0)
+        self._socket_timeout = params.get('OPTIONS', {}).get(
+            'SOCKET_TIMEOUT', 1)
+        self._local = threading.local()
+
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = _Connection(self._host, self._port, self._db,
+                                     self._socket_timeout)
+            self._local.connection = connection
+        return connection
+
+    def _pipeline(self, commands):
+        try:
+            return self._connection().pipeline(commands)
+        except (OSError, ConnectionError):
+            self._disconnect()
+            raise
+
+    def _execute(self, *args):
+        return self._pipeline([args])[0]
+
+    def _encode(self, value):
+        if type(value) is int:
+            return str(value).encode()
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _decode(self, value):
+        if value is None:
+            return None
+        try:
+            return int(value)
+        except ValueError:
+            return pickle.loads(value)
+
+    def _expiry_args(self, timeout):
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        if timeout is None:
+            return []
+        return ['PX', max(int(timeout * 1000), 1)]
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        return self._execute('SET', key, self._encode(value), 'NX',
+                             *self._expiry_args(timeout)) is not None
+
+    def get(self, key, default=None, version=None):
+        value = self._decode(self._execute('GET', self._key(key, version)))
+        return default if value is None else value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._execute('SET', self._key(key, version), self._encode(value),
+                      *self._expiry_args(timeout))
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        expiry = self._expiry_args(timeout)
+        if expiry:
+            return bool(self._execute('PEXPIRE', key, expiry[1]))
+        self._execute('PERSIST', key)
+        return bool(self._execute('EXISTS', key))
+
+    def delete(self, key, version=None):
+        self._execute('DEL', self._key(key, version))
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        if not keys:
+            return {}
+        values = self._execute(
+            'MGET', *(self._key(key, version) for key in keys))
+        return {key: self._decode(value)
+                for key, value in zip(keys, values) if value is not None}
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        expiry = self._expiry_args(timeout)
+        if data:
+            self._pipeline([
+                ('SET', self._key(key, version), self._encode(value),
+                 *expiry)
+                for key, value in data.items()
+            ])
+        return []
+
+    def delete_many(self, keys, version=None):
+        keys = [self._key(key, version) for key in keys]
+        if keys:
+            self._execute('DEL', *keys)
+
+    def has_key(self, key, version=None):
+        return bool(self._execute('EXISTS', self._key(key, version)))
+
+    def incr(self, key, delta=1, version=None):
+        key = self._key(key, version)
+        value = self._execute('EVAL', INCR_SCRIPT, 1, key, delta)
+        if value is None:
+            raise ValueError(f"Key '{key}' not found")
+        return value
+
+    def clear(self):
+        self._execute('FLUSHDB')
+
+    def close(self, **kwargs):
+        # Django закрывает кеши после каждого запроса; соединение потока
+        # переиспользуется между запросами и рвётся только при ошибке.
+        pass
+
+    def _disconnect(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is not None:
+            self._local.connection = None
+            try:
+                connection.close()
+            except OSError:
+                pass
+
+
+class TieredCache(BaseCache):
+    """Локальный LRU (L1) перед общим кешем (L2).
+
+    Параметры ``OPTIONS``:
+
+    * ``SHARED`` — алиас общего кеша из ``settings.CACHES``;
+    * ``LOCAL_MAX_ENTRIES`` — размер LRU в памяти процесса;
+    * ``LOCAL_TIMEOUT`` — сколько секунд копия живёт в L1;
+    * ``SHARED_ONLY_PREFIXES`` — ключи, которые всегда читаются из L2.
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._shared_alias = options.get('SHARED', 'shared')
+        self._max_entries = options.get('LOCAL_MAX_ENTRIES', 1000)
+        self._local_timeout = options.get('LOCAL_TIMEOUT', 60)
+        self._shared_only = tuple(
+            options.get('SHARED_ONLY_PREFIXES', ('feed-version:',)))
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def shared(self):
+        return caches[self._shared_alias]
+
+    def _is_local(self, key):
+        return not key.startswith(self._shared_only)
+
+    def _local_get(self, key, version):
+        key = self.make_key(key, version=version)
+        with self._lock:
+            entry = self._local.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._local[key]
+                return None
+            self._local.move_to_end(key)
+            return value
+
+    def _local_set(self, key, value, timeout, version):
+        if not self._is_local(key):
+            return
+        if timeout is DEFAULT_TIMEOUT:
+            timeout = self.default_timeout
+        ttl = self._local_timeout
+        if timeout is not None:
+            ttl = min(ttl, timeout)
+        key = self.make_key(key, version=version)
+        with self._lock:
+            if ttl <= 0:
+                self._local.pop(key, None)
+                return
+            self._local[key] = (time.monotonic() + ttl, value)
+            self._local.move_to_end(key)
+            while len(self._local) > self._max_entries:
+                self._local.popitem(last=False)
+
+    def _local_delete(self, key, version):
+        key = self.make_key(key, version=version)
+        with self._lock:
+            self._local.pop(key, None)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self.shared.add(key, value, timeout, version)
+        if added:
+            self._local_set(key, value, timeout, version)
+        return added
+
+    def get(self, key, default=None, version=None):
+        if self._is_local(key):
+            value = self._local_get(key, version)
+            if value is not None:
+                return value
+        value = self.shared.get(key, version=version)
+        if value is None:
+            return default
+        self._local_set(key, value, self._local_timeout, version)
+        return value
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.shared.set(key, value, timeout, version)
+        self._local_set(key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.shared.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self._local_delete(key, version)
+        self.shared.delete(key, version)
+
+    def get_many(self, keys, version=None):
+        found = {}
+        missing = []
+        for key in keys:
+            value = self._local_get(key, version) if self._is_local(
+                key) else None
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+        if missing:
+            shared = self.shared.get_many(missing, version=version)
+            for key, value in shared.items():
+                self._local_set(key, value, self._local_timeout, version)
+            found.update(shared)
+        return found
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self.shared.set_many(data, timeout, version)
+        for key, value in data.items():
+            self._local_set(key, value, timeout, version)
+        return failed
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        for key in keys:
+            self._local_delete(key, version)
+        self.shared.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        if self._is_local(key) and self._local_get(key, version) is not None:
+            return True
+        return self.shared.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        self._local_delete(key, version)
+        return self.shared.incr(key, delta, version)
+
+    def clear(self):
+        with self._lock:
+            self._local.clear()
+        self.shared.clear()
+
+    def close(self, **kwargs):
+        self.shared.close(**kwargs)
+
+
+class MeteredCache(BaseCache):
+    """Обёртка над кешем ``OPTIONS['CACHE']``, которая считает попадания и
+    промахи чтений в метриках текущего запроса."""
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        self._alias = params.get('OPTIONS', {}).get('CACHE', 'metered')
+
+    @property
+    def cache(self):
+        return caches[self._alias]
+
+    def _count(self, hits, misses):
+        stats = metrics.current_stats()
+        if stats is not None:
+            stats.cache_hits += hits
+            stats.cache_misses += misses
+
+    def get(self, key, default=None, version=None):
+        value = self.cache.get(key, version=version)
+        self._count(value is not None, value is None)
+        return default if value is None else value
+
+    def get_many(self, keys, version=None):
+        keys = list(keys)
+        found = self.cache.get_many(keys, version=version)
+        self._count(len(found), len(keys) - len(found))
+        return found
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.cache.add(key, value, timeout, version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self.cache.set(key, value, timeout, version)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.cache.touch(key, timeout, version)
+
+    def delete(self, key, version=None):
+        self.cache.delete(key, version)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.cache.set_many(data, timeout, version)
+
+    def delete_many(self, keys, version=None):
+        self.cache.delete_many(keys, version)
+
+    def has_key(self, key, version=None):
+        return self.cache.has_key(key, version)
+
+    def incr(self, key, delta=1, version=None):
+        return self.cache.incr(key, delta, version)
+
+    def clear(self):
+        self.cache.clear()
+
+    def close(self, **kwargs):
+        self.cache.close(**kwargs)
@@ -0,0 +1,9 @@
+from django.db.backends.sqlite3 import base
+
+from core.db.health import HealthCheckDatabaseWrapperMixin
+from core.db.pool import PooledDatabaseWrapperMixin
+
+
+class DatabaseWrapper(HealthCheckDatabaseWrapperMixin,
+                      PooledDatabaseWrapperMixin, base.DatabaseWrapper):
+    pass
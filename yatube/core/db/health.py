@@ -0,0 +1,34 @@
+"""Ленивая проверка сохранённого соединения с базой.
+
+Соединение, пережившее прошлый запрос (``CONN_MAX_AGE``), могло оборваться.
+В начале и в конце запроса Django вызывает
+``close_if_unusable_or_obsolete()``, которое здесь только помечает
+соединение, а проверка (``is_usable()``, на PostgreSQL — ``SELECT 1``)
+выполняется перед первым обращением к базе, как в Django 4.1. Запросы, не
+трогающие базу, ничего не проверяют.
+"""
+
+
+class HealthCheckDatabaseWrapperMixin:
+    """Подмешивается к ``DatabaseWrapper`` бэкенда Django."""
+
+    # Новое соединение проверять незачем
+    health_check_done = True
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def ensure_connection(self):
+        if self.connection is not None and not self.health_check_done:
+            self.health_check_done = True
+            # Внутри транзакции закрывать соединение нельзя
+            if (self.settings_dict.get('CONN_HEALTH_CHECKS')
+                    and not self.in_atomic_block
+                    and not self.is_usable()):
+                self.close()
+        super().ensure_connection()
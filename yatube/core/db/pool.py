@@ -0,0 +1,134 @@
+"""Пул соединений с базой, общий для потоков процесса.
+
+Django держит по соединению на поток, и в многопоточных режимах (ASGI,
+WSGI-сервер с пулом потоков) их число равно числу потоков. Бэкенды
+``core.db.backends`` с заданным ``POOL_SIZE`` вместо открытия нового
+соединения берут свободное из пула этого размера, а при закрытии
+возвращают его обратно. Если
+свободных нет, поток ждёт до ``POOL_TIMEOUT`` секунд; время ожидания
+попадает в метрики запроса.
+"""
+import queue
+import threading
+import time
+
+from django.utils.functional import cached_property
+
+from core import metrics
+
+POOL_TIMEOUT = 10
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+class PoolTimeout(Exception):
+    pass
+
+
+def _ping(connection):
+    try:
+        cursor = connection.cursor()
+        try:
+            cursor.execute('SELECT 1')
+        finally:
+            cursor.close()
+    except Exception:
+        return False
+    return True
+
+
+def _discard(connection):
+    try:
+        connection.close()
+    except Exception:
+        pass
+
+
+class ConnectionPool:
+    """Не больше ``size`` выданных соединений; свободные хранятся для
+    повторного использования."""
+
+    def __init__(self, size, timeout=POOL_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self._slots = threading.BoundedSemaphore(size)
+        # Последним возвращённым пользуемся первым: остальные простаивают
+        # и реже нужны
+        self._idle = queue.LifoQueue()
+
+    def acquire(self, connect, check=False):
+        """Свободное соединение или новое от ``connect()``. С ``check``
+        свободное сначала проверяется запросом ``SELECT 1``."""
+        started = time.perf_counter()
+        if not self._slots.acquire(timeout=self.timeout):
+            raise PoolTimeout(
+                f'Нет свободного соединения за {self.timeout} с')
+        stats = metrics.current_stats()
+        if stats is not None:
+            stats.db_wait += time.perf_counter() - started
+        try:
+            while True:
+                try:
+                    connection = self._idle.get_nowait()
+                except queue.Empty:
+                    break
+                if not check or _ping(connection):
+                    return connection
+                _discard(connection)
+            connection = connect()
+        except BaseException:
+            self._slots.release()
+            raise
+        if stats is not None:
+            stats.db_connections += 1
+        return connection
+
+    def release(self, connection, reusable=True):
+        try:
+            if reusable:
+                self._idle.put(connection)
+            else:
+                _discard(connection)
+        finally:
+            self._slots.release()
+
+
+def get_pool(alias, settings_dict):
+    with _pools_lock:
+        if alias not in _pools:
+            _pools[alias] = ConnectionPool(
+                settings_dict['POOL_SIZE'],
+                settings_dict.get('POOL_TIMEOUT', POOL_TIMEOUT))
+        return _pools[alias]
+
+
+class PooledDatabaseWrapperMixin:
+    """Подмешивается к ``DatabaseWrapper`` бэкенда Django; без
+    ``POOL_SIZE`` соединения открываются и закрываются как обычно."""
+
+    @cached_property
+    def pool(self):
+        return get_pool(self.alias, self.settings_dict)
+
+    def get_new_connection(self, conn_params):
+        connect = super().get_new_connection
+        if not self.settings_dict.get('POOL_SIZE'):
+            return connect(conn_params)
+        try:
+            return self.pool.acquire(
+                lambda: connect(conn_params),
+                check=self.settings_dict.get('CONN_HEALTH_CHECKS', False))
+        except PoolTimeout as error:
+            raise self.Database.OperationalError(str(error))
+
+    def _close(self):
+        if not self.settings_dict.get('POOL_SIZE'):
+            return super()._close()
+        # Незавершённая транзакция не должна достаться следующему потоку
+        reusable = True
+        try:
+            self.connection.rollback()
+        except Exception:
+            reusable = False
+        self.pool.release(self.connection, reusable)
@@ -0,0 +1,62 @@
+from urllib.request import Request, urlopen
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from core.metrics import parse_histograms
+
+DURATION = 'yatube_request_duration_seconds'
+QUERIES = 'yatube_request_queries'
+TEMPLATE = 'yatube_request_template_seconds'
+
+
+class Command(BaseCommand):
+    help = ('Выводит процентили времени ответа, числа SQL-запросов и '
+            'времени шаблонов по представлениям из метрик Prometheus.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'source', nargs='?', default='http://127.0.0.1:8000/metrics',
+            help='Адрес /metrics работающего сервера или файл с его ответом.'
+        )
+        parser.add_argument(
+            '--token', default=settings.METRICS_TOKEN,
+            help='Токен для /metrics; по умолчанию METRICS_TOKEN.'
+        )
+        parser.add_argument(
+            '--percentiles', type=int, nargs='+', default=[50, 90, 99],
+            help='Процентили, которые нужно вывести.'
+        )
+
+    def handle(self, *args, **options):
+        histograms = parse_histograms(
+            self.read(options['source'], options['token']))
+        percentiles = options['percentiles']
+        header = ['представление', 'запросов']
+        for name in ('мс', 'SQL', 'шаблон, мс'):
+            header += [f'p{p} {name}' for p in percentiles]
+        self.stdout.write('\t'.join(header))
+        views = sorted(view for name, view in histograms if name == DURATION)
+        for view in views:
+            duration = histograms[(DURATION, view)]
+            row = [view, str(duration.count)]
+            for name, scale in ((DURATION, 1000), (QUERIES, 1),
+                                (TEMPLATE, 1000)):
+                histogram = histograms.get((name, view))
+                for p in percentiles:
+                    value = histogram and histogram.percentile(p / 100)
+                    row.append('-' if value is None
+                               else f'{value * scale:.1f}')
+            self.stdout.write('\t'.join(row))
+
+    def read(self, source, token):
+        try:
+            if source.startswith(('http://', 'https://')):
+                headers = ({'Authorization': f'Bearer {token}'}
+                           if token else {})
+                with urlopen(Request(source, headers=headers)) as response:
+                    return response.read().decode()
+            with open(source) as file:
+                return file.read()
+        except OSError as error:
+            raise CommandError(f'Не удалось прочитать метрики: {error}')
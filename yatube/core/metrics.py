@@ -0,0 +1,215 @@
+"""Метрики запросов: время, число SQL-запросов, попадания в кеш.
+
+``MetricsMiddleware`` собирает показатели каждого запроса в ``RequestStats``
+текущего потока и по окончании складывает их в гистограммы ``registry`` с
+меткой — именем представления из URLconf. Гистограммы отдаются в текстовом
+формате Prometheus на ``/metrics``.
+
+Гистограммы живут в памяти процесса: при нескольких воркерах у каждого они
+свои, как у обычного клиента Prometheus без multiprocess-режима.
+"""
+import math
+import re
+import threading
+from collections import defaultdict
+
+# Границы корзин по умолчанию у клиентов Prometheus, секунды
+TIME_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+
+HISTOGRAMS = {
+    'yatube_request_duration_seconds': (
+        'Время обработки запроса.', TIME_BUCKETS),
+    'yatube_request_db_seconds': (
+        'Время SQL-запросов за один запрос.', TIME_BUCKETS),
+    'yatube_request_template_seconds': (
+        'Время отрисовки шаблонов за один запрос.', TIME_BUCKETS),
+    'yatube_request_queries': (
+        'Число SQL-запросов за один запрос.', QUERY_BUCKETS),
+    'yatube_request_db_wait_seconds': (
+        'Ожидание соединения из пула за один запрос.', TIME_BUCKETS),
+}
+COUNTERS = {
+    'yatube_db_connections_total': 'Новые соединения с базой.',
+    'yatube_cache_hits_total': 'Попадания в кеш.',
+    'yatube_cache_misses_total': 'Промахи кеша.',
+}
+
+SAMPLE_RE = re.compile(
+    r'^(?P<name>\w+)_bucket\{view="(?P<view>(?:[^"\\]|\\.)*)",'
+    r'le="(?P<le>[^"]+)"\} (?P<value>\S+)$'
+)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами, как в Prometheus."""
+
+    def __init__(self, buckets):
+        self.buckets = tuple(buckets) + (math.inf,)
+        self.counts = [0] * len(self.buckets)
+        self.sum = 0.0
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+
+    def cumulative(self):
+        total = 0
+        for bound, count in zip(self.buckets, self.counts):
+            total += count
+            yield bound, total
+
+    def percentile(self, q):
+        """Оценка квантиля ``q`` линейной интерполяцией внутри корзины,
+        как ``histogram_quantile`` в Prometheus."""
+        total = self.count
+        if not total:
+            return None
+        rank = q * total
+        lower, below = 0.0, 0
+        for bound, cumulative in self.cumulative():
+            if cumulative >= rank:
+                if bound == math.inf:
+                    return lower
+                inside = cumulative - below
+                return lower + (bound - lower) * (rank - below) / inside
+            lower, below = bound, cumulative
+        return lower
+
+
+class RequestStats:
+    """Показатели одного запроса."""
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.db_wait = 0.0
+        self.db_connections = 0
+        self.template_time = 0.0
+        self.cache_hits = 0
+        self.cache_misses = 0
+
+
+class Registry:
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.histograms = {}
+        self.counters = defaultdict(int)
+
+    def observe(self, name, view, value):
+        key = (name, view)
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram(
+                    HISTOGRAMS[name][1])
+            histogram.observe(value)
+
+    def inc(self, name, view, amount=1):
+        with self._lock:
+            self.counters[(name, view)] += amount
+
+    def record(self, view, duration, stats):
+        self.observe('yatube_request_duration_seconds', view, duration)
+        self.observe('yatube_request_db_seconds', view, stats.db_time)
+        self.observe('yatube_request_template_seconds', view,
+                     stats.template_time)
+        self.observe('yatube_request_queries', view, stats.queries)
+        self.observe('yatube_request_db_wait_seconds', view, stats.db_wait)
+        self.inc('yatube_db_connections_total', view, stats.db_connections)
+        self.inc('yatube_cache_hits_total', view, stats.cache_hits)
+        self.inc('yatube_cache_misses_total', view, stats.cache_misses)
+
+    def clear(self):
+        with self._lock:
+            self.histograms.clear()
+            self.counters.clear()
+
+    def render(self):
+        """Текстовый формат экспозиции Prometheus 0.0.4."""
+        with self._lock:
+            histograms = sorted(self.histograms.items())
+            counters = sorted(self.counters.items())
+        lines = []
+        for name, (help_text, _) in HISTOGRAMS.items():
+            lines += [f'# HELP {name} {help_text}',
+                      f'# TYPE {name} histogram']
+            for (metric, view), histogram in histograms:
+                if metric != name:
+                    continue
+                label = f'view="{_escape(view)}"'
+                for bound, cumulative in histogram.cumulative():
+                    lines.append(f'{name}_bucket{{{label},'
+                                 f'le="{_format(bound)}"}} {cumulative}')
+                lines.append(f'{name}_sum{{{label}}} {histogram.sum}')
+                lines.append(f'{name}_count{{{label}}} {histogram.count}')
+        for name, help_text in COUNTERS.items():
+            lines += [f'# HELP {name} {help_text}',
+                      f'# TYPE {name} counter']
+            lines += [f'{name}{{view="{_escape(view)}"}} {value}'
+                      for (metric, view), value in counters
+                      if metric == name]
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return (value.replace('\\', '\\\\').replace('"', '\\"')
+            .replace('\n', '\\n'))
+
+
+def _unescape(value):
+    return re.sub(r'\\(.)', lambda match: {'n': '\n'}.get(
+        match.group(1), match.group(1)), value)
+
+
+def _format(bound):
+    return '+Inf' if bound == math.inf else repr(bound)
+
+
+def parse_histograms(text):
+    """Гистограммы из текста ``Registry.render``: ``{(метрика,
+    представление): Histogram}``."""
+    buckets = defaultdict(list)
+    for line in text.splitlines():
+        match = SAMPLE_RE.match(line)
+        if match:
+            key = (match['name'], _unescape(match['view']))
+            buckets[key].append((float(match['le']), int(match['value'])))
+    histograms = {}
+    for key, samples in buckets.items():
+        samples.sort()
+        histogram = Histogram(bound for bound, _ in samples[:-1])
+        below = 0
+        for index, (_, cumulative) in enumerate(samples):
+            histogram.counts[index] = cumulative - below
+            below = cumulative
+        histograms[key] = histogram
+    return histograms
+
+
+registry = Registry()
+
+_local = threading.local()
+
+
+def start_request():
+    _local.stats = RequestStats()
+    return _local.stats
+
+
+def finish_request():
+    stats = getattr(_local, 'stats', None)
+    _local.stats = None
+    return stats
+
+
+def current_stats():
+    return getattr(_local, 'stats', None)
@@ -0,0 +1,92 @@
+import re
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from django.middleware.gzip import GZipMiddleware
+from django.utils.cache import patch_vary_headers
+
+from . import metrics
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Выше пятого уровня brotli сжимает заметно медленнее, а выигрыш на
+# страницах в десятки килобайт невелик
+BROTLI_QUALITY = 5
+MIN_LENGTH = 200
+
+re_accepts_brotli = re.compile(r'\bbr\b')
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """Сжатие ответов.
+
+    Клиентам, которые принимают brotli, ответ сжимается им, если установлен
+    пакет ``brotli``; остальным — gzip средствами ``GZipMiddleware``.
+    """
+
+    def process_response(self, request, response):
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if (brotli is None or response.streaming
+                or response.has_header('Content-Encoding')
+                or len(response.content) < MIN_LENGTH
+                or not re_accepts_brotli.search(accept_encoding)):
+            return super().process_response(request, response)
+
+        patch_vary_headers(response, ('Accept-Encoding',))
+        compressed = brotli.compress(response.content, quality=BROTLI_QUALITY)
+        if len(compressed) >= len(response.content):
+            return response
+        response.content = compressed
+        response['Content-Length'] = str(len(compressed))
+        # Сжатый ответ побайтно отличается от исходного: ETag становится
+        # слабым, как и в GZipMiddleware
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = 'br'
+        return response
+
+
+def count_query(execute, sql, params, many, context):
+    stats = metrics.current_stats()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.db_time += time.perf_counter() - started
+        stats.queries += 1
+
+
+class MetricsMiddleware:
+    """Записывает в ``metrics.registry`` время запроса, число и время
+    SQL-запросов, время шаблонов и обращения к кешу.
+
+    Метка — имя представления (``posts:index``); запросы, не совпавшие ни
+    с одним URL, собираются под меткой ``unresolved``. Тело потоковых
+    ответов отдаётся уже после замера.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        metrics.start_request()
+        started = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(
+                        connection.execute_wrapper(count_query))
+                response = self.get_response(request)
+        finally:
+            stats = metrics.finish_request()
+        match = request.resolver_match
+        view = match.view_name if match else 'unresolved'
+        metrics.registry.record(view, time.perf_counter() - started, stats)
+        return response
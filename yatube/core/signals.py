@@ -0,0 +1,12 @@
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+
+from . import metrics
+
+
+@receiver(connection_created)
+def count_connection(sender, connection, **kwargs):
+    # Соединения из пула считает сам пул: выдача готового — не новое
+    stats = metrics.current_stats()
+    if stats is not None and not connection.settings_dict.get('POOL_SIZE'):
+        stats.db_connections += 1
@@ -0,0 +1,33 @@
+import time
+
+from django.template.backends.django import DjangoTemplates, Template
+
+from . import metrics
+
+
+class MeteredTemplate(Template):
+
+    def render(self, context=None, request=None):
+        stats = metrics.current_stats()
+        if stats is None:
+            return super().render(context, request)
+        started = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            stats.template_time += time.perf_counter() - started
+
+
+class MeteredDjangoTemplates(DjangoTemplates):
+    """Шаблоны Django, время отрисовки которых попадает в метрики запроса.
+
+    Замеряется отрисовка целой страницы вместе с ``{% include %}`` и
+    ленивыми SQL-запросами, выполненными из шаблона.
+    """
+
+    def from_string(self, template_code):
+        return MeteredTemplate(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        template = super().get_template(template_name)
+        return MeteredTemplate(template.template, self)
@@ -0,0 +1,20 @@
+"""Запуск тестов через ``manage.py test``."""
+from django.test.runner import DiscoverRunner
+from django.test.utils import override_settings
+
+
+class TestRunner(DiscoverRunner):
+    """Прогоняет тесты без фонового пула миниатюр.
+
+    Задача, отданная пулу, пережила бы тест и его базу, поэтому
+    миниатюры в тестах создаются сразу.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.thumbnail_settings = override_settings(THUMBNAIL_WORKERS=0)
+        self.thumbnail_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.thumbnail_settings.disable()
+        super().teardown_test_environment(**kwargs)
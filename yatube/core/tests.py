@@ -0,0 +1,521 @@
+import asyncio
+import os
+import shutil
+import socketserver
+import sqlite3
+import tempfile
+import threading
+import time
+from io import StringIO
+from unittest import mock, skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.signals import request_started
+from django.db import connection, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+
+from posts.models import Post
+from . import metrics, middleware
+from .asgi import ASGIHandler
+from .cache import INCR_SCRIPT, RedisCache, TieredCache
+from .db.backends.sqlite3 import base as pooled_sqlite3
+from .db.pool import ConnectionPool, PoolTimeout
+from .metrics import Histogram, parse_histograms, registry
+
+User = get_user_model()
+
+
+class FakeRedisHandler(socketserver.StreamRequestHandler):
+    """Понимает подмножество RESP, которым пользуется RedisCache."""
+
+    def read_command(self):
+        header = self.rfile.readline()
+        if not header:
+            return None
+        args = []
+        for _ in range(int(header[1:])):
+            length = int(self.rfile.readline()[1:])
+            args.append(self.rfile.read(length + 2)[:-2])
+        return args
+
+    def reply(self, value):
+        if value is None:
+            self.wfile.write(b'$-1\r\n')
+        elif isinstance(value, int):
+            self.wfile.write(b':%d\r\n' % value)
+        elif isinstance(value, list):
+            self.wfile.write(b'*%d\r\n' % len(value))
+            for item in value:
+                self.reply(item)
+        elif isinstance(value, str):
+            self.wfile.write(f'+{value}\r\n'.encode())
+        else:
+            self.wfile.write(b'$%d\r\n%s\r\n' % (len(value), value))
+
+    def handle(self):
+        while True:
+            args = self.read_command()
+            if args is None:
+                return
+            command = getattr(self, 'do_' + args[0].decode().upper(), None)
+            if command is None:
+                self.wfile.write(b'-ERR unknown command\r\n')
+            else:
+                self.reply(command(self.server.data, *args[1:]))
+
+    def do_GET(self, data, key):
+        return data.get(key)
+
+    def do_SET(self, data, key, value, *options):
+        if b'NX' in options and key in data:
+            return None
+        data[key] = value
+        return 'OK'
+
+    def do_MGET(self, data, *keys):
+        return [data.get(key) for key in keys]
+
+    def do_DEL(self, data, *keys):
+        return sum(data.pop(key, None) is not None for key in keys)
+
+    def do_EXISTS(self, data, key):
+        return int(key in data)
+
+    def do_INCRBY(self, data, key, delta):
+        value = int(data.get(key, 0)) + int(delta)
+        data[key] = str(value).encode()
+        return value
+
+    def do_EVAL(self, data, script, numkeys, key, delta):
+        assert script.decode() == INCR_SCRIPT
+        if key not in data:
+            return None
+        return self.do_INCRBY(data, key, delta)
+
+    def do_PEXPIRE(self, data, key, *args):
+        return int(key in data)
+
+    do_PERSIST = do_PEXPIRE
+
+    def do_FLUSHDB(self, data):
+        data.clear()
+        return 'OK'
+
+
+class FakeRedisServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), FakeRedisHandler)
+        self.data = {}
+
+
+class RedisCacheTest(SimpleTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.server = FakeRedisServer()
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls):
+        cls.server.shutdown()
+        cls.server.server_close()
+        super().tearDownClass()
+
+    def setUp(self):
+        host, port = self.server.server_address
+        self.cache = RedisCache(f'redis://{host}:{port}/0', {})
+        self.cache.clear()
+
+    def tearDown(self):
+        self.cache._disconnect()
+
+    def test_get_set_delete(self):
+        """Значения сохраняются, читаются и удаляются."""
+        self.cache.set('key', {'value': [1, 2]})
+        self.assertEqual(self.cache.get('key'), {'value': [1, 2]})
+        self.cache.delete('key')
+        self.assertIsNone(self.cache.get('key'))
+
+    def test_add_does_not_overwrite(self):
+        """add не перезаписывает существующий ключ."""
+        self.assertTrue(self.cache.add('key', 1))
+        self.assertFalse(self.cache.add('key', 2))
+        self.assertEqual(self.cache.get('key'), 1)
+
+    def test_incr(self):
+        """incr работает на сервере и падает на отсутствующем ключе."""
+        self.cache.set('counter', 41)
+        self.assertEqual(self.cache.incr('counter'), 42)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.assertFalse(self.cache.has_key('missing'))
+
+    def test_many(self):
+        """Пакетные операции выполняются одним обращением к серверу."""
+        self.cache.set_many({'a': 1, 'b': 'two'})
+        self.assertEqual(self.cache.get_many(['a', 'b', 'c']),
+                         {'a': 1, 'b': 'two'})
+        self.cache.delete_many(['a', 'b'])
+        self.assertEqual(self.cache.get_many(['a', 'b']), {})
+
+
+class TieredCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings = override_settings(CACHES={
+            'default': {
+                'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            },
+            'shared': {
+                'BACKEND': 'django.core.cache.backends.filebased.'
+                           'FileBasedCache',
+                'LOCATION': self.directory,
+            },
+        })
+        self.settings.enable()
+        # Два экземпляра изображают два воркера с общим L2
+        self.first = TieredCache(None, {'OPTIONS': {'SHARED': 'shared'}})
+        self.second = TieredCache(None, {'OPTIONS': {'SHARED': 'shared'}})
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.directory)
+
+    def test_local_hit_skips_shared_cache(self):
+        """Повторное чтение обслуживается из локального LRU."""
+        self.first.set('fragment', 'html')
+        with mock.patch.object(caches['shared'], 'get') as shared_get:
+            self.assertEqual(self.first.get('fragment'), 'html')
+        shared_get.assert_not_called()
+
+    def test_version_change_is_visible_to_other_workers(self):
+        """Смена версии в одном воркере сразу видна в другом."""
+        self.first.set('feed-version:index', 1)
+        self.assertEqual(self.second.get('feed-version:index'), 1)
+        self.first.incr('feed-version:index')
+        self.assertEqual(self.second.get('feed-version:index'), 2)
+
+    def test_local_lru_is_bounded(self):
+        """Локальный LRU вытесняет самые старые записи."""
+        cache = TieredCache(None, {'OPTIONS': {
+            'SHARED': 'shared', 'LOCAL_MAX_ENTRIES': 2}})
+        for key in ('a', 'b', 'c'):
+            cache.set(key, key)
+        self.assertEqual(list(cache._local), [cache.make_key('b'),
+                                              cache.make_key('c')])
+        self.assertEqual(cache.get('a'), 'a')
+
+
+class CompressionMiddlewareTest(TestCase):
+    def test_html_is_gzipped(self):
+        """HTML-ответ сжимается gzip, если клиент его принимает"""
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertTrue(response['ETag'].startswith('W/'))
+
+    @skipUnless(middleware.brotli, 'пакет brotli не установлен')
+    def test_brotli_is_preferred(self):
+        """Клиент с поддержкой brotli получает ответ, сжатый brotli"""
+        response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertIn(b'<html',
+                      middleware.brotli.decompress(response.content))
+
+    def test_brotli_is_skipped_without_support(self):
+        """Без brotli у клиента отдаётся gzip"""
+        with mock.patch.object(middleware, 'brotli', mock.Mock()) as brotli:
+            response = self.client.get('/', HTTP_ACCEPT_ENCODING='gzip')
+        brotli.compress.assert_not_called()
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+
+class HistogramTest(SimpleTestCase):
+    def test_percentile_interpolates_inside_bucket(self):
+        """Квантиль оценивается внутри корзины, как в Prometheus"""
+        histogram = Histogram((10, 20))
+        for value in (1, 2, 15, 16):
+            histogram.observe(value)
+        self.assertEqual(histogram.percentile(0.5), 10)
+        self.assertEqual(histogram.percentile(0.75), 15)
+        self.assertIsNone(Histogram((10,)).percentile(0.5))
+
+    def test_overflow_reports_last_bound(self):
+        """Значения выше последней границы оцениваются этой границей"""
+        histogram = Histogram((10,))
+        histogram.observe(100)
+        self.assertEqual(histogram.percentile(0.99), 10)
+
+
+class MetricsTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        registry.clear()
+        Post.objects.create(
+            text='Запись', author=User.objects.create_user(username='author'))
+
+    def test_request_is_recorded_per_view(self):
+        """Запрос записывается под именем представления вместе с числом
+        SQL-запросов, временем шаблонов и обращениями к кешу"""
+        self.client.get('/')
+        self.client.get('/')
+        queries = registry.histograms[
+            ('yatube_request_queries', 'posts:main_page')]
+        template = registry.histograms[
+            ('yatube_request_template_seconds', 'posts:main_page')]
+        self.assertEqual(queries.count, 2)
+        self.assertGreater(queries.sum, 0)
+        self.assertGreater(template.sum, 0)
+        self.assertGreater(registry.counters[
+            ('yatube_cache_hits_total', 'posts:main_page')], 0)
+        self.assertGreater(registry.counters[
+            ('yatube_cache_misses_total', 'posts:main_page')], 0)
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint(self):
+        """/metrics отдаёт гистограммы сотрудникам и по токену, но не по
+        адресу клиента"""
+        self.client.get('/')
+        response = self.client.get('/metrics',
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertContains(
+            response, 'yatube_request_duration_seconds_bucket'
+                      '{view="posts:main_page",le="+Inf"} 1')
+        for headers in ({}, {'HTTP_AUTHORIZATION': 'Bearer wrong'},
+                        {'REMOTE_ADDR': '127.0.0.1'}):
+            with self.subTest(headers=headers):
+                self.assertEqual(
+                    self.client.get('/metrics', **headers).status_code, 403)
+        self.client.force_login(User.objects.create_user(
+            username='staff', is_staff=True))
+        self.assertEqual(self.client.get('/metrics').status_code, 200)
+
+    def test_metrics_without_token(self):
+        """Без настроенного токена пустой Bearer не открывает /metrics"""
+        self.assertEqual(
+            self.client.get('/metrics',
+                            HTTP_AUTHORIZATION='Bearer ').status_code, 403)
+
+    def test_command_prints_percentiles(self):
+        """Команда metrics выводит процентили из ответа /metrics"""
+        self.client.get('/')
+        self.assertIn(('yatube_request_duration_seconds', 'posts:main_page'),
+                      parse_histograms(registry.render()))
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'metrics.txt')
+            with open(path, 'w') as file:
+                file.write(registry.render())
+            out = StringIO()
+            call_command('metrics', path, '--percentiles', '50', stdout=out)
+        lines = out.getvalue().splitlines()
+        self.assertIn('p50 мс', lines[0])
+        self.assertTrue(lines[1].startswith('posts:main_page\t1\t'))
+
+
+class ASGIHandlerTest(SimpleTestCase):
+    def call(self, handler, scope, body=b''):
+        """Выполняет запрос и возвращает отправленные сообщения."""
+        messages = [{'type': 'http.request', 'body': body}]
+        sent = []
+
+        async def receive():
+            return messages.pop()
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/', 'headers': [],
+                 'query_string': b'', **scope}
+        asyncio.run(handler(scope, receive, send))
+        return sent
+
+    def test_request_is_converted_to_wsgi(self):
+        """Запрос ASGI превращается в окружение WSGI, а ответ — в
+        сообщения ASGI; последний кусок тела закрывает ответ"""
+        environ = {}
+
+        def application(env, start_response):
+            environ.update(env, body=env['wsgi.input'].read())
+            start_response('201 Created', [('Content-Type', 'text/plain')])
+            return [b'a', b'', b'b']
+
+        handler = ASGIHandler(application, max_workers=1)
+        sent = self.call(handler, {
+            'method': 'POST', 'path': '/группа/', 'query_string': b'q=1',
+            'headers': [(b'content-type', b'text/plain'),
+                        (b'cookie', b'a=1'), (b'cookie', b'b=2')],
+        }, body=b'text')
+        self.assertEqual(environ['PATH_INFO'],
+                         '/группа/'.encode().decode('latin1'))
+        self.assertEqual(environ['QUERY_STRING'], 'q=1')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['HTTP_COOKIE'], 'a=1; b=2')
+        self.assertEqual(environ['body'], b'text')
+        self.assertEqual(sent, [
+            {'type': 'http.response.start', 'status': 201,
+             'headers': [(b'content-type', b'text/plain')]},
+            {'type': 'http.response.body', 'body': b'a', 'more_body': True},
+            {'type': 'http.response.body', 'body': b'b', 'more_body': False},
+        ])
+
+    def test_pool_bounds_concurrency(self):
+        """Одновременно выполняется не больше запросов, чем потоков в
+        пуле"""
+        running, peak = [0], [0]
+        lock = threading.Lock()
+
+        def application(environ, start_response):
+            with lock:
+                running[0] += 1
+                peak[0] = max(peak[0], running[0])
+            time.sleep(0.02)
+            with lock:
+                running[0] -= 1
+            start_response('200 OK', [])
+            return [b'ok']
+
+        handler = ASGIHandler(application, max_workers=2)
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            pass
+
+        async def requests():
+            scope = {'type': 'http', 'method': 'GET', 'path': '/',
+                     'headers': [], 'query_string': b''}
+            await asyncio.gather(*(handler(scope, receive, send)
+                                   for _ in range(6)))
+
+        asyncio.run(requests())
+        self.assertEqual(peak[0], 2)
+
+    def test_slow_client_does_not_hold_thread(self):
+        """Поток пула освобождается, не дожидаясь, пока медленный клиент
+        примет ответ"""
+        finished = threading.Event()
+
+        class Body(list):
+            def close(self):
+                finished.set()
+
+        def application(environ, start_response):
+            start_response('200 OK', [])
+            return Body([b'a', b'b', b'c'])
+
+        handler = ASGIHandler(application, max_workers=1, buffer=8)
+        sent = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': b''}
+
+        async def send(message):
+            loop = asyncio.get_running_loop()
+            self.assertTrue(
+                await loop.run_in_executor(None, finished.wait, 1))
+            sent.append(message['type'])
+
+        scope = {'type': 'http', 'method': 'GET', 'path': '/',
+                 'headers': [], 'query_string': b''}
+        asyncio.run(handler(scope, receive, send))
+        self.assertEqual(
+            sent, ['http.response.start'] + ['http.response.body'] * 3)
+
+
+class ConnectionPoolTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'pool.sqlite3')
+
+    def connect(self):
+        return sqlite3.connect(self.path, check_same_thread=False)
+
+    def test_pool_reuses_and_bounds_connections(self):
+        """Пул отдаёт возвращённое соединение повторно и не выдаёт больше
+        size соединений"""
+        pool = ConnectionPool(1, timeout=0.01)
+        opened = pool.acquire(self.connect)
+        with self.assertRaises(PoolTimeout):
+            pool.acquire(self.connect)
+        pool.release(opened)
+        self.assertIs(pool.acquire(self.connect), opened)
+
+    def test_wait_is_recorded(self):
+        """Ожидание свободного соединения попадает в метрики запроса"""
+        pool = ConnectionPool(1)
+        opened = pool.acquire(self.connect)
+        threading.Timer(0.05, pool.release, [opened]).start()
+        stats = metrics.start_request()
+        try:
+            pool.acquire(self.connect)
+        finally:
+            metrics.finish_request()
+        self.assertGreaterEqual(stats.db_wait, 0.04)
+        self.assertEqual(stats.db_connections, 0)
+
+    def test_broken_connection_is_replaced(self):
+        """С проверкой неработающее свободное соединение заменяется новым"""
+        pool = ConnectionPool(1)
+        opened = pool.acquire(self.connect)
+        opened.close()
+        pool.release(opened)
+        self.assertIsNot(pool.acquire(self.connect, check=True), opened)
+
+    def test_backend_returns_connection_to_pool(self):
+        """Бэкенд core.db.backends возвращает соединение в пул при
+        закрытии и берёт его оттуда снова"""
+        wrapper = pooled_sqlite3.DatabaseWrapper(
+            {**connection.settings_dict, 'NAME': self.path,
+             'POOL_SIZE': 1, 'CONN_MAX_AGE': 0},
+            alias='pool-test')
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        raw = wrapper.connection
+        wrapper.close()
+        self.assertIsNone(wrapper.connection)
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertIs(wrapper.connection, raw)
+        wrapper.close()
+
+
+class ConnectionHealthCheckTest(SimpleTestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.wrapper = pooled_sqlite3.DatabaseWrapper(
+            {**connection.settings_dict,
+             'NAME': os.path.join(directory.name, 'health.sqlite3')},
+            alias='health-test')
+        self.addCleanup(self.wrapper.close)
+        self.wrapper.ensure_connection()
+
+    def test_unusable_connection_is_replaced_before_query(self):
+        """Сохранённое соединение, переставшее отвечать, заменяется перед
+        первым запросом к базе"""
+        raw = self.wrapper.connection
+        self.wrapper.health_check_done = False
+        with mock.patch.object(self.wrapper, 'is_usable',
+                               return_value=False) as is_usable:
+            with self.wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            with self.wrapper.cursor() as cursor:
+                cursor.execute('SELECT 1')
+        is_usable.assert_called_once()
+        self.assertIsNot(self.wrapper.connection, raw)
+
+    def test_request_without_queries_does_not_check(self):
+        """Начало запроса только помечает соединения; запрос, не
+        обращающийся к базе, их не проверяет"""
+        with mock.patch.object(self.wrapper, 'is_usable') as is_usable, \
+                mock.patch.object(connections, 'all',
+                                  return_value=[self.wrapper]):
+            request_started.send(sender=None)
+        self.assertFalse(self.wrapper.health_check_done)
+        is_usable.assert_not_called()
@@ -1,4 +1,9 @@
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseForbidden
 from django.shortcuts import render
+from django.utils.crypto import constant_time_compare
+
+from .metrics import registry
 
 
 def page_not_found(request, exception):
@@ -13,3 +18,25 @@ def csrf_failure(request, reason=''):
 
 def server_error(request, exception=None):
     return render(request, 'core/500.html')
+
+
+def has_metrics_token(request):
+    """Передан ли в заголовке ``Authorization: Bearer`` токен из
+    ``METRICS_TOKEN``."""
+    scheme, _, token = request.META.get(
+        'HTTP_AUTHORIZATION', '').partition(' ')
+    return bool(settings.METRICS_TOKEN) and scheme.lower() == 'bearer' and (
+        constant_time_compare(token.strip(), settings.METRICS_TOKEN))
+
+
+def metrics(request):
+    """Метрики процесса в текстовом формате Prometheus.
+
+    Доступны сотрудникам и сборщику метрик с токеном ``METRICS_TOKEN``.
+    Адресу клиента не доверяем: за локальным прокси он всегда внутренний.
+    """
+    if not request.user.is_staff and not has_metrics_token(request):
+        return HttpResponseForbidden()
+    return HttpResponse(registry.render(),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
@@ -1,5 +1,6 @@
 from django.contrib import admin
 from .models import Post, Group
+from .search import search_posts
 
 
 @admin.register(Post)
@@ -10,6 +11,11 @@ class PostAdmin(admin.ModelAdmin):
     empty_value_display = '-пусто-'
     list_editable = ('group',)
 
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search_posts(queryset, search_term), False
+
 
 @admin.register(Group)
 class GroupAdmin(admin.ModelAdmin):
@@ -0,0 +1,430 @@
+"""Замеры пропускной способности и задержек маршрутов ``posts.urls``.
+
+HTML-страницы замеряются вместе с соответствующими ресурсами JSON API.
+Каждый маршрут запрашивается от имени пользователя с подписками:
+последовательно — тестовым клиентом Django и через локальный WSGI-сервер
+(``wsgiref``), одновременно из нескольких соединений — одним и тем же
+генератором нагрузки на WSGI-сервере с пулом потоков и на ASGI-сервере
+(``core.asgi``) с пулом того же размера. Число SQL-запросов берётся из
+метрик ``core.metrics``. Результаты сохраняются в JSON и сравниваются с
+прошлым запуском.
+"""
+import asyncio
+import http.client
+import math
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import formatdate
+from http import HTTPStatus
+from urllib.parse import unquote
+from wsgiref.simple_server import WSGIRequestHandler, WSGIServer, make_server
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.wsgi import get_wsgi_application
+from django.db import connection
+from django.test import Client
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import urlencode
+
+from core.asgi import ASGIHandler
+from core.metrics import registry
+from . import urls
+from .models import AuthorStats, Comment, Follow, Group, Post, User
+
+SEARCH_QUERY = 'запись'
+# Метрики для сравнения и знак: у задержек рост — это ухудшение
+COMPARED_METRICS = (('p50_ms', 1), ('p99_ms', 1), ('throughput', -1))
+
+
+def route_urls():
+    """Адреса маршрутов ``posts.urls`` и JSON API на самых нагруженных
+    объектах базы и пользователь, от имени которого они запрашиваются.
+
+    Ключи — имена маршрутов с пространством имён, как в метриках.
+    """
+    reader_stats = AuthorStats.objects.order_by('-following_count').first()
+    author_stats = AuthorStats.objects.order_by('-followers_count').first()
+    if reader_stats is None or author_stats is None:
+        return None, {}
+    reader = User.objects.get(pk=reader_stats.user_id)
+    author = User.objects.get(pk=author_stats.user_id)
+    group = Group.objects.order_by('pk').first()
+    post = (Post.objects.filter(comments_count__gt=0).order_by(
+        '-pub_date').first() or Post.objects.order_by('-pub_date').first())
+    own_post = Post.objects.filter(author=reader).order_by(
+        '-pub_date').first()
+
+    routes = {
+        'posts:main_page': reverse('posts:main_page'),
+        'posts:profile': reverse('posts:profile', args=[author.username]),
+        'posts:post_create': reverse('posts:post_create'),
+        'posts:follow_index': reverse('posts:follow_index'),
+        'posts:search': (reverse('posts:search') + '?'
+                         + urlencode({'q': SEARCH_QUERY})),
+        'api:posts': reverse('api:posts'),
+        'api:profile_posts': reverse('api:profile_posts',
+                                     args=[author.username]),
+        'api:follow_posts': reverse('api:follow_posts'),
+    }
+    if group is not None:
+        routes['posts:group_list'] = reverse('posts:group_list',
+                                             args=[group.slug])
+        routes['api:group_posts'] = reverse('api:group_posts',
+                                            args=[group.slug])
+    if post is not None:
+        for name in ('posts:post_detail', 'posts:post_comments',
+                     'api:post_detail', 'api:post_comments'):
+            routes[name] = reverse(name, args=[post.pk])
+    if own_post is not None:
+        routes['posts:post_edit'] = reverse('posts:post_edit',
+                                            args=[own_post.pk])
+    return reader, routes
+
+
+def skipped_routes(routes):
+    """Маршруты ``posts.urls``, которые не замеряются: их GET меняет данные
+    или только перенаправляет."""
+    return sorted(f'posts:{pattern.name}' for pattern in urls.urlpatterns
+                  if f'posts:{pattern.name}' not in routes)
+
+
+def _percentile(ordered, q):
+    return ordered[max(math.ceil(q * len(ordered)) - 1, 0)]
+
+
+def _result(view, url, status, latencies, elapsed):
+    queries = registry.histograms.get(('yatube_request_queries', view))
+    ordered = sorted(latencies)
+    return {
+        'url': url,
+        'status': status,
+        'requests': len(latencies),
+        'throughput': len(latencies) / elapsed,
+        'mean_ms': sum(latencies) / len(latencies) * 1000,
+        'p50_ms': _percentile(ordered, 0.5) * 1000,
+        'p99_ms': _percentile(ordered, 0.99) * 1000,
+        'queries': queries.sum / queries.count if queries else None,
+    }
+
+
+def measure(fetch, view, url, requests, warmup=1, cold=False):
+    """Запрашивает ``url`` ``requests`` раз подряд и возвращает пропускную
+    способность, задержки в миллисекундах и среднее число SQL-запросов.
+
+    С ``cold`` кеш очищается перед каждым запросом, вне замера.
+    """
+    for _ in range(warmup):
+        fetch(url)
+    registry.clear()
+    latencies = []
+    status = None
+    for _ in range(requests):
+        if cold:
+            cache.clear()
+        started = time.perf_counter()
+        status = fetch(url)
+        latencies.append(time.perf_counter() - started)
+    return _result(view, url, status, latencies, sum(latencies))
+
+
+def measure_load(load, view, url, requests, warmup=1, cold=False):
+    """То же, что ``measure``, но запросы идут одновременно из
+    ``load.concurrency`` соединений, а пропускная способность считается по
+    общему времени. С ``cold`` кеш очищается один раз перед замером."""
+    load(url, warmup)
+    registry.clear()
+    if cold:
+        cache.clear()
+    status, latencies, elapsed = load(url, requests)
+    result = _result(view, url, status, latencies, elapsed)
+    result['concurrency'] = load.concurrency
+    return result
+
+
+class ClientFetcher:
+    """Запросы через тестовый клиент Django, без сети."""
+
+    def __init__(self, user):
+        self.client = Client()
+        self.client.force_login(user)
+
+    def __call__(self, url):
+        return self.client.get(url).status_code
+
+    def close(self):
+        pass
+
+
+class _QuietHandler(WSGIRequestHandler):
+
+    def log_message(self, format, *args):
+        pass
+
+
+def _session_cookie(user):
+    client = Client()
+    client.force_login(user)
+    session = client.cookies[settings.SESSION_COOKIE_NAME].value
+    return f'{settings.SESSION_COOKIE_NAME}={session}'
+
+
+class ServerFetcher:
+    """Запросы по HTTP к WSGI-серверу ``wsgiref`` в отдельном потоке."""
+
+    def __init__(self, user):
+        self.cookie = _session_cookie(user)
+        self.server = make_server('127.0.0.1', 0, get_wsgi_application(),
+                                  handler_class=_QuietHandler)
+        threading.Thread(target=self.server.serve_forever,
+                         daemon=True).start()
+
+    def __call__(self, url):
+        client = http.client.HTTPConnection(*self.server.server_address)
+        try:
+            client.request('GET', url, headers={'Cookie': self.cookie})
+            response = client.getresponse()
+            response.read()
+            return response.status
+        finally:
+            client.close()
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+FETCHERS = {
+    'client': ClientFetcher,
+    'server': ServerFetcher,
+}
+
+
+class PooledWSGIServer(WSGIServer):
+    """WSGI-сервер ``wsgiref``, обрабатывающий соединения в пуле из
+    ``ASGI_THREADS`` потоков, как gthread-воркер gunicorn."""
+
+    request_queue_size = 128
+
+    def __init__(self):
+        super().__init__(('127.0.0.1', 0), _QuietHandler)
+        self.set_app(get_wsgi_application())
+        self.executor = ThreadPoolExecutor(settings.ASGI_THREADS)
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    def process_request(self, request, client_address):
+        self.executor.submit(self.process_in_thread, request, client_address)
+
+    def process_in_thread(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def close(self):
+        self.shutdown()
+        self.executor.shutdown()
+        self.server_close()
+
+
+class ASGIServer:
+    """Простейший HTTP/1.1-сервер на asyncio для ``core.asgi.ASGIHandler``:
+    одно соединение — один запрос. Цикл событий работает в отдельном
+    потоке."""
+
+    def __init__(self):
+        self.application = ASGIHandler(get_wsgi_application())
+        self.loop = asyncio.new_event_loop()
+        threading.Thread(target=self.loop.run_forever, daemon=True).start()
+        self.server = asyncio.run_coroutine_threadsafe(
+            asyncio.start_server(self.handle, '127.0.0.1', 0, backlog=128),
+            self.loop).result()
+        self.server_address = self.server.sockets[0].getsockname()[:2]
+
+    async def handle(self, reader, writer):
+        try:
+            method, target, _ = (await reader.readline()).decode(
+                'latin1').split(' ', 2)
+            headers = []
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                name, value = line.rstrip(b'\r\n').split(b':', 1)
+                headers.append((name.strip().lower(), value.strip()))
+            length = int(dict(headers).get(b'content-length', 0))
+            body = await reader.readexactly(length)
+            path, _, query = target.partition('?')
+            scope = {
+                'type': 'http',
+                'asgi': {'version': '3.0'},
+                'http_version': '1.1',
+                'method': method,
+                'scheme': 'http',
+                'path': unquote(path),
+                'raw_path': path.encode('latin1'),
+                'query_string': query.encode('latin1'),
+                'root_path': '',
+                'headers': headers,
+                'client': writer.get_extra_info('peername')[:2],
+                'server': self.server_address,
+            }
+            messages = [{'type': 'http.request', 'body': body}]
+
+            async def receive():
+                if messages:
+                    return messages.pop()
+                return {'type': 'http.disconnect'}
+
+            async def send(message):
+                if message['type'] == 'http.response.start':
+                    status = HTTPStatus(message['status'])
+                    head = [f'HTTP/1.1 {status.value} {status.phrase}',
+                            f'Date: {formatdate(usegmt=True)}',
+                            'Connection: close']
+                    head += [f"{name.decode('latin1')}: "
+                             f"{value.decode('latin1')}"
+                             for name, value in message['headers']]
+                    writer.write(('\r\n'.join(head) + '\r\n\r\n').encode(
+                        'latin1'))
+                else:
+                    writer.write(message.get('body', b''))
+                await writer.drain()
+
+            await self.application(scope, receive, send)
+        finally:
+            writer.close()
+
+    def close(self):
+        self.server.close()
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.application.executor.shutdown()
+
+
+SERVERS = {
+    'wsgi': PooledWSGIServer,
+    'asgi': ASGIServer,
+}
+
+
+async def _get(address, cookie, url):
+    reader, writer = await asyncio.open_connection(*address)
+    try:
+        writer.write(
+            f'GET {url} HTTP/1.1\r\nHost: {address[0]}:{address[1]}\r\n'
+            f'Cookie: {cookie}\r\nConnection: close\r\n\r\n'.encode())
+        response = await reader.read()
+    finally:
+        writer.close()
+    return int(response.split(b' ', 2)[1])
+
+
+class LoadGenerator:
+    """Одновременные HTTP-запросы к серверу из ``concurrency`` соединений;
+    один и тот же для WSGI и ASGI."""
+
+    def __init__(self, user, server, concurrency):
+        self.cookie = _session_cookie(user)
+        self.server = server
+        self.concurrency = concurrency
+
+    def __call__(self, url, requests):
+        """Код последнего ответа, задержки запросов и общее время."""
+        return asyncio.run(self.load(url, requests))
+
+    async def load(self, url, requests):
+        pending = iter(range(requests))
+        statuses, latencies = [], []
+
+        async def worker():
+            for _ in pending:
+                started = time.perf_counter()
+                statuses.append(await _get(self.server.server_address,
+                                           self.cookie, url))
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(self.concurrency)))
+        return (statuses[-1] if statuses else None, latencies,
+                time.perf_counter() - started)
+
+    def close(self):
+        self.server.close()
+
+
+def _commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+            text=True, check=True, cwd=settings.BASE_DIR).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(modes=('client', 'server'), requests=50, warmup=1, cold=False,
+        concurrency=16):
+    """Замеряет все маршруты в каждом режиме и возвращает отчёт для JSON.
+
+    Режимы из ``FETCHERS`` запрашивают маршруты последовательно, из
+    ``SERVERS`` — одновременно из ``concurrency`` соединений. ``None``, если
+    в базе нет пользователей со статистикой.
+    """
+    reader, routes = route_urls()
+    if reader is None:
+        return None
+    results = {}
+    for mode in modes:
+        if mode in SERVERS:
+            fetch = LoadGenerator(reader, SERVERS[mode](), concurrency)
+            measurer = measure_load
+        else:
+            fetch = FETCHERS[mode](reader)
+            measurer = measure
+        try:
+            results[mode] = {
+                name: measurer(fetch, name, url, requests, warmup, cold)
+                for name, url in sorted(routes.items())
+            }
+        finally:
+            fetch.close()
+    return {
+        'meta': {
+            'commit': _commit(),
+            'created': timezone.now().isoformat(),
+            'database': connection.vendor,
+            'debug': settings.DEBUG,
+            'cold': cold,
+            'concurrency': concurrency,
+            'threads': settings.ASGI_THREADS,
+            'rows': {
+                'users': User.objects.count(),
+                'posts': Post.objects.count(),
+                'follows': Follow.objects.count(),
+                'comments': Comment.objects.count(),
+            },
+        },
+        'results': results,
+        'skipped': skipped_routes(routes),
+    }
+
+
+def compare(baseline, current, max_regression):
+    """Строки сравнения двух отчётов: ``(режим, маршрут, метрика, было,
+    стало, изменение в процентах, регрессия ли это)``."""
+    rows = []
+    for mode, routes in sorted(current['results'].items()):
+        for route, result in sorted(routes.items()):
+            previous = baseline['results'].get(mode, {}).get(route)
+            if previous is None:
+                continue
+            for metric, sign in COMPARED_METRICS:
+                before, after = previous[metric], result[metric]
+                change = (after - before) / before * 100 if before else 0.0
+                rows.append((mode, route, metric, before, after, change,
+                             change * sign > max_regression))
+    return rows
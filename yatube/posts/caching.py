@@ -0,0 +1,80 @@
+"""Кеш лент с точной инвалидацией.
+
+Ключ фрагмента ленты включает номер версии ленты и курсор страницы, а версия
+увеличивается сигналами при изменении записей и групп. Поэтому устаревший
+фрагмент никогда не отдаётся и время жизни кеша можно держать большим.
+"""
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+FEED_CACHE_TIMEOUT = settings.FEED_CACHE_TIMEOUT
+PAGE_PARAMS = ('after', 'before', 'page')
+
+
+def _version_key(*parts):
+    return 'feed-version:' + ':'.join(str(part) for part in parts)
+
+
+def get_version(*parts):
+    key = _version_key(*parts)
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, time.time_ns(), None)
+        version = cache.get(key)
+    return version
+
+
+def bump_version(*parts):
+    key = _version_key(*parts)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, time.time_ns(), None)
+
+
+def drop_versions(keys):
+    """Сбрасывает сразу несколько версий одним обращением к кешу."""
+    cache.delete_many([_version_key(*parts) for parts in keys])
+
+
+def _feed_key(parts, depends_on, page):
+    versions = [get_version(*parts)]
+    versions += [get_version(*dependency) for dependency in depends_on]
+    return ':'.join(str(part) for part in (*parts, *versions, *page))
+
+
+def feed_cache_context(page_obj, *parts, depends_on=()):
+    """Контекст для ``{% cache feed_cache_timeout feed feed_cache_key %}``.
+
+    Ключ учитывает ленту, её версию, версии лент из ``depends_on`` и
+    страницу ``page_obj`` в том виде, в каком её разобрал пагинатор, а не
+    сырые параметры запроса: иначе каждый мусорный курсор занимал бы в
+    кеше свою копию фрагмента.
+    """
+    page = page_obj.paginator.cache_key
+    if page is None:
+        # Испорченный курсор: фрагмент не кешируется, а все такие запросы
+        # делят один ключ с нулевым временем жизни
+        return {'feed_cache_key': 'invalid', 'feed_cache_timeout': 0}
+    return {
+        'feed_cache_key': _feed_key(parts, depends_on, [page]),
+        'feed_cache_timeout': FEED_CACHE_TIMEOUT,
+    }
+
+
+def feed_etag(request, *parts, depends_on=()):
+    """ETag страницы ленты для условных GET-запросов.
+
+    Кроме ключа фрагмента учитывает пользователя и CSRF-cookie: от них
+    зависят шапка страницы и токены в формах.
+    """
+    key = ':'.join((
+        _feed_key(parts, depends_on,
+                  [request.GET.get(param, '') for param in PAGE_PARAMS]),
+        str(request.user.pk),
+        request.META.get('CSRF_COOKIE', ''),
+    ))
+    return hashlib.md5(key.encode()).hexdigest()
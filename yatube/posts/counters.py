@@ -0,0 +1,84 @@
+"""Денормализованные счетчики записей, подписок и комментариев.
+
+Счетчики меняются одним UPDATE ... SET n = n + delta в той же транзакции,
+что и запись, из-за которой они меняются. ``recount`` пересчитывает их
+агрегатами и исправляет расхождения.
+"""
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import AuthorStats, Comment, Follow, Post, User
+
+AUTHOR_COUNTERS = {
+    'posts_count': (Post, 'author'),
+    'followers_count': (Follow, 'author'),
+    'following_count': (Follow, 'user'),
+}
+
+
+def _shift(field, delta):
+    return Greatest(F(field) + delta, 0)
+
+
+def change_author_stats(user_id, **deltas):
+    updates = {field: _shift(field, delta) for field, delta in deltas.items()}
+    if AuthorStats.objects.filter(user_id=user_id).update(**updates):
+        return
+    if all(delta < 0 for delta in deltas.values()):
+        # Строки нет или она удаляется вместе с пользователем
+        return
+    AuthorStats.objects.get_or_create(user_id=user_id)
+    AuthorStats.objects.filter(user_id=user_id).update(**updates)
+
+
+def change_comments_count(post_id, delta):
+    Post.objects.filter(pk=post_id).update(
+        comments_count=_shift('comments_count', delta))
+
+
+def _count(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(**{field: OuterRef('pk')}).order_by().values(
+            field).annotate(total=Count('pk')).values('total')
+    ), Value(0))
+
+
+def recount(dry_run=False, users=None, posts=None):
+    """Пересчитывает счетчики, возвращает число исправленных строк.
+
+    ``users`` и ``posts`` ограничивают пересчёт выборками пользователей и
+    записей; по умолчанию пересчитываются все.
+    """
+    fixed = 0
+    users = User.objects.all() if users is None else users
+    posts = Post.objects.all() if posts is None else posts
+    actual = users.annotate(**{
+        field: _count(model, related)
+        for field, (model, related) in AUTHOR_COUNTERS.items()
+    }).values('pk', *AUTHOR_COUNTERS)
+    stored = {
+        stats['user']: stats for stats in AuthorStats.objects.filter(
+            user__in=users.values('pk')).values('user', *AUTHOR_COUNTERS)
+    }
+    for row in actual.iterator():
+        user_id = row.pop('pk')
+        current = stored.get(user_id)
+        if current is not None:
+            current.pop('user')
+        elif not any(row.values()):
+            continue
+        if current == row:
+            continue
+        fixed += 1
+        if not dry_run:
+            AuthorStats.objects.update_or_create(user_id=user_id,
+                                                 defaults=row)
+
+    drifted = posts.annotate(
+        actual=_count(Comment, 'post')
+    ).exclude(comments_count=F('actual'))
+    for post_id, count in drifted.values_list('pk', 'actual').iterator():
+        fixed += 1
+        if not dry_run:
+            Post.objects.filter(pk=post_id).update(comments_count=count)
+    return fixed
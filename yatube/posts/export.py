@@ -0,0 +1,33 @@
+"""Потоковая выгрузка записей, комментариев и подписок в NDJSON.
+
+Строки читаются курсором базы пачками по ``EXPORT_CHUNK_SIZE`` в порядке
+id и сразу превращаются в строки JSON, поэтому память не зависит от
+размера таблицы. Каждая строка содержит id, так что прерванную выгрузку
+можно продолжить с последнего полученного id (``after``).
+"""
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .models import Comment, Follow, Post
+
+EXPORT_CHUNK_SIZE = 2000
+
+EXPORT_MODELS = {
+    'posts': Post,
+    'comments': Comment,
+    'follows': Follow,
+}
+
+
+def export_fields(model):
+    return [field.attname for field in model._meta.concrete_fields]
+
+
+def export_lines(name, after=0, chunk_size=EXPORT_CHUNK_SIZE):
+    """Строки NDJSON с объектами модели ``name``, у которых id больше
+    ``after``."""
+    model = EXPORT_MODELS[name]
+    rows = model.objects.filter(pk__gt=after).order_by('pk').values(
+        *export_fields(model)).iterator(chunk_size=chunk_size)
+    encoder = DjangoJSONEncoder(ensure_ascii=False)
+    for row in rows:
+        yield encoder.encode(row) + '\n'
@@ -0,0 +1,108 @@
+"""Общие запросы лент.
+
+Все ленты рендерятся карточкой ``includes/post_card.html``, поэтому и
+выбираются одним построителем: автор и группа подтягиваются JOIN-ом, а
+из таблиц читаются только поля, которые нужны карточке.
+"""
+from . import timeline
+from .caching import bump_version, drop_versions
+from .models import Comment, Post
+from .search import search_posts
+
+POST_CARD_FIELDS = (
+    'text',
+    'pub_date',
+    'image',
+    'comments_count',
+    'author',
+    'author__username',
+    'author__first_name',
+    'author__last_name',
+    'group',
+    'group__slug',
+    'group__title',
+)
+
+COMMENT_FIELDS = (
+    'text',
+    'created',
+    'post',
+    'author',
+    'author__username',
+)
+
+
+def feed_posts(queryset=None):
+    if queryset is None:
+        queryset = Post.objects.all()
+    return queryset.select_related('author', 'group').only(*POST_CARD_FIELDS)
+
+
+def index_feed():
+    return feed_posts()
+
+
+def group_feed(group):
+    return feed_posts(group.posts.all())
+
+
+def profile_feed(author):
+    return feed_posts(author.posts.all())
+
+
+# Лента подписок сортируется по полям ленты, а не записи
+FOLLOW_ORDERING = timeline.ORDERING
+
+
+def follow_feed(user):
+    return feed_posts(timeline.timeline_posts(user))
+
+
+def search_feed(query):
+    return feed_posts(search_posts(Post.objects.all(), query))
+
+
+def post_comments(post):
+    return post.comments.select_related('author').only(
+        *COMMENT_FIELDS).order_by('created', 'pk')
+
+
+def invalidate_post_feeds(author_id, group_ids=(), post_id=None):
+    """Сбрасывает кеш всех лент, в которых видна запись автора, и её
+    страницы."""
+    bump_version('index')
+    bump_version('profile', author_id)
+    if post_id is not None:
+        bump_version('post', post_id)
+    timeline.invalidate_feeds(author_id)
+    for group_id in set(group_ids) - {None}:
+        bump_version('group', group_id)
+
+
+def invalidate_author_feeds(author_ids, group_ids=()):
+    """Сбрасывает кеш лент, в карточках которых видны записи авторов, —
+    например, после смены имени автора или названия группы.
+
+    Страницы записей зависят от версии профиля автора. Ленты подписок
+    сбрасываются все сразу общей версией ``('follow', 'merged')``: такие
+    изменения редки, а подписчиков у авторов может быть много.
+    """
+    bump_version('index')
+    bump_version('follow', 'merged')
+    drop_versions([('profile', author_id) for author_id in set(author_ids)]
+                  + [('group', group_id)
+                     for group_id in set(group_ids) - {None}])
+
+
+def invalidate_author_name(author_id):
+    """Сбрасывает кеш всех страниц, где видно имя автора: ленты его
+    записей и комментарии к записям, которые он обсуждал."""
+    invalidate_author_feeds(
+        [author_id],
+        Post.objects.filter(author_id=author_id).values_list(
+            'group_id', flat=True).distinct(),
+    )
+    drop_versions(
+        ('post', post_id) for post_id in Comment.objects.filter(
+            author_id=author_id).values_list('post_id', flat=True).distinct()
+    )
@@ -0,0 +1,332 @@
+"""Массовая загрузка групп, записей, комментариев и подписок.
+
+Строки читаются из NDJSON или CSV и вставляются ``bulk_create`` пачками по
+``IMPORT_BATCH_SIZE``, каждая пачка — в своей транзакции. Сигналы моделей
+при этом не срабатывают, поэтому счётчики, ленты подписок, поисковый
+индекс и версии кеша лент обновляются один раз в конце
+(``refresh_derived``) — только для загруженных строк и затронутых ими
+пользователей. Если загрузка оборвалась, пересчёт всё равно выполняется
+для уже записанных пачек.
+
+Ссылки на пользователей, группы и записи разрешаются по таблицам в памяти,
+загруженным из базы одним запросом: автора можно указать именем
+(``author``) или id (``author_id``), группу — slug (``group``) или id
+(``group_id``), запись — id (``post`` или ``post_id``). Формат совпадает с
+выгрузкой ``exportdata``, так что её можно загрузить обратно: записи и
+комментарии, чьи id в базе уже заняты, пропускаются с ошибкой строки.
+"""
+import csv
+import json
+from itertools import islice
+
+from django.core.management.color import no_style
+from django.db import connection, transaction
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from . import feeds, search, timeline
+from .caching import drop_versions
+from .counters import recount
+from .models import Comment, Follow, Group, Post, User
+from .seeding import preserve_dates
+
+IMPORT_BATCH_SIZE = 5000
+FORMATS = ('ndjson', 'csv')
+
+
+class RowError(ValueError):
+    """Строку нельзя загрузить; она пропускается."""
+
+
+def _json(line):
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+
+def read_rows(stream, format):
+    """Словари строк из текстового потока в формате ``format``; вместо
+    неразборчивых строк NDJSON — ``None``."""
+    if format == 'csv':
+        return csv.DictReader(stream)
+    return (_json(line) for line in stream if line.strip())
+
+
+def _value(row, name):
+    value = row.get(name)
+    return None if value in (None, '') else value
+
+
+def _required(row, name):
+    value = _value(row, name)
+    if value is None:
+        raise RowError(f'нет поля {name}')
+    return value
+
+
+def _id(value, name):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise RowError(f'{name}: неверный id «{value}»')
+
+
+def _datetime(row, name):
+    value = _value(row, name)
+    if value is None:
+        return timezone.now()
+    parsed = parse_datetime(str(value))
+    if parsed is None:
+        raise RowError(f'{name}: неверная дата «{value}»')
+    if timezone.is_naive(parsed):
+        parsed = timezone.make_aware(parsed)
+    return parsed
+
+
+class Lookup:
+    """Таблица «ключ → id» объектов модели, загруженная одним запросом.
+
+    Без ``key`` хранит только множество id.
+    """
+
+    def __init__(self, queryset, key=None):
+        if key is None:
+            self.by_key = {}
+            self.ids = set(queryset.values_list('pk', flat=True))
+        else:
+            self.by_key = dict(queryset.values_list(key, 'pk'))
+            self.ids = set(self.by_key.values())
+        self.key = key
+
+    def resolve(self, row, name, required=True):
+        """id объекта по полю ``name_id`` или ``name``."""
+        value = _value(row, f'{name}_id')
+        if value is None and self.key is None:
+            value = _value(row, name)
+        if value is not None:
+            pk = _id(value, name)
+            if pk not in self.ids:
+                raise RowError(f'{name}: нет объекта с id {pk}')
+            return pk
+        value = _value(row, name)
+        if value is None:
+            if required:
+                raise RowError(f'нет поля {name}')
+            return None
+        try:
+            return self.by_key[str(value)]
+        except KeyError:
+            raise RowError(f'{name}: не найден «{value}»')
+
+
+LOOKUPS = {
+    'user': lambda: Lookup(User.objects.all(), 'username'),
+    'group': lambda: Lookup(Group.objects.all(), 'slug'),
+    'post': lambda: Lookup(Post.objects.all()),
+    'comment': lambda: Lookup(Comment.objects.all()),
+}
+
+
+class Lookups:
+    """Таблицы ссылок, загружаемые при первом обращении."""
+
+    def __init__(self):
+        self._tables = {}
+
+    def __getitem__(self, name):
+        if name not in self._tables:
+            self._tables[name] = LOOKUPS[name]()
+        return self._tables[name]
+
+    def forget(self, name):
+        """Перечитать таблицу при следующем обращении: id, выданные базой
+        при вставке, в ней неизвестны."""
+        self._tables.pop(name, None)
+
+
+def _with_id(row, instance, existing=None):
+    """Переносит в объект явный id строки. Id из ``existing`` (``Lookup``
+    модели) заняты: такая строка пропускается, а новый id запоминается."""
+    value = _value(row, 'id')
+    if value is not None:
+        instance.pk = _id(value, 'id')
+        if existing is not None:
+            if instance.pk in existing.ids:
+                raise RowError(f'id {instance.pk} уже занят')
+            existing.ids.add(instance.pk)
+    return instance
+
+
+def build_group(row, lookups):
+    return _with_id(row, Group(
+        title=_required(row, 'title'),
+        slug=_required(row, 'slug'),
+        description=_value(row, 'description') or '',
+    ))
+
+
+def build_post(row, lookups):
+    author_id = lookups['user'].resolve(row, 'author')
+    group_id = lookups['group'].resolve(row, 'group', required=False)
+    return _with_id(row, Post(
+        text=_required(row, 'text'),
+        pub_date=_datetime(row, 'pub_date'),
+        author_id=author_id,
+        group_id=group_id,
+        image=_value(row, 'image') or '',
+    ), lookups['post'])
+
+
+def build_comment(row, lookups):
+    post_id = lookups['post'].resolve(row, 'post')
+    author_id = lookups['user'].resolve(row, 'author')
+    return _with_id(row, Comment(
+        text=_required(row, 'text'),
+        created=_datetime(row, 'created'),
+        post_id=post_id,
+        author_id=author_id,
+    ), lookups['comment'])
+
+
+def build_follow(row, lookups):
+    follow = Follow(user_id=lookups['user'].resolve(row, 'user'),
+                    author_id=lookups['user'].resolve(row, 'author'))
+    if follow.user_id == follow.author_id:
+        raise RowError('подписка на самого себя')
+    return follow
+
+
+# Модель, построитель объекта и таблица ``Lookups`` с id модели. Без
+# таблицы уже существующие объекты пропускает сама база
+IMPORTERS = {
+    'groups': (Group, build_group, None),
+    'posts': (Post, build_post, 'post'),
+    'comments': (Comment, build_comment, 'comment'),
+    'follows': (Follow, build_follow, None),
+}
+# Порядок загрузки: сначала то, на что ссылаются
+IMPORT_ORDER = ('groups', 'posts', 'comments', 'follows')
+DATE_FIELDS = (Post._meta.get_field('pub_date'),
+               Comment._meta.get_field('created'))
+
+
+class ImportResult:
+    """Итог загрузки одного файла."""
+
+    def __init__(self):
+        self.read = 0
+        self.created = 0
+        self.errors = []
+        # Строки без явного id получают id не меньше first_id; явные id
+        # меньше него перечислены в ids
+        self.first_id = None
+        self.ids = set()
+
+    def loaded(self, model):
+        """Выборка объектов модели, которые могли быть загружены."""
+        if self.first_id is None:
+            return model.objects.none()
+        return model.objects.filter(Q(pk__gte=self.first_id)
+                                    | Q(pk__in=self.ids))
+
+
+def _objects(rows, build, lookups, result):
+    for line, row in enumerate(rows, 1):
+        result.read += 1
+        try:
+            if not isinstance(row, dict):
+                raise RowError('не объект JSON')
+            yield build(row, lookups)
+        except RowError as error:
+            result.errors.append((line, str(error)))
+
+
+def load(name, rows, batch_size=IMPORT_BATCH_SIZE, lookups=None,
+         result=None):
+    """Загружает строки ``rows`` в модель ``name`` из ``IMPORTERS``.
+
+    Строки с ошибками пропускаются и попадают в ``ImportResult.errors``.
+    ``result`` заполняется по ходу загрузки, так что и после исключения
+    в нём видно, какие строки могли попасть в базу.
+    """
+    model, build, table = IMPORTERS[name]
+    lookups = lookups or Lookups()
+    result = result or ImportResult()
+    before = model.objects.count()
+    last = model.objects.order_by('-pk').values_list('pk', flat=True).first()
+    result.first_id = (last or 0) + 1
+    explicit_ids = False
+    objects = _objects(rows, build, lookups, result)
+    try:
+        with preserve_dates(*DATE_FIELDS):
+            while True:
+                batch = list(islice(objects, batch_size))
+                if not batch:
+                    break
+                ids = [obj.pk for obj in batch if obj.pk is not None]
+                if ids:
+                    explicit_ids = True
+                    result.ids.update(
+                        pk for pk in ids if pk < result.first_id)
+                with transaction.atomic():
+                    model.objects.bulk_create(
+                        batch, ignore_conflicts=table is None)
+    finally:
+        if explicit_ids:
+            _reset_sequence(model)
+        if table is not None:
+            lookups.forget(table)
+        result.created = model.objects.count() - before
+    return result
+
+
+def _reset_sequence(model):
+    """Сдвигает счётчик id за загруженные явные id, как ``loaddata``."""
+    statements = connection.ops.sequence_reset_sql(no_style(), [model])
+    with connection.cursor() as cursor:
+        for statement in statements:
+            cursor.execute(statement)
+
+
+def refresh_derived(results, log=None):
+    """Обновляет производные данные после загрузки.
+
+    ``results`` — ``ImportResult`` загруженных файлов по именам из
+    ``IMPORTERS``. Пересчитываются счётчики затронутых пользователей и
+    записей, ленты подписчиков авторов загруженных записей и новых
+    подписчиков, поисковый индекс загруженных записей; кеш лент
+    сбрасывается версиями.
+    """
+    log = log or (lambda message: None)
+
+    def loaded(name):
+        model = IMPORTERS[name][0]
+        if name not in results:
+            return model.objects.none()
+        return results[name].loaded(model)
+
+    posts, comments, follows = (
+        loaded('posts'), loaded('comments'), loaded('follows'))
+    authors = posts.values('author')
+    users = User.objects.filter(Q(pk__in=authors)
+                                | Q(pk__in=follows.values('user'))
+                                | Q(pk__in=follows.values('author')))
+    commented = Post.objects.filter(pk__in=comments.values('post'))
+    recount(users=users, posts=commented)
+    # Записи популярных авторов подмешиваются при чтении, и ленты их
+    # подписчиков пересобирать незачем
+    readers = User.objects.filter(
+        Q(pk__in=Follow.objects.filter(author__in=authors).exclude(
+            author__stats__merged=True).values('user'))
+        | Q(pk__in=follows.values('user')))
+    timeline.rebuild(readers)
+    log('Счётчики и ленты подписок пересчитаны')
+    search.reindex(posts)
+    log('Поисковый индекс построен')
+    feeds.invalidate_author_feeds(
+        users.values_list('pk', flat=True),
+        posts.values_list('group_id', flat=True).distinct())
+    drop_versions(('post', post_id)
+                  for post_id in commented.values_list('pk', flat=True))
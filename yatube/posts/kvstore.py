@@ -0,0 +1,35 @@
+"""Хранилище sorl, которое запоминает промахи ненадолго.
+
+sorl кеширует и найденные миниатюры, и их отсутствие на
+``THUMBNAIL_CACHE_TIMEOUT`` (по умолчанию 10 лет). Если кеш у каждого
+процесса свой, процесс, запомнивший промах, так и не увидел бы миниатюру,
+созданную другим процессом, и всегда отдавал бы оригинал. Поэтому промахи
+живут в кеше только ``THUMBNAIL_MISS_TIMEOUT`` секунд.
+"""
+from sorl.thumbnail.conf import settings
+from sorl.thumbnail.kvstores.cached_db_kvstore import (
+    EMPTY_VALUE, KVStore as CachedDBKVStore)
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+
+class KVStore(CachedDBKVStore):
+    def _get_raw(self, key):
+        value = self.cache.get(key)
+        if value is None:
+            value = KVStoreModel.objects.filter(key=key).values_list(
+                'value', flat=True).first()
+            if value is None:
+                self.remember({}, [key])
+                return None
+            self.remember({key: value}, [])
+        if value == EMPTY_VALUE:
+            return None
+        return value
+
+    def remember(self, found, missing):
+        """Запоминает найденные значения надолго, а промахи — ненадолго."""
+        if found:
+            self.cache.set_many(found, settings.THUMBNAIL_CACHE_TIMEOUT)
+        if missing:
+            self.cache.set_many(dict.fromkeys(missing, EMPTY_VALUE),
+                                settings.THUMBNAIL_MISS_TIMEOUT)
@@ -0,0 +1,114 @@
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.benchmark import FETCHERS, SERVERS, compare, run
+from posts.seeding import seed
+
+
+class Command(BaseCommand):
+    help = ('Замеряет пропускную способность и задержки маршрутов '
+            'posts.urls, сохраняет результаты в JSON и сравнивает их с '
+            'прошлым запуском. Может предварительно наполнить базу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed-posts', type=int, default=0,
+            help='Сколько синтетических записей создать перед замером.'
+        )
+        parser.add_argument('--seed-users', type=int, default=10000)
+        parser.add_argument('--seed-groups', type=int, default=100)
+        parser.add_argument('--seed-follows', type=int, default=20)
+        parser.add_argument('--seed-comments', type=int, default=0)
+        parser.add_argument('--seed-images', type=int, default=0)
+        parser.add_argument(
+            '--modes', nargs='+', choices=sorted(FETCHERS) + sorted(SERVERS),
+            default=['client', 'server'],
+            help='Последовательно: тестовый клиент Django, локальный '
+                 'WSGI-сервер; одновременно из --concurrency соединений: '
+                 'WSGI- или ASGI-сервер с пулом из ASGI_THREADS потоков.'
+        )
+        parser.add_argument(
+            '--concurrency', type=int, default=16,
+            help='Одновременных соединений в режимах wsgi и asgi.'
+        )
+        parser.add_argument(
+            '--requests', type=int, default=50,
+            help='Сколько раз запросить каждый маршрут.'
+        )
+        parser.add_argument('--warmup', type=int, default=1)
+        parser.add_argument(
+            '--cold', action='store_true',
+            help='Очищать кеш перед каждым запросом.'
+        )
+        parser.add_argument(
+            '--output', help='Куда сохранить результаты в JSON.'
+        )
+        parser.add_argument(
+            '--compare', help='JSON прошлого запуска для сравнения.'
+        )
+        parser.add_argument(
+            '--max-regression', type=float, default=None,
+            help='Завершиться с ошибкой, если метрика ухудшилась больше '
+                 'чем на столько процентов.'
+        )
+
+    def handle(self, *args, **options):
+        if options['seed_posts']:
+            seed(users=options['seed_users'], posts=options['seed_posts'],
+                 groups=options['seed_groups'],
+                 follows=options['seed_follows'],
+                 comments=options['seed_comments'],
+                 images=options['seed_images'], log=self.stdout.write)
+        if settings.DEBUG:
+            self.stderr.write('DEBUG включён: запросы к базе логируются, '
+                              'замеры будут завышены.')
+
+        report = run(options['modes'], options['requests'],
+                     options['warmup'], options['cold'],
+                     options['concurrency'])
+        if report is None:
+            raise CommandError('В базе нет пользователей, '
+                               'запустите команду с --seed-posts.')
+        self.print_report(report)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+        if options['compare']:
+            with open(options['compare']) as file:
+                baseline = json.load(file)
+            self.print_comparison(baseline, report,
+                                  options['max_regression'])
+
+    def print_report(self, report):
+        self.stdout.write('режим\tмаршрут\tкод\tзапросов/с\tp50, мс\t'
+                          'p99, мс\tSQL')
+        for mode, routes in report['results'].items():
+            for route, result in routes.items():
+                queries = result['queries']
+                self.stdout.write(
+                    f"{mode}\t{route}\t{result['status']}\t"
+                    f"{result['throughput']:.1f}\t{result['p50_ms']:.1f}\t"
+                    f"{result['p99_ms']:.1f}\t"
+                    f"{'-' if queries is None else f'{queries:.1f}'}"
+                )
+        if report['skipped']:
+            self.stdout.write('Не замерялись: ' + ', '.join(report['skipped']))
+
+    def print_comparison(self, baseline, report, max_regression):
+        rows = compare(baseline, report, max_regression or 0.0)
+        self.stdout.write(
+            f"Сравнение с {baseline['meta'].get('commit') or 'прошлым'}:")
+        regressions = []
+        for mode, route, metric, before, after, change, worse in rows:
+            mark = ' !' if worse else ''
+            self.stdout.write(f'{mode}\t{route}\t{metric}\t{before:.1f}\t'
+                              f'{after:.1f}\t{change:+.1f}%{mark}')
+            if worse:
+                regressions.append(f'{mode} {route} {metric}')
+        if max_regression is not None and regressions:
+            raise CommandError('Ухудшение больше чем на '
+                               f'{max_regression}%: '
+                               + ', '.join(regressions))
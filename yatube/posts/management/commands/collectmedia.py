@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from posts.media import collect_orphans
+
+
+class Command(BaseCommand):
+    help = ('Удаляет картинки записей и их миниатюры, на которые не '
+            'ссылается ни одна запись.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать лишние файлы, ничего не удаляя.'
+        )
+
+    def handle(self, *args, **options):
+        orphans = collect_orphans(dry_run=options['dry_run'])
+        for name in orphans:
+            self.stdout.write(name)
+        action = 'Найдено' if options['dry_run'] else 'Удалено'
+        self.stdout.write(f'{action} файлов: {len(orphans)}')
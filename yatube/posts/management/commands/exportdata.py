@@ -0,0 +1,91 @@
+import gzip
+import json
+import os
+import sys
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+
+from posts.export import EXPORT_CHUNK_SIZE, EXPORT_MODELS, export_lines
+
+
+class Command(BaseCommand):
+    help = ('Потоково выгружает записи, комментарии или подписки в NDJSON '
+            'с постоянным расходом памяти.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('model', choices=sorted(EXPORT_MODELS))
+        parser.add_argument(
+            '--output', '-o', default='-',
+            help='Файл для выгрузки; по умолчанию стандартный вывод.'
+        )
+        parser.add_argument(
+            '--gzip', action='store_true', help='Сжимать выгрузку gzip.'
+        )
+        parser.add_argument(
+            '--after', type=int, default=0,
+            help='Выгрузить только объекты с id больше этого.'
+        )
+        parser.add_argument(
+            '--resume', action='store_true',
+            help='Продолжить выгрузку в существующий файл с его '
+                 'последнего id.'
+        )
+        parser.add_argument(
+            '--chunk-size', type=int, default=EXPORT_CHUNK_SIZE,
+            help='Сколько строк читать из базы за раз.'
+        )
+
+    def handle(self, *args, **options):
+        path = options['output']
+        after = options['after']
+        mode = 'wb'
+        if options['resume']:
+            if path == '-':
+                raise CommandError('--resume работает только с --output.')
+            if os.path.exists(path):
+                after = max(after, self.watermark(path, options['gzip']))
+                mode = 'ab'
+
+        count, last = 0, after
+        with ExitStack() as stack:
+            if path == '-':
+                stream = sys.stdout.buffer
+            else:
+                stream = stack.enter_context(open(path, mode))
+            if options['gzip']:
+                # Дозапись добавляет в файл новый gzip-поток, который
+                # читается как продолжение предыдущего
+                stream = stack.enter_context(
+                    gzip.GzipFile(fileobj=stream, mode=mode))
+            for line in export_lines(options['model'], after,
+                                     options['chunk_size']):
+                stream.write(line.encode())
+                count += 1
+            if count:
+                last = json.loads(line)['id']
+            stream.flush()
+        self.stderr.write(f'Выгружено: {count}, последний id: {last}')
+
+    def watermark(self, path, compressed):
+        """id последней целой строки файла; оборванный хвост обычного
+        файла отрезается."""
+        last, end = 0, 0
+        opener = gzip.open if compressed else open
+        try:
+            with opener(path, 'rb') as file:
+                for line in file:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        last = json.loads(line)['id']
+                    except (ValueError, KeyError):
+                        break
+                    end += len(line)
+        except (EOFError, OSError):
+            raise CommandError(
+                f'{path} повреждён. Начните новый файл с --after {last}.')
+        if not compressed:
+            with open(path, 'r+b') as file:
+                file.truncate(end)
+        return last
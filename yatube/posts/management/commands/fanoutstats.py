@@ -0,0 +1,71 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from posts.models import User
+
+
+class Command(BaseCommand):
+    help = ('Показывает число подписчиков авторов и ожидаемое число '
+            'записей в ленты при заданном пороге fan-out.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--threshold', type=int,
+            default=settings.FANOUT_FOLLOWER_THRESHOLD,
+            help='Порог подписчиков, выше которого записи не раскладываются.'
+        )
+        parser.add_argument(
+            '--days', type=int, default=30,
+            help='За сколько последних дней считать публикации.'
+        )
+        parser.add_argument(
+            '--limit', type=int, default=20,
+            help='Сколько авторов с наибольшим числом подписчиков вывести.'
+        )
+
+    def handle(self, *args, **options):
+        threshold = options['threshold']
+        since = timezone.now() - timedelta(days=options['days'])
+        authors = User.objects.annotate(
+            followers=Count('following', distinct=True),
+            recent_posts=Count(
+                'posts', filter=Q(posts__pub_date__gte=since), distinct=True
+            ),
+        ).filter(followers__gt=0).order_by('-followers')
+
+        fanned_out = merged = merged_authors = 0
+        rows = []
+        for author in authors.iterator():
+            writes = author.followers * author.recent_posts
+            if author.followers > threshold:
+                merged += writes
+                merged_authors += 1
+            else:
+                fanned_out += writes
+            if len(rows) < options['limit']:
+                rows.append(author)
+
+        self.stdout.write(
+            f'{"Автор":<30} {"Подписчики":>12} {"Записи":>8} {"Вставки":>12}'
+        )
+        for author in rows:
+            writes = author.followers * author.recent_posts
+            mode = 'при чтении' if author.followers > threshold else ''
+            self.stdout.write(
+                f'{author.username:<30} {author.followers:>12} '
+                f'{author.recent_posts:>8} {writes:>12} {mode}'
+            )
+
+        self.stdout.write('')
+        self.stdout.write(f'Порог: {threshold} подписчиков')
+        self.stdout.write(
+            f'Вставок в ленты за {options["days"]} дн.: {fanned_out} '
+            f'(без порога было бы {fanned_out + merged})'
+        )
+        self.stdout.write(
+            f'Авторов, подмешиваемых при чтении: {merged_authors}'
+        )
@@ -0,0 +1,107 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from posts import feeds
+from posts.models import Follow, Post
+from posts.paginators import CursorPaginator
+from posts.seeding import seed
+
+# Сортировка лент, которые листаются не по полям записи
+ORDERINGS = {'follow_index': feeds.FOLLOW_ORDERING}
+
+
+class Command(BaseCommand):
+    help = ('Выводит планы запросов лент и проверяет, что они читают '
+            'записи по индексам. Может предварительно наполнить базу.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seed-posts', type=int, default=0,
+            help='Сколько синтетических записей создать перед проверкой.'
+        )
+        parser.add_argument('--seed-users', type=int, default=10000)
+        parser.add_argument('--seed-groups', type=int, default=100)
+        parser.add_argument(
+            '--check', action='store_true',
+            help='Завершиться с ошибкой, если запрос читает таблицу целиком.'
+        )
+
+    def handle(self, *args, **options):
+        if options['seed_posts']:
+            seed(users=options['seed_users'], posts=options['seed_posts'],
+                 groups=options['seed_groups'], log=self.stdout.write)
+
+        latest = Post.objects.exclude(group=None).order_by('-pub_date').first()
+        if latest is None:
+            raise CommandError('В базе нет записей с группой, '
+                               'запустите команду с --seed-posts.')
+        author, group = latest.author, latest.group
+        follow = Follow.objects.filter(author=author).first()
+        reader = follow.user if follow else author
+
+        problems = []
+        for name, queryset in self.feeds(reader, author, group).items():
+            ordering = ORDERINGS.get(name, ('-pub_date', '-pk'))
+            for label, params in self.pages(queryset, ordering):
+                with CaptureQueriesContext(connection) as queries:
+                    paginator = CursorPaginator(
+                        queryset, settings.POSTS_LIMIT, ordering=ordering)
+                    list(paginator.page_for(params))
+                problems += self.report(f'{name} ({label})', queries)
+
+        with CaptureQueriesContext(connection) as queries:
+            Follow.objects.filter(user=reader, author=author).exists()
+        problems += self.report('profile (following)', queries)
+
+        if problems and options['check']:
+            raise CommandError('Без индекса: ' + ', '.join(problems))
+
+    def feeds(self, reader, author, group):
+        return {
+            'index': feeds.index_feed(),
+            'group_posts': feeds.group_feed(group),
+            'profile': feeds.profile_feed(author),
+            'follow_index': feeds.follow_feed(reader),
+        }
+
+    def pages(self, queryset, ordering):
+        yield 'первая страница', {}
+        paginator = CursorPaginator(queryset, settings.POSTS_LIMIT,
+                                    ordering=ordering)
+        deep = queryset.order_by('pub_date', 'pk')[
+            settings.POSTS_LIMIT:settings.POSTS_LIMIT + 1].first()
+        if deep is not None:
+            yield 'глубокая страница', {
+                'after': paginator.encode_cursor(deep)}
+
+    def report(self, name, queries):
+        problems = []
+        for query in queries.captured_queries:
+            plan = self.explain(query['sql'])
+            self.stdout.write(f'{name}: {float(query["time"]) * 1000:.1f} мс')
+            for line in plan:
+                self.stdout.write(f'    {line}')
+            if not self.uses_indexes(plan):
+                problems.append(name)
+        return problems
+
+    def explain(self, sql):
+        prefix = ('EXPLAIN QUERY PLAN ' if connection.vendor == 'sqlite'
+                  else 'EXPLAIN ')
+        with connection.cursor() as cursor:
+            cursor.execute(prefix + sql)
+            return [' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()]
+
+    def uses_indexes(self, plan):
+        if connection.vendor != 'sqlite':
+            return not any('Seq Scan' in line for line in plan)
+        for line in plan:
+            if 'TEMP B-TREE' in line:
+                return False
+            words = line.split()
+            if 'SCAN' in words and 'USING' not in words:
+                return False
+        return True
@@ -0,0 +1,97 @@
+import gzip
+import sys
+import time
+from contextlib import ExitStack
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import IntegrityError
+
+from posts.importing import (FORMATS, IMPORT_BATCH_SIZE, IMPORT_ORDER,
+                             ImportResult, Lookups, load, read_rows,
+                             refresh_derived)
+
+# Сколько ошибок в строках показывать для каждого файла
+SHOWN_ERRORS = 10
+
+
+class Command(BaseCommand):
+    help = ('Массово загружает группы, записи, комментарии и подписки из '
+            'NDJSON или CSV. Счётчики, ленты подписок и поисковый индекс '
+            'пересчитываются один раз после загрузки.')
+
+    def add_arguments(self, parser):
+        for name in IMPORT_ORDER:
+            parser.add_argument(
+                f'--{name}', metavar='FILE',
+                help=f'Файл с {name}; «-» — стандартный ввод, '
+                     '«.gz» распаковывается.'
+            )
+        parser.add_argument(
+            '--format', choices=FORMATS,
+            help='Формат файлов; по умолчанию определяется по расширению.'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=IMPORT_BATCH_SIZE,
+            help='Сколько объектов вставлять за раз.'
+        )
+
+    def handle(self, *args, **options):
+        files = [(name, options[name]) for name in IMPORT_ORDER
+                 if options[name]]
+        if not files:
+            raise CommandError('Укажите хотя бы один файл: '
+                               + ', '.join(f'--{name}'
+                                           for name in IMPORT_ORDER))
+        lookups = Lookups()
+        results = {}
+        try:
+            for name, path in files:
+                self.load(name, path, options, lookups, results)
+        finally:
+            # Пачки, записанные до ошибки, остаются в базе, и производные
+            # данные для них нужны так же
+            if results:
+                started = time.perf_counter()
+                refresh_derived(results, self.stdout.write)
+                self.stdout.write('Производные данные пересчитаны за '
+                                  f'{time.perf_counter() - started:.1f} с')
+
+    def load(self, name, path, options, lookups, results):
+        with ExitStack() as stack:
+            stream = self.open(stack, path)
+            rows = read_rows(stream, options['format']
+                             or self.guess_format(path))
+            started = time.perf_counter()
+            result = results[name] = ImportResult()
+            try:
+                load(name, rows, options['batch_size'], lookups, result)
+            except IntegrityError as error:
+                raise CommandError(f'{name}: {error}')
+            elapsed = time.perf_counter() - started
+        self.report(name, result, elapsed)
+
+    def open(self, stack, path):
+        if path == '-':
+            return sys.stdin
+        try:
+            if path.endswith('.gz'):
+                return stack.enter_context(
+                    gzip.open(path, 'rt', encoding='utf-8', newline=''))
+            return stack.enter_context(
+                open(path, encoding='utf-8', newline=''))
+        except OSError as error:
+            raise CommandError(f'Не удалось открыть {path}: {error}')
+
+    def guess_format(self, path):
+        if path.endswith('.gz'):
+            path = path[:-len('.gz')]
+        return 'csv' if path.endswith('.csv') else 'ndjson'
+
+    def report(self, name, result, elapsed):
+        rate = result.read / elapsed if elapsed else 0
+        self.stdout.write(
+            f'{name}: прочитано {result.read}, добавлено {result.created}, '
+            f'пропущено {len(result.errors)} за {elapsed:.1f} с '
+            f'({rate:.0f} строк/с)')
+        for line, error in result.errors[:SHOWN_ERRORS]:
+            self.stderr.write(f'{name}, строка {line}: {error}')
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from posts.counters import recount
+
+
+class Command(BaseCommand):
+    help = ('Пересчитывает счетчики записей, подписок и комментариев '
+            'и исправляет расхождения.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать число расхождений, ничего не меняя.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            fixed = recount(dry_run=options['dry_run'])
+        action = 'Найдено' if options['dry_run'] else 'Исправлено'
+        self.stdout.write(f'{action} расхождений: {fixed}')
@@ -0,0 +1,86 @@
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import django
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import UploadedFile
+from django.core.management.base import BaseCommand
+from PIL import Image
+
+from posts.uploads import normalize_image
+
+
+def peak_memory():
+    """Пиковый размер резидентной памяти процесса в килобайтах.
+
+    В Linux берётся VmHWM: в отличие от ``ru_maxrss`` он не наследует пик
+    родителя, от которого процесс запущен через fork + exec.
+    """
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmHWM:'):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def measure_upload(path):
+    """Нормализует файл и возвращает пиковый прирост памяти процесса."""
+    before = peak_memory()
+    started = time.perf_counter()
+    with open(path, 'rb') as file:
+        upload = UploadedFile(file, os.path.basename(path),
+                              size=os.path.getsize(path))
+        try:
+            result = normalize_image(upload)
+        except ValidationError:
+            size = None
+        else:
+            result.seek(0, os.SEEK_END)
+            size = result.tell()
+    elapsed = time.perf_counter() - started
+    after = peak_memory()
+    return size, (after - before) / 1024, elapsed
+
+
+class Command(BaseCommand):
+    help = ('Измеряет пиковую память и время нормализации загружаемых '
+            'картинок разного размера.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--megapixels', type=int, nargs='+', default=[2, 12, 24, 40],
+            help='Размеры синтетических JPEG-картинок в мегапикселях.'
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('МП\tисходник, КБ\tрезультат, КБ\tпамять, МБ\tмс')
+        with tempfile.TemporaryDirectory() as directory:
+            for megapixels in options['megapixels']:
+                path = self.make_image(directory, megapixels)
+                # Каждый замер в свежем процессе: пик памяти не убывает
+                with ProcessPoolExecutor(
+                        max_workers=1,
+                        mp_context=multiprocessing.get_context('spawn'),
+                        initializer=django.setup) as executor:
+                    size, memory, elapsed = executor.submit(
+                        measure_upload, path).result()
+                result = 'отклонён' if size is None else size // 1024
+                self.stdout.write(
+                    f'{megapixels}\t{os.path.getsize(path) // 1024}\t'
+                    f'{result}\t{memory:.1f}\t{elapsed * 1000:.0f}'
+                )
+
+    def make_image(self, directory, megapixels):
+        width = int((megapixels * 10 ** 6 * 4 / 3) ** 0.5)
+        height = megapixels * 10 ** 6 // width
+        path = os.path.join(directory, f'{megapixels}mp.jpg')
+        Image.linear_gradient('L').resize((width, height)).convert(
+            'RGB').save(path, 'JPEG', quality=90)
+        return path
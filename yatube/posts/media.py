@@ -0,0 +1,57 @@
+"""Сборка мусора в картинках записей.
+
+Одинаковые картинки хранятся одним файлом (см. ``storage``), поэтому файл
+можно удалить, только когда на него не ссылается ни одна запись. При
+удалении или замене картинки файл не трогается: одновременная загрузка
+такой же картинки получает то же имя, а её запись ещё не видна. Лишние
+файлы вместе с миниатюрами и их записями в хранилище sorl удаляет
+``collect_orphans`` (команда ``collectmedia``), пропуская свежие файлы.
+"""
+import posixpath
+from datetime import timedelta
+
+from django.utils import timezone
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from .models import Post
+from .storage import post_images
+
+UPLOAD_DIRECTORY = 'posts'
+
+
+def delete_image(name):
+    default.kvstore.delete(ImageFile(name, post_images))
+    post_images.delete(name)
+
+
+def _walk(directory):
+    directories, files = post_images.listdir(directory)
+    for file_name in files:
+        yield posixpath.join(directory, file_name)
+    for subdirectory in directories:
+        yield from _walk(posixpath.join(directory, subdirectory))
+
+
+def collect_orphans(dry_run=False, min_age=timedelta(hours=1)):
+    """Удаляет файлы картинок, на которые не ссылается ни одна запись, и
+    возвращает их имена.
+
+    Файлы, загруженные позже чем ``min_age`` назад, не трогаются: их
+    запись может быть ещё не зафиксирована. Повторная загрузка того же
+    содержимого обновляет время файла (см. ``storage``).
+    """
+    if not post_images.exists(UPLOAD_DIRECTORY):
+        return []
+    referenced = set(Post.objects.exclude(image='').values_list(
+        'image', flat=True).iterator())
+    created_before = timezone.now() - min_age
+    orphans = [
+        name for name in _walk(UPLOAD_DIRECTORY)
+        if name not in referenced
+        and post_images.get_modified_time(name) < created_before
+    ]
+    if not dry_run:
+        for name in orphans:
+            delete_image(name)
+    return orphans
@@ -0,0 +1,48 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:18
+
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def backfill_timelines(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    TimelineEntry = apps.get_model('posts', 'TimelineEntry')
+    for follow in Follow.objects.iterator():
+        posts = Post.objects.filter(author_id=follow.author_id).order_by(
+            '-pub_date')[:settings.TIMELINE_LENGTH]
+        TimelineEntry.objects.bulk_create(
+            (TimelineEntry(user_id=follow.user_id, post_id=post.pk,
+                           pub_date=post.pub_date) for post in posts),
+            ignore_conflicts=True,
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0006_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TimelineEntry',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('pub_date', models.DateTimeField()),
+                ('post', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline_entries', to='posts.Post')),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='timeline', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='timelineentry',
+            index=models.Index(fields=['user', '-pub_date', '-post'], name='timeline_user_pub_date_idx'),
+        ),
+        migrations.AddConstraint(
+            model_name='timelineentry',
+            constraint=models.UniqueConstraint(fields=('user', 'post'), name='unique_timeline_entry'),
+        ),
+        migrations.RunPython(backfill_timelines, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0007_timelineentry'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='follow',
+            index=models.Index(fields=['user', 'author'], name='follow_user_author_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['-pub_date', '-id'], name='post_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['author', '-pub_date', '-id'], name='post_author_pub_date_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='post',
+            index=models.Index(fields=['group', '-pub_date', '-id'], name='post_group_pub_date_idx'),
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:28
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def remove_duplicate_follows(apps, schema_editor):
+    Follow = apps.get_model('posts', 'Follow')
+    duplicates = Follow.objects.values('user', 'author').annotate(
+        first=Min('pk'), total=Count('pk')).filter(total__gt=1)
+    for duplicate in duplicates.iterator():
+        Follow.objects.filter(
+            user=duplicate['user'], author=duplicate['author'],
+        ).exclude(pk=duplicate['first']).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0008_feed_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(remove_duplicate_follows,
+                             migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='follow',
+            constraint=models.UniqueConstraint(fields=('user', 'author'), name='unique_follow'),
+        ),
+        migrations.RemoveIndex(
+            model_name='follow',
+            name='follow_user_author_idx',
+        ),
+    ]
@@ -0,0 +1,56 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:29
+
+from django.conf import settings
+from django.db import migrations, models
+from django.db.models import Count
+import django.db.models.deletion
+
+
+def fill_counters(apps, schema_editor):
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    Comment = apps.get_model('posts', 'Comment')
+    Follow = apps.get_model('posts', 'Follow')
+    Post = apps.get_model('posts', 'Post')
+    stats = {}
+    for model, field, counter in ((Post, 'author', 'posts_count'),
+                                  (Follow, 'author', 'followers_count'),
+                                  (Follow, 'user', 'following_count')):
+        rows = model.objects.order_by().values(field).annotate(
+            total=Count('pk'))
+        for row in rows.iterator():
+            stats.setdefault(row[field], {})[counter] = row['total']
+    AuthorStats.objects.bulk_create(
+        AuthorStats(user_id=user_id, **counters)
+        for user_id, counters in stats.items()
+    )
+    rows = Comment.objects.order_by().values('post').annotate(
+        total=Count('pk'))
+    for row in rows.iterator():
+        Post.objects.filter(pk=row['post']).update(
+            comments_count=row['total'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0009_unique_follow'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuthorStats',
+            fields=[
+                ('user', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='stats', serialize=False, to=settings.AUTH_USER_MODEL)),
+                ('posts_count', models.PositiveIntegerField(default=0)),
+                ('followers_count', models.PositiveIntegerField(default=0)),
+                ('following_count', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='comments_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_counters, migrations.RunPython.noop),
+    ]
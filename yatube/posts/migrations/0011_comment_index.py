@@ -0,0 +1,17 @@
+# Generated by Django 2.2.16 on 2026-10-18 04:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_counters'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='comment',
+            index=models.Index(fields=['post', 'created', 'id'], name='comment_post_created_idx'),
+        ),
+    ]
@@ -0,0 +1,27 @@
+# Generated by Django 2.2.16 on 2026-10-18 06:12
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def mark_merged(apps, schema_editor):
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    AuthorStats.objects.filter(
+        followers_count__gt=settings.FANOUT_FOLLOWER_THRESHOLD
+    ).update(merged=True)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0013_post_search'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='authorstats',
+            name='merged',
+            field=models.BooleanField(default=False),
+        ),
+        migrations.RunPython(mark_merged, migrations.RunPython.noop),
+    ]
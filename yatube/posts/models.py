@@ -1,6 +1,8 @@
-from django.db import models
+from django.db import IntegrityError, models, transaction
 from django.contrib.auth import get_user_model
 
+from .storage import post_images
+
 User = get_user_model()
 
 
@@ -38,11 +40,30 @@ class Post(models.Model):
     image = models.ImageField(
         'Картинка',
         upload_to='posts/',
+        storage=post_images,
         blank=True
     )
+    comments_count = models.PositiveIntegerField(
+        default=0,
+        editable=False
+    )
 
     class Meta:
         ordering = ('-pub_date',)
+        indexes = (
+            models.Index(
+                fields=('-pub_date', '-id'),
+                name='post_pub_date_idx'
+            ),
+            models.Index(
+                fields=('author', '-pub_date', '-id'),
+                name='post_author_pub_date_idx'
+            ),
+            models.Index(
+                fields=('group', '-pub_date', '-id'),
+                name='post_group_pub_date_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text
@@ -64,6 +85,48 @@ class Comment(models.Model):
     text = models.TextField()
     created = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = (
+            models.Index(
+                fields=('post', 'created', 'id'),
+                name='comment_post_created_idx'
+            ),
+        )
+
+
+class FollowQuerySet(models.QuerySet):
+    def follow(self, user, author):
+        """Подписывает пользователя на автора.
+
+        Выполняет INSERT без предварительного SELECT: повторная или
+        одновременная подписка упирается в уникальное ограничение и
+        игнорируется. Возвращает True, если подписка создана.
+        """
+        try:
+            with transaction.atomic():
+                self.create(user=user, author=author)
+        except IntegrityError:
+            return False
+        return True
+
+    def unfollow(self, user, author):
+        """Отписывает пользователя от автора.
+
+        ``QuerySet.delete()`` сначала выбирает строки и отправляет
+        ``post_delete`` для каждой, даже если одновременный запрос уже
+        удалил её, и счётчики уменьшаются дважды. Здесь выполняется один
+        DELETE, а ``post_delete`` отправляется, только если он удалил
+        строку. Возвращает True, если подписка удалена.
+        """
+        with transaction.atomic():
+            deleted = self.filter(user=user, author=author)._raw_delete(
+                self.db)
+            if deleted:
+                models.signals.post_delete.send(
+                    sender=self.model, using=self.db,
+                    instance=self.model(user=user, author=author))
+        return bool(deleted)
+
 
 class Follow(models.Model):
     user = models.ForeignKey(
@@ -76,3 +139,63 @@ class Follow(models.Model):
         on_delete=models.CASCADE,
         related_name='following'
     )
+
+    objects = FollowQuerySet.as_manager()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'author'),
+                name='unique_follow'
+            ),
+        )
+
+
+class TimelineEntry(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='timeline'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='timeline_entries'
+    )
+    pub_date = models.DateTimeField()
+
+    class Meta:
+        constraints = (
+            models.UniqueConstraint(
+                fields=('user', 'post'),
+                name='unique_timeline_entry'
+            ),
+        )
+        indexes = (
+            models.Index(
+                fields=('user', '-pub_date', '-post'),
+                name='timeline_user_pub_date_idx'
+            ),
+        )
+
+
+class AuthorStats(models.Model):
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats'
+    )
+    posts_count = models.PositiveIntegerField(default=0)
+    followers_count = models.PositiveIntegerField(default=0)
+    following_count = models.PositiveIntegerField(default=0)
+    # Записи автора подмешиваются в ленты при чтении (см. timeline)
+    merged = models.BooleanField(default=False)
+
+    @classmethod
+    def for_user(cls, user):
+        """Счетчики пользователя; для пользователя без записи — нули."""
+        try:
+            return user.stats
+        except cls.DoesNotExist:
+            return cls(user=user)
@@ -0,0 +1,240 @@
+import binascii
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections.abc import Sequence
+from datetime import datetime
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db.models import Q
+
+CURSOR_SEPARATOR = '\x1f'
+
+
+class _Window(Sequence):
+    """Ленивый срез ленты: запрос выполняется при первом обращении."""
+
+    def __init__(self, paginator):
+        self.paginator = paginator
+
+    def __getitem__(self, index):
+        return self.paginator.rows[index]
+
+    def __len__(self):
+        return len(self.paginator.rows)
+
+
+class CursorPaginator(Paginator):
+    """Пагинатор по ключу сортировки вместо COUNT + OFFSET.
+
+    Страницы адресуются непрозрачными курсорами ``?after=`` / ``?before=``,
+    поэтому стоимость запроса не зависит от глубины страницы. Старые ссылки
+    вида ``?page=N`` по-прежнему открываются через OFFSET без COUNT.
+
+    ``prepare`` вызывается один раз со строками страницы сразу после их
+    выборки — например, чтобы пакетно подгрузить связанные с ними данные.
+    Выборка может быть и ``values()``: тогда строки — словари, в которых
+    должны быть поля сортировки.
+    """
+
+    def __init__(self, object_list, per_page,
+                 ordering=('-pub_date', '-pk'), prepare=None):
+        super().__init__(object_list.order_by(*ordering), per_page)
+        self.ordering = ordering
+        self.prepare = prepare
+        self.number = 1
+        self._after = None
+        self._before = None
+        self._valid = True
+        self._rows = None
+        self._next_cursor = None
+        self._previous_cursor = None
+
+    def page_for(self, params):
+        """Возвращает страницу по GET-параметрам запроса.
+
+        Запрос к базе выполняется лениво — при первом обращении к строкам
+        страницы или к курсорам соседних страниц.
+        """
+        after, before, page = (params.get(name)
+                               for name in ('after', 'before', 'page'))
+        self._after = self.decode_cursor(after)
+        self._before = self.decode_cursor(before)
+        self._valid = ((self._after is not None or not after)
+                       and (self._before is not None or not before)
+                       and (not page or self._is_page_number(page)))
+        if self._after is None and self._before is None:
+            self.number = self._page_number(params.get('page'))
+        else:
+            self.number = 2
+
+        return self._get_page(_Window(self), self.number, self)
+
+    @property
+    def cache_key(self):
+        """Страница для ключа кеша: разобранный курсор в каноническом виде
+        или номер страницы. ``None``, если курсор или номер в запросе
+        испорчены: такие ответы не кешируются."""
+        if not self._valid:
+            return None
+        if self._after is not None:
+            return 'after:' + self.encode_values(self._after)
+        if self._before is not None:
+            return 'before:' + self.encode_values(self._before)
+        return f'page:{self.number}'
+
+    @property
+    def rows(self):
+        if self._rows is None:
+            self._fetch()
+            if self.prepare is not None:
+                self.prepare(self._rows)
+        return self._rows
+
+    @property
+    def next_cursor(self):
+        self.rows
+        return self._next_cursor
+
+    @property
+    def previous_cursor(self):
+        self.rows
+        return self._previous_cursor
+
+    @property
+    def num_pages(self):
+        return self.number + 1 if self.next_cursor else self.number
+
+    def encode_cursor(self, obj):
+        if isinstance(obj, dict):
+            return self.encode_values(
+                [obj[name] for name in self._field_names()])
+        return self.encode_values(
+            [getattr(obj, name) for name in self._field_names()])
+
+    def encode_values(self, values):
+        values = [value.isoformat() if isinstance(value, datetime)
+                  else str(value) for value in values]
+        raw = CURSOR_SEPARATOR.join(values).encode()
+        return urlsafe_b64encode(raw).decode().rstrip('=')
+
+    def decode_cursor(self, token):
+        if not token:
+            return None
+        try:
+            raw = urlsafe_b64decode(token + '=' * (-len(token) % 4))
+            values = raw.decode().split(CURSOR_SEPARATOR)
+            fields = self._fields()
+            if len(values) != len(fields):
+                return None
+            return [field.to_python(value)
+                    for field, value in zip(fields, values)]
+        except (binascii.Error, UnicodeDecodeError, ValueError,
+                ValidationError):
+            return None
+
+    def _is_page_number(self, value):
+        try:
+            return int(value) >= 1
+        except ValueError:
+            return False
+
+    def _page_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            return 1
+        return max(number, 1)
+
+    def _field_names(self):
+        return [name.lstrip('-') for name in self.ordering]
+
+    def _fields(self):
+        meta = self.object_list.model._meta
+        annotations = self.object_list.query.annotations
+        return [
+            meta.pk if name == 'pk'
+            else annotations[name].output_field if name in annotations
+            else meta.get_field(name)
+            for name in self._field_names()
+        ]
+
+    def _reversed_ordering(self):
+        return [name[1:] if name.startswith('-') else f'-{name}'
+                for name in self.ordering]
+
+    def _seek(self, values, backwards=False):
+        condition = Q()
+        equal = {}
+        for name, value in zip(self.ordering, values):
+            descending = name.startswith('-') != backwards
+            name = name.lstrip('-')
+            lookup = 'lt' if descending else 'gt'
+            condition |= Q(**equal, **{f'{name}__{lookup}': value})
+            equal[name] = value
+        # Нестрогая граница по первому полю позволяет базе начать чтение
+        # индекса сразу с курсора, а не фильтровать его с начала.
+        name = self.ordering[0]
+        descending = name.startswith('-') != backwards
+        lookup = 'lte' if descending else 'gte'
+        return Q(**{f'{name.lstrip("-")}__{lookup}': values[0]}) & condition
+
+    def _fetch(self):
+        if self._after is not None:
+            self._fetch_after()
+        elif self._before is not None:
+            self._fetch_before()
+        else:
+            self._fetch_offset()
+
+    def _take(self, rows):
+        """Отрезает лишнюю строку, по которой понятно, есть ли следующая
+        страница, и запоминает курсор на неё."""
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            self._next_cursor = self.encode_cursor(rows[-1])
+        self._rows = rows
+
+    def _fetch_after(self):
+        rows = list(
+            self.object_list.filter(self._seek(self._after))[
+                :self.per_page + 1]
+        )
+        self._take(rows)
+        if rows:
+            self._previous_cursor = self.encode_cursor(rows[0])
+        else:
+            self._previous_cursor = self.encode_values(self._after)
+
+    def _fetch_before(self):
+        rows = list(
+            self.object_list.order_by(*self._reversed_ordering()).filter(
+                self._seek(self._before, backwards=True))[:self.per_page + 1]
+        )
+        if len(rows) <= self.per_page:
+            self.number = 1
+            self._fetch_offset()
+            return
+        rows = rows[:self.per_page][::-1]
+        self._rows = rows
+        self._previous_cursor = self.encode_cursor(rows[0])
+        self._next_cursor = self.encode_cursor(rows[-1])
+
+    def _fetch_offset(self):
+        bottom = (self.number - 1) * self.per_page
+        rows = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not rows and self.number > 1:
+            self._fetch_last()
+            return
+        self._take(rows)
+        if self.number > 1:
+            self._previous_cursor = self.encode_cursor(rows[0])
+
+    def _fetch_last(self):
+        rows = list(
+            self.object_list.order_by(*self._reversed_ordering())[
+                :self.per_page + 1]
+        )
+        if len(rows) > self.per_page:
+            rows = rows[:self.per_page]
+            self._previous_cursor = self.encode_cursor(rows[-1])
+        self._rows = rows[::-1]
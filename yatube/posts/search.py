@@ -0,0 +1,146 @@
+"""Полнотекстовый поиск по записям.
+
+В индекс попадают основы слов (см. ``stemmer``) текста записи и названия её
+группы, поэтому запрос находит записи с любыми формами слов. Индекс
+обновляется сигналами при сохранении и удалении записей и групп.
+
+Бэкенд выбирается настройкой ``SEARCH_BACKEND``, а если она пуста — по
+базе: FTS5 есть только в SQLite, на остальных поиск идёт через LIKE и
+индекс не ведётся. Бэкенд аннотирует выборку записей полем
+``search_rank``: чем оно меньше, тем запись релевантнее.
+"""
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.utils.module_loading import import_string
+
+from .stemmer import stems
+
+SEARCH_TABLE = 'posts_search'
+
+
+def document(text, group_title=None):
+    """Текст для индекса: основы слов записи и названия группы."""
+    return ' '.join(stems(f'{text} {group_title or ""}'))
+
+
+def query_terms(query):
+    return list(dict.fromkeys(stems(query)))
+
+
+class SearchBackend:
+    """Интерфейс поискового индекса записей."""
+
+    def index(self, posts):
+        """Добавляет записи в индекс или обновляет их."""
+        raise NotImplementedError
+
+    def remove(self, post_ids):
+        raise NotImplementedError
+
+    def search(self, queryset, terms):
+        """Оставляет в выборке записи со всеми основами ``terms`` и
+        аннотирует их ``search_rank``."""
+        raise NotImplementedError
+
+
+class FTS5Backend(SearchBackend):
+    """Инвертированный индекс SQLite FTS5 с ранжированием BM25.
+
+    Таблица ``posts_search`` создаётся миграцией; rowid строки индекса
+    совпадает с id записи.
+    """
+
+    def index(self, posts):
+        rows = [(post.pk, document(post.text, post.group and post.group.title))
+                for post in posts]
+        if not rows:
+            return
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                [(post_id,) for post_id, _ in rows]
+            )
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_TABLE} (rowid, body) VALUES (%s, %s)',
+                rows
+            )
+
+    def remove(self, post_ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+                [(post_id,) for post_id in post_ids]
+            )
+
+    def search(self, queryset, terms):
+        # Каждая основа — отдельная фраза в кавычках, фразы объединяются
+        # через AND; кавычки внутри основ невозможны, там только \w
+        match = ' '.join(f'"{term}"' for term in terms)
+        table = queryset.model._meta.db_table
+        # Индекс присоединяется к выборке, а не читается подзапросом на
+        # каждую запись: MATCH выполняется один раз. Скрытый столбец rank —
+        # это bm25 найденной строки
+        return queryset.extra(
+            tables=[SEARCH_TABLE],
+            where=[f'{SEARCH_TABLE}.rowid = {table}.id',
+                   f'{SEARCH_TABLE} MATCH %s'],
+            params=[match],
+        ).annotate(search_rank=RawSQL(f'{SEARCH_TABLE}.rank', [],
+                                      output_field=FloatField()))
+
+
+class SimpleBackend(SearchBackend):
+    """Поиск без индекса через LIKE для баз без FTS5."""
+
+    def index(self, posts):
+        pass
+
+    def remove(self, post_ids):
+        pass
+
+    def search(self, queryset, terms):
+        condition = Q()
+        for term in terms:
+            condition &= (Q(text__icontains=term)
+                          | Q(group__title__icontains=term))
+        return queryset.filter(condition).annotate(
+            search_rank=Value(0.0, output_field=FloatField()))
+
+
+# Бэкенд по умолчанию для каждой базы; для остальных — SimpleBackend
+VENDOR_BACKENDS = {'sqlite': 'posts.search.FTS5Backend'}
+
+
+def get_backend():
+    """Бэкенд из ``SEARCH_BACKEND`` или подходящий к базе."""
+    path = settings.SEARCH_BACKEND or VENDOR_BACKENDS.get(
+        connection.vendor, 'posts.search.SimpleBackend')
+    return import_string(path)()
+
+
+backend = get_backend()
+
+
+def search_posts(queryset, query):
+    """Записи выборки, подходящие под запрос, или пустая выборка."""
+    terms = query_terms(query)
+    if not terms:
+        return queryset.none().annotate(
+            search_rank=Value(0.0, output_field=FloatField()))
+    return backend.search(queryset, terms)
+
+
+def reindex(posts, batch_size=1000):
+    """Переиндексирует выборку записей пачками по ``batch_size``."""
+    posts = posts.select_related('group').only(
+        'text', 'group__title').iterator(chunk_size=batch_size)
+    while True:
+        batch = list(islice(posts, batch_size))
+        if not batch:
+            return
+        with transaction.atomic():
+            backend.index(batch)
@@ -0,0 +1,194 @@
+"""Быстрое наполнение базы синтетическими данными для замеров.
+
+Все вставки идут через ``bulk_create`` пачками, сигналы моделей при этом не
+срабатывают, поэтому производные данные (счётчики, ленты подписок, поисковый
+индекс) заполняются в конце одним проходом ``rebuild_derived``.
+
+Подписки распределены по закону Ципфа: k-й по популярности автор получает
+подписчиков в k раз реже самого популярного.
+"""
+import random
+from contextlib import contextmanager
+from datetime import timedelta
+from io import BytesIO
+from itertools import accumulate
+
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from PIL import Image
+
+from . import search, thumbnails, timeline
+from .counters import recount
+from .models import Comment, Follow, Group, Post, User
+from .storage import post_images
+
+USERNAME_PREFIX = 'seed_user_'
+# Доля записей с картинкой, если картинки создаются
+IMAGE_SHARE = 0.2
+IMAGE_SIZE = (1280, 720)
+
+
+@contextmanager
+def preserve_dates(*fields):
+    """Отключает ``auto_now_add`` у полей ``fields``, чтобы сохранить
+    заданные даты при массовой вставке."""
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
+
+
+def _batches(items, size):
+    batch = []
+    for item in items:
+        batch.append(item)
+        if len(batch) == size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _popularity(rng, user_ids):
+    """Авторы в порядке популярности и накопленные веса для
+    ``random.choices``."""
+    ranked = list(user_ids)
+    rng.shuffle(ranked)
+    weights = accumulate(1 / rank for rank in range(1, len(ranked) + 1))
+    return ranked, list(weights)
+
+
+def _seed_images(rng, count):
+    """Сохраняет ``count`` однотонных JPEG и сразу строит их миниатюры."""
+    names = []
+    for number in range(count):
+        color = tuple(rng.randrange(256) for _ in range(3))
+        content = BytesIO()
+        Image.new('RGB', IMAGE_SIZE, color).save(content, 'JPEG')
+        name = post_images.save(f'posts/seed-{number}.jpg',
+                                ContentFile(content.getvalue()))
+        thumbnails.render_thumbnail(name)
+        names.append(name)
+    return names
+
+
+def _seed_follows(rng, user_ids, follows, batch_size):
+    authors, weights = _popularity(rng, user_ids)
+
+    def generate():
+        for user_id in user_ids:
+            chosen = set(rng.choices(authors, cum_weights=weights,
+                                     k=min(follows, len(user_ids))))
+            chosen.discard(user_id)
+            for author_id in chosen:
+                yield Follow(user_id=user_id, author_id=author_id)
+
+    for batch in _batches(generate(), batch_size):
+        Follow.objects.bulk_create(batch, ignore_conflicts=True)
+
+
+def _seed_comments(rng, user_ids, post_ids, comments, batch_size):
+    """Комментарии к записям из диапазона ``post_ids``; квадрат случайного
+    числа смещает выбор к свежим записям."""
+    def generate():
+        for i in range(comments if post_ids else 0):
+            yield Comment(
+                post_id=post_ids[-1 - int(len(post_ids) * rng.random() ** 2)],
+                author_id=rng.choice(user_ids),
+                text=f'Синтетический комментарий {i}',
+            )
+
+    for batch in _batches(generate(), batch_size):
+        Comment.objects.bulk_create(batch)
+
+
+def rebuild_derived(log=None):
+    """Пересчитывает то, что при обычной работе ведут сигналы: счётчики,
+    ленты подписок и поисковый индекс, и сбрасывает кеш."""
+    log = log or (lambda message: None)
+    recount()
+    timeline.rebuild()
+    log('Счётчики и ленты подписок пересчитаны')
+    search.reindex(Post.objects.all())
+    log('Поисковый индекс построен')
+    cache.clear()
+
+
+def seed(users=1000, posts=100000, groups=50, follows=20, comments=0,
+         images=0, batch_size=5000, days=365, random_seed=0, log=None):
+    """Создаёт пользователей, группы, записи, подписки и комментарии.
+
+    Даты публикации равномерно распределены по последним ``days`` дням.
+    Каждый пользователь подписывается примерно на ``follows`` авторов,
+    комментарии достаются в основном свежим записям. Если ``images``
+    больше нуля, создаётся столько картинок, и они раздаются доле
+    ``IMAGE_SHARE`` записей. ``batch_size`` задаёт размер пачки объектов в
+    памяти; на отдельные INSERT пачку делит сам Django с учётом ограничений
+    базы.
+    """
+    rng = random.Random(random_seed)
+    log = log or (lambda message: None)
+    start = User.objects.filter(
+        username__startswith=USERNAME_PREFIX).count()
+
+    for batch in _batches(
+            (User(username=f'{USERNAME_PREFIX}{start + i}', password='!')
+             for i in range(users)), batch_size):
+        User.objects.bulk_create(batch)
+    user_ids = list(User.objects.filter(
+        username__startswith=USERNAME_PREFIX).values_list('pk', flat=True))
+    log(f'Пользователей: {len(user_ids)}')
+
+    group_start = Group.objects.count()
+    Group.objects.bulk_create(
+        Group(title=f'Группа {group_start + i}',
+              slug=f'seed-group-{group_start + i}',
+              description='Синтетическая группа')
+        for i in range(groups)
+    )
+    group_ids = list(Group.objects.values_list('pk', flat=True))
+    image_names = _seed_images(rng, images)
+
+    now = timezone.now()
+    step = timedelta(days=days) / max(posts, 1)
+
+    def generate_posts():
+        for i in range(posts):
+            yield Post(
+                text=f'Синтетическая запись номер {i}',
+                author_id=rng.choice(user_ids),
+                group_id=(rng.choice(group_ids)
+                          if group_ids and rng.random() < 0.5 else None),
+                image=(rng.choice(image_names)
+                       if image_names and rng.random() < IMAGE_SHARE
+                       else ''),
+                pub_date=now - step * (posts - i),
+            )
+
+    # Новые записи получают идущие подряд id
+    first_post = (Post.objects.aggregate(last=Max('pk'))['last'] or 0) + 1
+    with preserve_dates(Post._meta.get_field('pub_date')):
+        for number, batch in enumerate(_batches(generate_posts(),
+                                                batch_size), 1):
+            Post.objects.bulk_create(batch)
+            log(f'Записей: {min(number * batch_size, posts)}')
+    last_post = Post.objects.aggregate(last=Max('pk'))['last'] or 0
+
+    _seed_follows(rng, user_ids, follows, batch_size)
+    log(f'Подписок: {Follow.objects.count()}')
+
+    _seed_comments(rng, user_ids, range(first_post, last_post + 1),
+                   comments, batch_size)
+    log(f'Комментариев: {Comment.objects.count()}')
+
+    rebuild_derived(log)
+
+    if connection.vendor in ('sqlite', 'postgresql'):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
@@ -0,0 +1,163 @@
+from django.db.models.signals import (post_delete, post_save, pre_delete,
+                                      pre_save)
+from django.dispatch import receiver
+
+from . import feeds, thumbnails, timeline
+from .search import backend as search_backend
+from .caching import bump_version
+from .counters import change_author_stats, change_comments_count
+from .models import Comment, Follow, Group, Post, User
+
+# Поля автора, которые видны в карточках записей и комментариях
+AUTHOR_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+@receiver(pre_save, sender=Post)
+def remember_previous(sender, instance, **kwargs):
+    instance.previous_group_id = None
+    instance.previous_image = None
+    if instance.pk:
+        instance.previous_group_id, instance.previous_image = (
+            Post.objects.filter(pk=instance.pk).values_list(
+                'group_id', 'image').first() or (None, None)
+        )
+
+
+@receiver(post_save, sender=Post)
+@receiver(post_delete, sender=Post)
+def invalidate_post_feeds(sender, instance, **kwargs):
+    feeds.invalidate_post_feeds(
+        instance.author_id,
+        [instance.group_id, getattr(instance, 'previous_group_id', None)],
+        instance.pk
+    )
+
+
+@receiver(post_save, sender=Post)
+def replace_image(sender, instance, **kwargs):
+    previous_image = getattr(instance, 'previous_image', None)
+    if instance.image.name != previous_image:
+        thumbnails.schedule(instance)
+
+
+@receiver(post_save, sender=Group)
+def invalidate_group_feeds(sender, instance, **kwargs):
+    # Название группы видно в карточках записей всех лент
+    feeds.invalidate_author_feeds(
+        instance.posts.values_list('author_id', flat=True).distinct(),
+        [instance.pk],
+    )
+
+
+@receiver(post_delete, sender=Group)
+def invalidate_ungrouped_feeds(sender, instance, **kwargs):
+    feeds.invalidate_author_feeds(getattr(instance, 'author_ids', ()),
+                                  [instance.pk])
+
+
+@receiver(pre_save, sender=User)
+def remember_previous_name(sender, instance, update_fields=None, **kwargs):
+    instance.previous_name = None
+    # При входе сохраняется только last_login
+    if instance.pk and (update_fields is None
+                        or set(update_fields) & set(AUTHOR_NAME_FIELDS)):
+        instance.previous_name = User.objects.filter(
+            pk=instance.pk).values_list(*AUTHOR_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_name(sender, instance, **kwargs):
+    previous_name = getattr(instance, 'previous_name', None)
+    name = tuple(getattr(instance, field) for field in AUTHOR_NAME_FIELDS)
+    if previous_name is not None and previous_name != name:
+        feeds.invalidate_author_name(instance.pk)
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def invalidate_comments(sender, instance, **kwargs):
+    bump_version('post', instance.post_id)
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, created, **kwargs):
+    if created:
+        timeline.fan_out(instance)
+
+
+@receiver(post_save, sender=Follow)
+def backfill_timeline(sender, instance, created, **kwargs):
+    if created:
+        timeline.follower_added(instance.author_id)
+        timeline.backfill(instance.user_id, instance.author_id)
+        bump_version('follow', instance.user_id)
+
+
+@receiver(post_delete, sender=Follow)
+def clean_timeline(sender, instance, **kwargs):
+    timeline.remove(instance.user_id, instance.author_id)
+    timeline.follower_removed(instance.author_id)
+    bump_version('follow', instance.user_id)
+
+
+@receiver(post_save, sender=Post)
+def count_created_post(sender, instance, created, **kwargs):
+    if created:
+        change_author_stats(instance.author_id, posts_count=1)
+
+
+@receiver(post_delete, sender=Post)
+def count_deleted_post(sender, instance, **kwargs):
+    change_author_stats(instance.author_id, posts_count=-1)
+
+
+@receiver(post_save, sender=Follow)
+def count_created_follow(sender, instance, created, **kwargs):
+    if created:
+        change_author_stats(instance.author_id, followers_count=1)
+        change_author_stats(instance.user_id, following_count=1)
+
+
+@receiver(post_delete, sender=Follow)
+def count_deleted_follow(sender, instance, **kwargs):
+    change_author_stats(instance.author_id, followers_count=-1)
+    change_author_stats(instance.user_id, following_count=-1)
+
+
+@receiver(post_save, sender=Comment)
+def count_created_comment(sender, instance, created, **kwargs):
+    if created:
+        change_comments_count(instance.post_id, 1)
+
+
+@receiver(post_delete, sender=Comment)
+def count_deleted_comment(sender, instance, **kwargs):
+    change_comments_count(instance.post_id, -1)
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, **kwargs):
+    search_backend.index([instance])
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    search_backend.remove([instance.pk])
+
+
+@receiver(post_save, sender=Group)
+def reindex_group_posts(sender, instance, **kwargs):
+    search_backend.index(instance.posts.select_related('group').iterator())
+
+
+@receiver(pre_delete, sender=Group)
+def remember_group_posts(sender, instance, **kwargs):
+    instance.post_ids = list(instance.posts.values_list('pk', flat=True))
+    instance.author_ids = list(instance.posts.values_list(
+        'author_id', flat=True).distinct())
+
+
+@receiver(post_delete, sender=Group)
+def reindex_ungrouped_posts(sender, instance, **kwargs):
+    search_backend.index(Post.objects.filter(
+        pk__in=getattr(instance, 'post_ids', ())).iterator())
@@ -0,0 +1,120 @@
+"""Стеммер Snowball для русского языка.
+
+Реализация алгоритма со snowballstem.org без внешних зависимостей: слова
+приводятся к основе, чтобы «котики» и «котиков» находились по «котик».
+"""
+import re
+
+VOWELS = frozenset('аеиоуыэюя')
+
+# Окончания групп 1 удаляются, только если перед ними стоит «а» или «я»
+PERFECTIVE_GERUND = (('в', 'вши', 'вшись'),
+                     ('ив', 'ивши', 'ившись', 'ыв', 'ывши', 'ывшись'))
+ADJECTIVE = ((), ('ее', 'ие', 'ые', 'ое', 'ими', 'ыми', 'ей', 'ий', 'ый',
+                  'ой', 'ем', 'им', 'ым', 'ом', 'его', 'ого', 'ему', 'ому',
+                  'их', 'ых', 'ую', 'юю', 'ая', 'яя', 'ою', 'ею'))
+PARTICIPLE = (('ем', 'нн', 'вш', 'ющ', 'щ'), ('ивш', 'ывш', 'ующ'))
+REFLEXIVE = ((), ('ся', 'сь'))
+VERB = (('ла', 'на', 'ете', 'йте', 'ли', 'й', 'л', 'ем', 'н', 'ло', 'но',
+         'ет', 'ют', 'ны', 'ть', 'ешь', 'нно'),
+        ('ила', 'ыла', 'ена', 'ейте', 'уйте', 'ите', 'или', 'ыли', 'ей',
+         'уй', 'ил', 'ыл', 'им', 'ым', 'ен', 'ило', 'ыло', 'ено', 'ят',
+         'ует', 'уют', 'ит', 'ыт', 'ены', 'ить', 'ыть', 'ишь', 'ую', 'ю'))
+NOUN = ((), ('а', 'ев', 'ов', 'ие', 'ье', 'е', 'иями', 'ями', 'ами', 'еи',
+             'ии', 'и', 'ией', 'ей', 'ой', 'ий', 'й', 'иям', 'ям', 'ием',
+             'ем', 'ам', 'ом', 'о', 'у', 'ах', 'иях', 'ях', 'ы', 'ь', 'ию',
+             'ью', 'ю', 'ия', 'ья', 'я'))
+SUPERLATIVE = ((), ('ейш', 'ейше'))
+DERIVATIONAL = ((), ('ост', 'ость'))
+
+WORD_RE = re.compile(r'\w+')
+
+
+def _endings(groups):
+    endings = [(ending, True) for ending in groups[0]]
+    endings += [(ending, False) for ending in groups[1]]
+    return sorted(endings, key=lambda item: len(item[0]), reverse=True)
+
+
+_ENDINGS = {
+    name: _endings(groups) for name, groups in (
+        ('perfective_gerund', PERFECTIVE_GERUND),
+        ('adjective', ADJECTIVE),
+        ('participle', PARTICIPLE),
+        ('reflexive', REFLEXIVE),
+        ('verb', VERB),
+        ('noun', NOUN),
+        ('superlative', SUPERLATIVE),
+        ('derivational', DERIVATIONAL),
+    )
+}
+
+
+def _strip(region, name):
+    """Удаляет самое длинное окончание группы; ``None``, если его нет."""
+    for ending, after_a in _ENDINGS[name]:
+        if region.endswith(ending):
+            stem = region[:-len(ending)]
+            if after_a and not stem.endswith(('а', 'я')):
+                return None
+            return stem
+    return None
+
+
+def _region_after(word, start):
+    """Начало области после первой согласной, следующей за гласной."""
+    for index in range(start + 1, len(word)):
+        if word[index] not in VOWELS and word[index - 1] in VOWELS:
+            return index + 1
+    return len(word)
+
+
+def _step1(region):
+    stripped = _strip(region, 'perfective_gerund')
+    if stripped is not None:
+        return stripped
+    reflexive = _strip(region, 'reflexive')
+    if reflexive is not None:
+        region = reflexive
+    stripped = _strip(region, 'adjective')
+    if stripped is not None:
+        participle = _strip(stripped, 'participle')
+        return stripped if participle is None else participle
+    for name in ('verb', 'noun'):
+        stripped = _strip(region, name)
+        if stripped is not None:
+            return stripped
+    return region
+
+
+def _step4(region):
+    if region.endswith('нн'):
+        return region[:-1]
+    stripped = _strip(region, 'superlative')
+    if stripped is not None:
+        return stripped[:-1] if stripped.endswith('нн') else stripped
+    if region.endswith('ь'):
+        return region[:-1]
+    return region
+
+
+def stem(word):
+    word = word.lower().replace('ё', 'е')
+    rv = next((index + 1 for index, letter in enumerate(word)
+               if letter in VOWELS), len(word))
+    r2 = _region_after(word, _region_after(word, 0))
+    prefix, region = word[:rv], word[rv:]
+
+    region = _step1(region)
+    if region.endswith('и'):
+        region = region[:-1]
+    # Словообразовательные суффиксы удаляются, только если лежат в R2
+    stripped = _strip(region, 'derivational')
+    if stripped is not None and rv + len(stripped) >= r2:
+        region = stripped
+    return prefix + _step4(region)
+
+
+def stems(text):
+    """Основы всех слов текста в порядке появления."""
+    return [stem(word) for word in WORD_RE.findall(text)]
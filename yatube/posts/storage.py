@@ -0,0 +1,43 @@
+import hashlib
+import os
+import posixpath
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.utils.deconstruct import deconstructible
+
+
+@deconstructible
+class ContentAddressedStorage(FileSystemStorage):
+    """Файловое хранилище, в котором имя файла — SHA-256 его содержимого.
+
+    Одинаковые загрузки сохраняются один раз и получают одно имя, поэтому
+    у них общие и миниатюры sorl, которые строятся по имени исходника.
+    Каталог из ``upload_to`` сохраняется: ``posts/ab/abcd….jpg``.
+    """
+
+    def hashed_name(self, name, content):
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        extension = os.path.splitext(name)[1].lower()
+        return posixpath.join(posixpath.dirname(name), digest[:2],
+                              digest + extension)
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.hashed_name(name, content)
+        if self.exists(name):
+            # Сборка мусора отсчитывает возраст файла от последней загрузки
+            os.utime(self.path(name))
+            return name
+        return self._save(name, content)
+
+
+post_images = ContentAddressedStorage()
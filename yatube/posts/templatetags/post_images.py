@@ -0,0 +1,16 @@
+from django import template
+
+from ..thumbnails import post_image
+
+register = template.Library()
+
+
+@register.simple_tag
+def post_thumbnail(post):
+    """Готовые миниатюры картинки записи или ``None``, пока они создаются.
+
+    В лентах миниатюры всей страницы уже найдены ``thumbnails.prefetch``.
+    """
+    if hasattr(post, 'thumbnail'):
+        return post.thumbnail
+    return post_image(post.image)
@@ -0,0 +1,72 @@
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.core.management import CommandError, call_command
+from django.test import TestCase
+
+from ..benchmark import compare, run
+from ..models import AuthorStats, Comment, Post, TimelineEntry
+from ..search import search_posts
+from ..seeding import seed
+
+
+class BenchmarkTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed(users=20, posts=200, groups=3, follows=5, comments=50,
+             batch_size=100)
+
+    def test_seed_fills_derived_data(self):
+        """После наполнения пересчитаны счётчики, ленты подписок и
+        поисковый индекс"""
+        self.assertEqual(Comment.objects.count(), 50)
+        stats = AuthorStats.objects.values_list('posts_count', flat=True)
+        self.assertEqual(sum(stats), Post.objects.count())
+        self.assertTrue(TimelineEntry.objects.exists())
+        self.assertEqual(
+            search_posts(Post.objects.all(), 'синтетическая запись').count(),
+            Post.objects.count())
+
+    def test_run_measures_posts_routes(self):
+        """Замер проходит по маршрутам posts.urls и API и пропускает те,
+        GET которых меняет данные"""
+        report = run(modes=['client'], requests=2)
+        results = report['results']['client']
+        for route in ('posts:main_page', 'posts:group_list',
+                      'posts:profile', 'posts:post_detail',
+                      'posts:follow_index', 'posts:search', 'api:posts',
+                      'api:follow_posts', 'api:post_comments'):
+            with self.subTest(route=route):
+                self.assertEqual(results[route]['status'], 200)
+                self.assertGreater(results[route]['queries'], 0)
+        self.assertIn('posts:profile_follow', report['skipped'])
+        self.assertEqual(report['meta']['rows']['posts'], 200)
+
+    def test_compare_flags_regressions(self):
+        """Сравнение отмечает метрики, ухудшившиеся сильнее порога"""
+        result = {'p50_ms': 10.0, 'p99_ms': 20.0, 'throughput': 100.0}
+        baseline = {'results': {'client': {'posts:main_page': result}}}
+        current = {'results': {'client': {'posts:main_page': {
+            'p50_ms': 15.0, 'p99_ms': 21.0, 'throughput': 60.0}}}}
+        regressions = {row[2] for row in compare(baseline, current, 10)
+                       if row[6]}
+        self.assertEqual(regressions, {'p50_ms', 'throughput'})
+
+    def test_command_saves_and_compares_results(self):
+        """Команда benchmark сохраняет JSON и падает при регрессии"""
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'baseline.json')
+            call_command('benchmark', modes=['client'], requests=1,
+                         output=path, stdout=StringIO(), stderr=StringIO())
+            with open(path) as file:
+                baseline = json.load(file)
+            for result in baseline['results']['client'].values():
+                result['p50_ms'] = result['p99_ms'] = 0.001
+            with open(path, 'w') as file:
+                json.dump(baseline, file)
+            with self.assertRaises(CommandError):
+                call_command('benchmark', modes=['client'], requests=1,
+                             compare=path, max_regression=10,
+                             stdout=StringIO(), stderr=StringIO())
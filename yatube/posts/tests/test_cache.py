@@ -1,45 +1,240 @@
 from django.contrib.auth import get_user_model
 from django.core.cache import cache
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 
-from ..models import Post, Group
+from ..models import Comment, Follow, Group, Post
 
 User = get_user_model()
 
 
 class PostCacheTest(TestCase):
+    POSTS_LIMIT = 10
+
     def setUp(self):
+        cache.clear()
+        self.group = Group.objects.create(
+            title='thatsatestgroup',
+            slug='somegroup',
+            description='Тестовая группа'
+        )
         self.my_new_post = Post.objects.create(
             text='Sample text',
             author=User.objects.create_user(username='test_user'),
-            group=Group.objects.create(
-                title='thatsatestgroup',
-                slug='somegroup',
-                description='Тестовая группа'
-            ),
+            group=self.group,
         )
 
         self.PRIMORDIAL_POSTS_COUNT = Post.objects.count()
 
-    def test_is_on_index_page_after_delete(self):
-        """Запись остается на странцие до принудительной очистки кеша"""
+    def test_is_on_index_page_until_invalidated(self):
+        """Страница отдается из кеша, пока запись не изменена
+        через ORM, а удаление записи сразу сбрасывает кеш"""
         response = self.client.get(
             reverse('posts:main_page'),
         )
 
         content = response.content
 
-        Post.objects.filter(pk=self.my_new_post.pk).delete()
+        # update() не отправляет сигналы, поэтому фрагмент остается в кеше
+        Post.objects.filter(pk=self.my_new_post.pk).update(text='Changed')
         response = self.client.get(
             reverse('posts:main_page'),
         )
 
         self.assertEqual(response.content, content)
 
-        cache.clear()
+        Post.objects.filter(pk=self.my_new_post.pk).delete()
 
         response = self.client.get(
             reverse('posts:main_page'),
         )
         self.assertNotEqual(response.content, content)
+
+    def test_cached_page_skips_database(self):
+        """Повторный запрос ленты обслуживается без обращений к базе"""
+        self.client.get(reverse('posts:main_page'))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('posts:main_page'))
+
+    def test_group_page_invalidated_on_group_change(self):
+        """Перенос записи в другую группу сбрасывает кеш старой группы"""
+        url = reverse('posts:group_list', kwargs={'slug': self.group.slug})
+        self.assertContains(self.client.get(url), 'Sample text')
+
+        self.my_new_post.group = Group.objects.create(
+            title='othergroup',
+            slug='othergroup',
+            description='Другая группа'
+        )
+        self.my_new_post.save()
+
+        self.assertNotContains(self.client.get(url), 'Sample text')
+
+    def test_pages_are_cached_separately(self):
+        """Разные страницы ленты кешируются под разными ключами"""
+        author = self.my_new_post.author
+        for i in range(self.POSTS_LIMIT):
+            Post.objects.create(text=f'Запись {i}', author=author)
+
+        first = self.client.get(reverse('posts:main_page'))
+        second = self.client.get(reverse('posts:main_page') + '?page=2')
+
+        self.assertNotContains(first, 'Sample text')
+        self.assertContains(second, 'Sample text')
+
+    def test_invalid_cursor_is_not_cached(self):
+        """Страница с испорченным курсором не попадает в кеш"""
+        url = reverse('posts:main_page')
+        self.assertContains(self.client.get(url + '?after=junk'),
+                            'Sample text')
+
+        Post.objects.filter(pk=self.my_new_post.pk).update(text='Changed')
+
+        self.assertContains(self.client.get(url + '?after=junk'), 'Changed')
+        self.assertContains(self.client.get(url + '?page=x'), 'Changed')
+
+
+class FollowCacheTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.stranger = User.objects.create_user(username='stranger')
+        Post.objects.create(text='Запись автора', author=self.author)
+
+    def get_follow_page(self, user):
+        self.client.force_login(user)
+        return self.client.get(reverse('posts:follow_index'))
+
+    def test_follow_page_is_cached_per_user(self):
+        """Лента подписок кешируется отдельно для каждого пользователя"""
+        self.client.force_login(self.reader)
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': self.author.username}))
+
+        self.assertContains(self.get_follow_page(self.reader),
+                            'Запись автора')
+        self.assertNotContains(self.get_follow_page(self.stranger),
+                               'Запись автора')
+
+    def test_new_post_invalidates_followers_page(self):
+        """Новая запись автора сразу видна подписчикам"""
+        self.client.force_login(self.reader)
+        self.client.get(reverse('posts:profile_follow',
+                                kwargs={'username': self.author.username}))
+        self.get_follow_page(self.reader)
+
+        Post.objects.create(text='Свежая запись', author=self.author)
+
+        self.assertContains(self.get_follow_page(self.reader),
+                            'Свежая запись')
+
+
+class ConditionalGetTest(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        self.post = Post.objects.create(
+            text='Запись', author=self.author, group=self.group)
+        self.urls = (
+            reverse('posts:main_page'),
+            reverse('posts:group_list', kwargs={'slug': 'group'}),
+            reverse('posts:profile', kwargs={'username': 'author'}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+        )
+
+    def revalidate(self, url):
+        """Запрашивает страницу повторно с ETag первого ответа."""
+        etag = self.client.get(url)['ETag']
+        return self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+
+    def test_unchanged_pages_are_not_modified(self):
+        """Неизменившаяся страница отдаётся как 304 без тела"""
+        for url in self.urls:
+            with self.subTest(url=url):
+                response = self.revalidate(url)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+
+    def test_not_modified_skips_rendering(self):
+        """Ответ 304 не выбирает записи: нужен не больше чем один запрос
+        на поиск группы, автора или записи"""
+        for url in self.urls:
+            etag = self.client.get(url)['ETag']
+            with self.subTest(url=url), \
+                    CaptureQueriesContext(connection) as queries:
+                self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertLessEqual(len(queries), 1)
+
+    def test_new_post_changes_etag(self):
+        """Новая запись автора меняет ETag всех его страниц"""
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        Post.objects.create(text='Новая', author=self.author,
+                            group=self.group)
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+
+    def test_comment_changes_post_etag(self):
+        """Новый комментарий меняет ETag страницы записи"""
+        url = reverse('posts:post_detail', kwargs={'post_id': self.post.pk})
+        etag = self.client.get(url)['ETag']
+        Comment.objects.create(post=self.post, author=self.reader,
+                               text='Комментарий')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertContains(response, 'Комментарий')
+
+    def test_group_rename_changes_etags(self):
+        """Изменение группы меняет ETag всех страниц с её записями"""
+        etags = [self.client.get(url)['ETag'] for url in self.urls]
+        self.group.title = 'Переименованная'
+        self.group.save()
+        for url, etag in zip(self.urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+                self.assertEqual(response.status_code, 200)
+        self.assertContains(self.client.get(self.urls[-1]),
+                            'Переименованная')
+
+    def test_author_rename_changes_etags(self):
+        """Новое имя автора меняет ETag его страниц, лент и страниц
+        записей с его комментариями"""
+        other = Post.objects.create(text='Чужая', author=self.reader)
+        Comment.objects.create(post=other, author=self.author,
+                               text='Комментарий')
+        urls = self.urls + (
+            reverse('posts:post_detail', kwargs={'post_id': other.pk}),)
+        etags = [self.client.get(url)['ETag'] for url in urls]
+        self.author.username = 'renamed'
+        self.author.save()
+        for url, etag in zip(urls, etags):
+            with self.subTest(url=url):
+                response = self.client.get(
+                    url.replace('/author/', '/renamed/'),
+                    HTTP_IF_NONE_MATCH=etag)
+                self.assertContains(response, 'renamed')
+
+    def test_etag_depends_on_user(self):
+        """У гостя и пользователя разные ETag, а подписка меняет ETag
+        профиля"""
+        url = reverse('posts:profile', kwargs={'username': 'author'})
+        guest_etag = self.client.get(url)['ETag']
+        self.client.force_login(self.reader)
+        reader_etag = self.client.get(url)['ETag']
+        self.assertNotEqual(guest_etag, reader_etag)
+
+        Follow.objects.create(user=self.reader, author=self.author)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=reader_etag)
+        self.assertContains(response, 'Отписаться')
+
+    def test_pages_must_be_revalidated(self):
+        """Страницы с ETag помечены как личные и требующие проверки"""
+        response = self.client.get(self.urls[0])
+        self.assertIn('private', response['Cache-Control'])
+        self.assertIn('no-cache', response['Cache-Control'])
@@ -0,0 +1,61 @@
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import AuthorStats, Comment, Follow, Post
+
+User = get_user_model()
+
+
+class CountersTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.reader = User.objects.create_user(username='reader')
+        self.post = Post.objects.create(text='Запись', author=self.author)
+
+    def stats(self, user):
+        return AuthorStats.objects.get(user=user)
+
+    def test_counters_follow_changes(self):
+        """Счетчики меняются при создании и удалении объектов."""
+        Post.objects.create(text='Еще запись', author=self.author)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        comment = Comment.objects.create(post=self.post, author=self.reader,
+                                         text='Комментарий')
+        self.post.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 2)
+        self.assertEqual(self.stats(self.author).followers_count, 1)
+        self.assertEqual(self.stats(self.reader).following_count, 1)
+        self.assertEqual(self.post.comments_count, 1)
+
+        follow.delete()
+        comment.delete()
+        self.post.delete()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.stats(self.author).followers_count, 0)
+        self.assertEqual(self.stats(self.reader).following_count, 0)
+
+    def test_profile_does_not_count_posts(self):
+        """Страница профиля не выполняет COUNT по записям."""
+        self.client.get(reverse('posts:profile',
+                                kwargs={'username': self.author.username}))
+        # Автор ищется дважды: для ETag и для самой страницы
+        with self.assertNumQueries(3):
+            response = self.client.get(
+                reverse('posts:profile',
+                        kwargs={'username': self.author.username}))
+        self.assertEqual(response.context['posts_count'], 1)
+
+    def test_recountstats_repairs_drift(self):
+        """Команда recountstats исправляет разошедшиеся счетчики."""
+        AuthorStats.objects.filter(user=self.author).update(posts_count=10)
+        Post.objects.filter(pk=self.post.pk).update(comments_count=5)
+        out = StringIO()
+        call_command('recountstats', stdout=out)
+        self.assertIn('Исправлено расхождений: 2', out.getvalue())
+        self.post.refresh_from_db()
+        self.assertEqual(self.stats(self.author).posts_count, 1)
+        self.assertEqual(self.post.comments_count, 0)
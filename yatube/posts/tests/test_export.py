@@ -0,0 +1,61 @@
+import gzip
+import json
+import os
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Post
+
+User = get_user_model()
+
+
+class ExportCommandTest(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author')
+        self.posts = [Post.objects.create(text=f'Запись {number}',
+                                          author=self.author)
+                      for number in range(5)]
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def export(self, *args):
+        call_command('exportdata', 'posts', *args, stderr=StringIO())
+
+    def read_ids(self, path, opener=open):
+        with opener(path, 'rt') as file:
+            return [json.loads(line)['id'] for line in file]
+
+    def test_exports_rows_in_id_order(self):
+        """Команда выгружает строки по возрастанию id, после --after"""
+        path = os.path.join(self.directory.name, 'posts.ndjson')
+        self.export('--output', path, '--after', str(self.posts[1].pk),
+                    '--chunk-size', '2')
+        self.assertEqual(self.read_ids(path),
+                         [post.pk for post in self.posts[2:]])
+        with open(path) as file:
+            row = json.loads(file.readline())
+        self.assertEqual(row['author_id'], self.author.pk)
+        self.assertEqual(row['text'], 'Запись 2')
+
+    def test_resume_gzip_export(self):
+        """--resume дописывает в сжатый файл только новые строки"""
+        path = os.path.join(self.directory.name, 'posts.ndjson.gz')
+        self.export('--output', path, '--gzip')
+        new_post = Post.objects.create(text='Новая', author=self.author)
+        self.export('--output', path, '--gzip', '--resume')
+        self.assertEqual(self.read_ids(path, gzip.open),
+                         [post.pk for post in self.posts + [new_post]])
+
+    def test_resume_drops_partial_line(self):
+        """--resume отрезает оборванную последнюю строку"""
+        path = os.path.join(self.directory.name, 'posts.ndjson')
+        self.export('--output', path)
+        with open(path, 'rb+') as file:
+            file.truncate(os.path.getsize(path) - 5)
+        self.export('--output', path, '--resume')
+        self.assertEqual(self.read_ids(path),
+                         [post.pk for post in self.posts])
@@ -1,10 +1,16 @@
+from io import BytesIO
+from unittest import mock
+
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.http import HttpResponse
 from django.shortcuts import get_object_or_404
 from django.test import Client, TestCase
 from django.urls import reverse
+from PIL import Image
 
+from .. import uploads
+from ..forms import PostForm
 from ..models import Post, Group
 
 User = get_user_model()
@@ -179,3 +185,73 @@ class PostFormTests(TestCase):
 
         self.assertEqual(self.new_post.comments.count(),
                          self.PRIMORDIAL_COMMENTS_COUNT + 1)
+
+
+class ImageUploadTest(TestCase):
+    def make_upload(self, size, image_format='JPEG', exif=None):
+        content = BytesIO()
+        options = {'exif': exif.tobytes()} if exif else {}
+        Image.new('RGB', size, 'red').save(content, image_format, **options)
+        return SimpleUploadedFile(f'photo.{image_format.lower()}',
+                                  content.getvalue())
+
+    def test_small_image_is_kept(self):
+        """Картинка без EXIF в пределах ограничений не перекодируется."""
+        upload = self.make_upload((20, 10), 'PNG')
+        self.assertIs(uploads.normalize_image(upload), upload)
+
+    def test_large_image_is_downsampled(self):
+        """Картинка больше IMAGE_MAX_SIDE уменьшается."""
+        with mock.patch.object(uploads, 'IMAGE_MAX_SIDE', 100):
+            result = uploads.normalize_image(self.make_upload((400, 200)))
+        self.assertEqual(Image.open(result).size, (100, 50))
+
+    def test_exif_is_applied_and_stripped(self):
+        """Поворот из EXIF применяется, а сами метаданные удаляются."""
+        exif = Image.Exif()
+        exif[uploads.EXIF_ORIENTATION] = 6
+        result = uploads.normalize_image(
+            self.make_upload((40, 20), exif=exif))
+        image = Image.open(result)
+        self.assertEqual(image.size, (20, 40))
+        self.assertFalse(image.getexif())
+
+    def test_too_many_pixels_rejected(self):
+        """Форма отклоняет картинку больше IMAGE_MAX_PIXELS."""
+        with mock.patch.object(uploads, 'IMAGE_MAX_PIXELS', 100):
+            form = PostForm(data={'text': 'Текст'}, files={
+                'image': self.make_upload((20, 10))})
+            self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    def make_animation(self, size, image_format='GIF', exif=None):
+        content = BytesIO()
+        options = {'exif': exif.tobytes()} if exif else {}
+        frames = [Image.new('RGB', size, color) for color in ('red', 'blue')]
+        frames[0].save(content, image_format, save_all=True,
+                       append_images=frames[1:], duration=[100, 200],
+                       **options)
+        return SimpleUploadedFile(f'anim.{image_format.lower()}',
+                                  content.getvalue())
+
+    def test_large_animation_rejected(self):
+        """Анимация больше IMAGE_MAX_SIDE отклоняется, а не сохраняется
+        как есть."""
+        with mock.patch.object(uploads, 'IMAGE_MAX_SIDE', 100):
+            form = PostForm(data={'text': 'Текст'}, files={
+                'image': self.make_animation((400, 200))})
+            self.assertFalse(form.is_valid())
+        self.assertIn('image', form.errors)
+
+    def test_animation_exif_is_stripped(self):
+        """Из анимации удаляется EXIF, а кадры и их длительность
+        сохраняются."""
+        exif = Image.Exif()
+        exif[uploads.EXIF_ORIENTATION] = 6
+        result = uploads.normalize_image(
+            self.make_animation((40, 20), 'PNG', exif=exif))
+        image = Image.open(result)
+        self.assertFalse(image.getexif())
+        self.assertEqual(image.n_frames, 2)
+        image.seek(1)
+        self.assertEqual(image.info['duration'], 200)
@@ -0,0 +1,174 @@
+import gzip
+import json
+import os
+import tempfile
+from datetime import datetime
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+from django.db import IntegrityError
+from django.test import TestCase
+from django.utils import timezone
+
+from .. import timeline
+from ..caching import get_version
+from ..export import export_lines
+from ..importing import Lookups, load, read_rows
+from ..models import AuthorStats, Comment, Follow, Post, User
+from ..search import search_posts
+
+
+class LoadPostsTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.reader = User.objects.create_user(username='reader')
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def write(self, name, content, opener=open):
+        path = os.path.join(self.directory.name, name)
+        with opener(path, 'wt', encoding='utf-8') as file:
+            file.write(content)
+        return path
+
+    def test_load_command(self):
+        """Команда загружает все модели, сохраняет даты и пересчитывает
+        производные данные"""
+        groups = self.write('groups.csv', 'title,slug,description\n'
+                                          'Котики,cats,Про котиков\n')
+        posts = self.write('posts.ndjson.gz', ''.join(
+            json.dumps(row, ensure_ascii=False) + '\n' for row in (
+                {'id': 500, 'text': 'Старые котики', 'author': 'author',
+                 'group': 'cats', 'pub_date': '2015-03-01T10:00:00'},
+                {'text': 'Без группы', 'author_id': self.author.pk},
+            )), opener=gzip.open)
+        comments = self.write('comments.csv', 'post,author,text\n'
+                                              '500,reader,Мяу\n')
+        follows = self.write('follows.ndjson',
+                             '{"user": "reader", "author": "author"}\n')
+        stdout = StringIO()
+        call_command('loadposts', groups=groups, posts=posts,
+                     comments=comments, follows=follows, stdout=stdout)
+
+        post = Post.objects.get(pk=500)
+        self.assertEqual(post.group.slug, 'cats')
+        self.assertEqual(post.pub_date, timezone.make_aware(
+            datetime(2015, 3, 1, 10)))
+        self.assertEqual(post.comments_count, 1)
+        self.assertEqual(Post.objects.get(text='Без группы').pk, 501)
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author).followers_count, 1)
+        self.assertEqual(
+            list(search_posts(Post.objects.all(), 'котики')), [post])
+        self.assertIn('posts: прочитано 2, добавлено 2, пропущено 0',
+                      stdout.getvalue())
+        self.assertIn('строк/с', stdout.getvalue())
+
+    def test_load_refreshes_only_imported_data(self):
+        """После загрузки пересчитываются только затронутые пользователи и
+        ленты, а кеш не очищается целиком"""
+        other = User.objects.create_user(username='other')
+        Post.objects.create(text='Старая', author=other)
+        AuthorStats.objects.filter(user=other).update(posts_count=99)
+        Follow.objects.create(user=self.reader, author=self.author)
+        cache.set('unrelated', 1)
+        version = get_version('profile', self.author.pk)
+        posts = self.write('posts.ndjson',
+                           '{"text": "Новая", "author": "author"}\n')
+        call_command('loadposts', posts=posts, stdout=StringIO())
+
+        post = Post.objects.get(text='Новая')
+        self.assertEqual(AuthorStats.objects.get(user=other).posts_count, 99)
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author).posts_count, 1)
+        self.assertEqual(list(timeline.timeline_posts(self.reader)), [post])
+        self.assertEqual(cache.get('unrelated'), 1)
+        self.assertNotEqual(get_version('profile', self.author.pk), version)
+
+    def test_export_loads_back(self):
+        """Выгрузку exportdata можно загрузить в базу, где её строки уже
+        есть: занятые id пропускаются, новые строки добавляются"""
+        post = Post.objects.create(text='Запись', author=self.author)
+        Comment.objects.create(post=post, author=self.reader, text='Мяу')
+        lines = {name: list(export_lines(name))
+                 for name in ('posts', 'comments')}
+        lines['posts'].append(json.dumps({
+            'id': post.pk + 10, 'text': 'Новая', 'author_id': self.author.pk,
+        }) + '\n')
+        stdout, stderr = StringIO(), StringIO()
+        call_command(
+            'loadposts', stdout=stdout, stderr=stderr,
+            **{name: self.write(f'{name}.ndjson', ''.join(content))
+               for name, content in lines.items()})
+
+        self.assertEqual(Post.objects.count(), 2)
+        self.assertEqual(Comment.objects.count(), 1)
+        self.assertIn('posts: прочитано 2, добавлено 1, пропущено 1',
+                      stdout.getvalue())
+        self.assertIn(f'id {post.pk} уже занят', stderr.getvalue())
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author).posts_count, 2)
+
+    def test_explicit_id_in_gap_keeps_refresh_scoped(self):
+        """Явный id из «дыры» среди старых записей не расширяет пересчёт на
+        все записи после него"""
+        other = User.objects.create_user(username='other')
+        gap = Post.objects.create(text='Удалённая', author=self.author).pk
+        Post.objects.create(text='Старая', author=other)
+        Post.objects.filter(pk=gap).delete()
+        AuthorStats.objects.filter(user=other).update(posts_count=99)
+        posts = self.write('posts.ndjson', json.dumps(
+            {'id': gap, 'text': 'Новая', 'author': 'author'}) + '\n')
+        call_command('loadposts', posts=posts, stdout=StringIO())
+
+        self.assertEqual(Post.objects.get(pk=gap).text, 'Новая')
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author).posts_count, 1)
+        self.assertEqual(AuthorStats.objects.get(user=other).posts_count, 99)
+
+    def test_refresh_runs_after_failed_file(self):
+        """Если файл не загрузился, производные данные пересчитываются для
+        уже записанных строк"""
+        posts = self.write('posts.ndjson',
+                           '{"text": "Новая", "author": "author"}\n')
+        comments = self.write('comments.ndjson', '')
+
+        def load_or_fail(name, *args):
+            if name == 'comments':
+                raise IntegrityError('сбой')
+            return load(name, *args)
+
+        with mock.patch(
+                'posts.management.commands.loadposts.load', load_or_fail):
+            with self.assertRaises(CommandError):
+                call_command('loadposts', posts=posts, comments=comments,
+                             stdout=StringIO())
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author).posts_count, 1)
+
+    def test_invalid_rows_are_skipped(self):
+        """Строки с неизвестными ссылками и ошибками пропускаются"""
+        rows = read_rows(StringIO(
+            '{"text": "Запись", "author": "author"}\n'
+            '{"text": "Чужая", "author": "ghost"}\n'
+            'не json\n'
+            '{"text": "Дата", "author": "author", "pub_date": "вчера"}\n'
+        ), 'ndjson')
+        result = load('posts', rows, batch_size=1)
+        self.assertEqual((result.read, result.created), (4, 1))
+        self.assertEqual([line for line, _ in result.errors], [2, 3, 4])
+
+    def test_duplicate_follows_are_ignored(self):
+        """Существующие подписки и подписки на себя не дублируются"""
+        Follow.objects.create(user=self.reader, author=self.author)
+        rows = [{'user': 'reader', 'author': 'author'},
+                {'user': 'author', 'author': 'author'},
+                {'user_id': self.author.pk, 'author': 'reader'}]
+        result = load('follows', rows, lookups=Lookups())
+        self.assertEqual(result.created, 1)
+        self.assertEqual(len(result.errors), 1)
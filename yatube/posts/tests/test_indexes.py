@@ -0,0 +1,30 @@
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+
+from ..models import Post
+from ..seeding import seed
+
+
+class FeedIndexesTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        seed(users=20, posts=300, groups=3, follows=5, batch_size=100)
+
+    def test_seed_preserves_pub_date(self):
+        """Массовая вставка сохраняет заданные даты публикации."""
+        dates = Post.objects.order_by('pk').values_list('pub_date', flat=True)
+        self.assertLess(dates[0], dates[len(dates) - 1])
+
+    def test_feed_queries_use_indexes(self):
+        """Запросы лент читают записи по индексам."""
+        out = StringIO()
+        call_command('feedplans', check=True, stdout=out)
+        self.assertIn('post_pub_date_idx', out.getvalue())
+        self.assertIn('post_group_pub_date_idx', out.getvalue())
+        self.assertIn('post_author_pub_date_idx', out.getvalue())
+        self.assertIn('timeline_user_pub_date_idx (user_id=? AND pub_date<?)',
+                      out.getvalue())
+        self.assertNotIn('TEMP B-TREE', out.getvalue())
+        self.assertIn('(user_id=? AND author_id=?)', out.getvalue())
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TransactionTestCase, override_settings
+
+from .. import thumbnails
+from ..media import collect_orphans
+from ..models import Post
+from ..storage import post_images
+from .test_thumbnails import SMALL_GIF
+
+User = get_user_model()
+
+OTHER_GIF = SMALL_GIF.replace(b'\xFF\xFF\xFF', b'\x00\xFF\x00')
+
+
+class ContentAddressedStorageTest(TransactionTestCase):
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media,
+                                          THUMBNAIL_WORKERS=0)
+        self.settings.enable()
+        self.author = User.objects.create_user(username='author')
+
+    def tearDown(self):
+        self.settings.disable()
+        shutil.rmtree(self.media)
+
+    def create_post(self, content=SMALL_GIF, name='meme.gif'):
+        return Post.objects.create(
+            text='Пост', author=self.author,
+            image=SimpleUploadedFile(name, content)
+        )
+
+    def test_identical_uploads_share_file(self):
+        """Одинаковые картинки хранятся одним файлом с общей миниатюрой."""
+        first = self.create_post()
+        second = self.create_post(name='repost.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(first.image.name.startswith('posts/'))
+        self.assertEqual(
+            thumbnails.cached_thumbnail(first.image).name,
+            thumbnails.cached_thumbnail(second.image).name
+        )
+
+    def test_file_kept_until_collected(self):
+        """Удаление и замена картинки не удаляют файл сразу: его вместе с
+        миниатюрами удаляет сборка мусора."""
+        post = self.create_post()
+        name = post.image.name
+        thumbnail = thumbnails.cached_thumbnail(post.image).name
+        post.image = SimpleUploadedFile('new.gif', OTHER_GIF)
+        post.save()
+        self.assertTrue(post_images.exists(name))
+        post.delete()
+        self.assertTrue(post_images.exists(post.image.name))
+        self.assertCountEqual(collect_orphans(min_age=timedelta(0)),
+                              [name, post.image.name])
+        self.assertFalse(post_images.exists(name))
+        self.assertFalse(post_images.exists(thumbnail))
+
+    def test_reupload_refreshes_file_age(self):
+        """Повторная загрузка той же картинки обновляет время файла, и
+        сборка мусора не удаляет его, пока запись не зафиксирована."""
+        name = post_images.save('posts/meme.gif', ContentFile(SMALL_GIF))
+        old = time.time() - 2 * 60 * 60
+        os.utime(post_images.path(name), (old, old))
+        self.assertEqual(collect_orphans(dry_run=True), [name])
+        self.assertEqual(
+            post_images.save('posts/again.gif', ContentFile(SMALL_GIF)),
+            name)
+        self.assertEqual(collect_orphans(), [])
+        self.assertTrue(post_images.exists(name))
+
+    def test_collect_orphans(self):
+        """Команда сборки мусора удаляет файлы без записей."""
+        kept = self.create_post().image.name
+        orphan = post_images.save('posts/orphan.gif', ContentFile(OTHER_GIF))
+        self.assertEqual(collect_orphans(dry_run=True), [])
+        self.assertEqual(collect_orphans(min_age=timedelta(0)), [orphan])
+        self.assertFalse(post_images.exists(orphan))
+        self.assertTrue(os.path.exists(post_images.path(kept)))
@@ -0,0 +1,132 @@
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from .. import views
+from ..models import Comment, Post
+from ..paginators import CursorPaginator
+
+User = get_user_model()
+
+
+class CursorPaginatorTest(TestCase):
+    POSTS_COUNT = 25
+    PER_PAGE = 10
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        author = User.objects.create_user(username='author')
+        Post.objects.bulk_create(
+            Post(text=f'Пост {i}', author=author)
+            for i in range(cls.POSTS_COUNT)
+        )
+        cls.expected = list(Post.objects.order_by('-pub_date', '-pk'))
+
+    def get_page(self, **params):
+        paginator = CursorPaginator(Post.objects.all(), self.PER_PAGE)
+        return paginator.page_for(params)
+
+    def test_walk_forward_and_back(self):
+        """Курсоры следующей и предыдущей страниц обходят всю ленту."""
+        first = self.get_page()
+        second = self.get_page(after=first.paginator.next_cursor)
+        third = self.get_page(after=second.paginator.next_cursor)
+        self.assertEqual(list(first), self.expected[:10])
+        self.assertEqual(list(second), self.expected[10:20])
+        self.assertEqual(list(third), self.expected[20:])
+        self.assertIsNone(third.paginator.next_cursor)
+
+        back = self.get_page(before=third.paginator.previous_cursor)
+        self.assertEqual(list(back), self.expected[10:20])
+        top = self.get_page(before=back.paginator.previous_cursor)
+        self.assertEqual(list(top), self.expected[:10])
+        self.assertIsNone(top.paginator.previous_cursor)
+
+    def test_page_number_compatibility(self):
+        """Старые ссылки ?page=N открывают ту же страницу."""
+        page = self.get_page(page='2')
+        self.assertEqual(list(page), self.expected[10:20])
+        self.assertTrue(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_page_out_of_range_returns_last_page(self):
+        """Номер страницы за концом ленты открывает последнюю страницу."""
+        page = self.get_page(page='100')
+        self.assertEqual(list(page), self.expected[15:])
+        self.assertIsNone(page.paginator.next_cursor)
+
+    def test_invalid_cursor_returns_first_page(self):
+        """Испорченный курсор открывает первую страницу."""
+        page = self.get_page(after='not-a-cursor')
+        self.assertEqual(list(page), self.expected[:10])
+
+    def test_cache_key(self):
+        """Ключ кеша строится из разобранного курсора или номера
+        страницы; испорченные параметры ключа не получают."""
+        cursor = self.get_page().paginator.next_cursor
+        self.assertEqual(self.get_page(after=cursor).paginator.cache_key,
+                         f'after:{cursor}')
+        self.assertEqual(self.get_page().paginator.cache_key, 'page:1')
+        self.assertEqual(self.get_page(page='2').paginator.cache_key,
+                         'page:2')
+        for params in ({'after': 'not-a-cursor'}, {'before': 'x'},
+                       {'page': 'x'}, {'page': '0'}):
+            with self.subTest(**params):
+                self.assertIsNone(self.get_page(**params).paginator.cache_key)
+
+    def test_single_query_without_count(self):
+        """Страница загружается одним запросом без COUNT и OFFSET."""
+        first = self.get_page()
+        cursor = first.paginator.next_cursor
+        with CaptureQueriesContext(connection) as queries:
+            list(self.get_page(after=cursor))
+        self.assertEqual(len(queries), 1)
+        sql = queries[0]['sql'].upper()
+        self.assertNotIn('COUNT(', sql)
+        self.assertNotIn('OFFSET', sql)
+
+
+@override_settings(CACHES={'default': {
+    'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}})
+class CommentPaginationTest(TestCase):
+    COMMENTS_COUNT = views.COMMENTS_LIMIT + 5
+
+    @classmethod
+    def setUpTestData(cls):
+        author = User.objects.create_user(username='author')
+        cls.post = Post.objects.create(text='Пост', author=author)
+        Comment.objects.bulk_create(
+            Comment(post=cls.post, author=author, text=f'Комментарий {i}')
+            for i in range(cls.COMMENTS_COUNT)
+        )
+        cls.expected = list(cls.post.comments.order_by('created', 'pk'))
+
+    def test_detail_renders_first_page(self):
+        """Страница записи показывает только первые комментарии."""
+        response = self.client.get(
+            reverse('posts:post_detail', args=[self.post.pk]))
+        comments = response.context['comments']
+        self.assertEqual(list(comments),
+                         self.expected[:views.COMMENTS_LIMIT])
+        self.assertContains(response, 'more-comments')
+
+    def test_json_endpoint_loads_next_page(self):
+        """JSON-страницы продолжают список с места курсора."""
+        url = reverse('posts:post_comments', args=[self.post.pk])
+        first = self.client.get(url).json()
+        second = self.client.get(first['next']).json()
+        self.assertEqual(
+            [comment['id'] for comment in first['comments']
+             + second['comments']],
+            [comment.pk for comment in self.expected]
+        )
+        self.assertIsNone(second['next'])
+
+    def test_missing_post(self):
+        """Комментарии несуществующей записи отдают 404."""
+        response = self.client.get(
+            reverse('posts:post_comments', args=[self.post.pk + 1]))
+        self.assertEqual(response.status_code, 404)
@@ -0,0 +1,55 @@
+from django.contrib.auth import get_user_model
+from django.test import Client, TestCase
+from django.urls import reverse
+
+from ..models import Comment, Follow, Group, Post
+from .utils import QueryBudgetMixin
+
+User = get_user_model()
+
+
+class QueryBudgetTest(QueryBudgetMixin, TestCase):
+    POSTS_COUNT = 15
+    COMMENTS_COUNT = 15
+    # Сессия и пользователь для авторизованного клиента
+    AUTH_QUERIES = 2
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(
+            title='Группа', slug='group', description='Описание')
+        authors = [User.objects.create_user(username=f'author{i}')
+                   for i in range(cls.POSTS_COUNT)]
+        for author in authors:
+            Follow.objects.create(user=cls.reader, author=author)
+            Post.objects.create(text='Запись', author=author,
+                                group=cls.group)
+        cls.post = Post.objects.create(text='Обсуждаемая запись',
+                                       author=authors[0], group=cls.group)
+        for author in authors[:cls.COMMENTS_COUNT]:
+            Comment.objects.create(post=cls.post, author=author,
+                                   text='Комментарий')
+
+    def setUp(self):
+        self.reader_client = Client()
+        self.reader_client.force_login(self.reader)
+
+    def test_views_fit_query_budget(self):
+        """Число запросов страниц не зависит от числа записей
+        и комментариев."""
+        # Группа, профиль и запись выполняют ещё один запрос для ETag
+        budgets = {
+            reverse('posts:main_page'): 1,
+            reverse('posts:group_list', kwargs={'slug': 'group'}): 3,
+            reverse('posts:profile', kwargs={'username': 'author0'}): 4,
+            reverse('posts:post_detail',
+                    kwargs={'post_id': self.post.pk}): 3,
+            reverse('posts:follow_index'): 2,
+            reverse('posts:post_comments',
+                    kwargs={'post_id': self.post.pk}): 2,
+        }
+        for url, budget in budgets.items():
+            with self.subTest(url=url):
+                self.assertQueryBudget(self.reader_client, url,
+                                       budget + self.AUTH_QUERIES)
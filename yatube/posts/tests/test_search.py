@@ -0,0 +1,121 @@
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..paginators import CursorPaginator
+from ..search import (FTS5Backend, SimpleBackend, get_backend,
+                      search_posts)
+from ..stemmer import stem
+
+User = get_user_model()
+
+
+class StemmerTest(TestCase):
+    def test_word_forms_share_stem(self):
+        """Разные формы слова приводятся к одной основе."""
+        cases = {
+            'котики': 'котик',
+            'котиков': 'котик',
+            'красивые': 'красив',
+            'программирования': 'программирован',
+            'важнейший': 'важн',
+            'улыбнувшись': 'улыбнувш',
+            'ёлки': 'елк',
+        }
+        for word, expected in cases.items():
+            with self.subTest(word=word):
+                self.assertEqual(stem(word), expected)
+
+
+class SearchTest(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = User.objects.create_user(username='author')
+        cls.group = Group.objects.create(
+            title='Кошачьи новости', slug='cats', description='Описание')
+        cls.cats = Post.objects.create(
+            text='Котики спят на диване', author=cls.author)
+        cls.many_cats = Post.objects.create(
+            text='Котик, котики и ещё раз котиков', author=cls.author)
+        cls.dogs = Post.objects.create(
+            text='Собаки гуляют во дворе', author=cls.author,
+            group=cls.group)
+
+    def search(self, query):
+        return list(search_posts(Post.objects.all(), query).order_by(
+            'search_rank', '-pk'))
+
+    def test_finds_word_forms_ranked(self):
+        """Поиск находит другие формы слова, частые упоминания выше."""
+        self.assertEqual(self.search('котиков'),
+                         [self.many_cats, self.cats])
+
+    def test_all_terms_required_and_group_title_indexed(self):
+        """Запись должна содержать все слова запроса, включая название
+        группы."""
+        self.assertEqual(self.search('собака новостями'), [self.dogs])
+        self.assertEqual(self.search('котики собаки'), [])
+        self.assertEqual(self.search('!!!'), [])
+
+    def test_index_follows_changes(self):
+        """Индекс обновляется при изменении и удалении записей и групп."""
+        self.cats.text = 'Попугаи поют'
+        self.cats.save()
+        self.assertEqual(self.search('попугай'), [self.cats])
+        self.assertEqual(self.search('диван'), [])
+
+        self.group.title = 'Пёсики'
+        self.group.save()
+        self.assertEqual(self.search('пёсик'), [self.dogs])
+        self.group.delete()
+        self.assertEqual(self.search('пёсик'), [])
+
+        self.many_cats.delete()
+        self.assertEqual(self.search('котик'), [])
+
+    def test_ranked_cursor_pagination(self):
+        """Курсоры по рангу обходят все результаты без повторов."""
+        for i in range(12):
+            Post.objects.create(text='котик ' * (i % 4 + 1) + 'гуляет',
+                                author=self.author)
+        posts = search_posts(Post.objects.all(), 'гулять')
+        seen = []
+        params = {}
+        while True:
+            paginator = CursorPaginator(posts, 5,
+                                        ordering=('search_rank', '-pk'))
+            page = paginator.page_for(params)
+            seen += list(page)
+            if not paginator.next_cursor:
+                break
+            params = {'after': paginator.next_cursor}
+        self.assertEqual(seen, self.search('гулять'))
+
+    def test_search_page_keeps_query_in_links(self):
+        """Страница поиска показывает результаты и сохраняет запрос в
+        ссылках на следующие страницы."""
+        for i in range(10):
+            Post.objects.create(text=f'Котик номер {i}', author=self.author)
+        response = self.client.get(reverse('posts:search'), {'q': 'котик'})
+        self.assertEqual(len(response.context['page_obj']), 10)
+        self.assertContains(response, '?q=%D0%BA%D0%BE%D1%82%D0%B8%D0%BA'
+                                      '&after=')
+
+    @override_settings(SEARCH_BACKEND='')
+    def test_backend_depends_on_database(self):
+        """Без настройки FTS5 берётся только на SQLite, на остальных базах
+        поиск идёт через LIKE и не пишет в таблицу индекса."""
+        self.assertIsInstance(get_backend(), FTS5Backend)
+        with mock.patch.object(connection, 'vendor', 'postgresql'):
+            backend = get_backend()
+        self.assertIsInstance(backend, SimpleBackend)
+        post = Post.objects.create(text='ночные ёжики', author=self.author)
+        with self.assertNumQueries(0):
+            backend.index([post])
+            backend.remove([post.pk])
+        self.assertEqual(
+            list(backend.search(Post.objects.all(), ['ёжик'])), [post])
@@ -0,0 +1,132 @@
+import shutil
+import tempfile
+import time
+from io import BytesIO
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from PIL import Image
+
+from .. import thumbnails
+from ..models import Post
+
+User = get_user_model()
+
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+class ThumbnailTest(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.media = tempfile.mkdtemp()
+        self.settings = override_settings(MEDIA_ROOT=self.media,
+                                          THUMBNAIL_WORKERS=0)
+        self.settings.enable()
+        self.author = User.objects.create_user(username='author')
+
+    def tearDown(self):
+        if thumbnails._executor is not None:
+            thumbnails._executor.shutdown()
+            thumbnails._executor = None
+        self.settings.disable()
+        shutil.rmtree(self.media)
+
+    def create_post(self, name='small.gif', content=SMALL_GIF):
+        return Post.objects.create(
+            text='Пост с картинкой', author=self.author,
+            image=SimpleUploadedFile(name, content)
+        )
+
+    def test_feed_does_not_render_thumbnails(self):
+        """Пока миниатюры нет, лента показывает оригинал и не
+        запускает Pillow."""
+        with mock.patch.object(thumbnails, 'generate'):
+            post = self.create_post()
+        with mock.patch.object(thumbnails.backend,
+                               'get_thumbnail') as get_thumbnail:
+            response = self.client.get(reverse('posts:main_page'))
+        get_thumbnail.assert_not_called()
+        self.assertContains(response, post.image.url)
+
+    def test_thumbnail_generated_after_commit(self):
+        """После сохранения записи лента показывает миниатюру."""
+        self.client.get(reverse('posts:main_page'))
+        post = self.create_post()
+        thumbnail = thumbnails.cached_thumbnail(post.image)
+        self.assertIsNotNone(thumbnail)
+        response = self.client.get(reverse('posts:main_page'))
+        self.assertContains(response, thumbnail.url)
+        self.assertNotContains(response, post.image.url)
+
+    def test_thumbnail_generated_in_pool(self):
+        """Процесс пула пишет файлы во временный MEDIA_ROOT, а записи в
+        хранилище sorl делает сервер."""
+        with mock.patch.object(thumbnails, 'generate'):
+            post = self.create_post()
+        with override_settings(THUMBNAIL_WORKERS=1), mock.patch.object(
+                thumbnails, 'close_old_connections') as close:
+            thumbnails.generate(post).result(timeout=60)
+        close.assert_called_once()
+        thumbnail = thumbnails.cached_thumbnail(post.image)
+        self.assertIsNotNone(thumbnail)
+        self.assertTrue(thumbnail.storage.path(thumbnail.name).startswith(
+            self.media))
+
+    def test_miss_expires_for_other_processes(self):
+        """Промах запоминается ненадолго: миниатюру, созданную процессом со
+        своим кешем, остальные находят после истечения промаха."""
+        with mock.patch.object(thumbnails, 'generate'):
+            post = self.create_post()
+        self.assertIsNone(thumbnails.post_image(post.image))
+        self.assertIsNone(thumbnails.cached_thumbnail(post.image))
+        caches = {**settings.CACHES, 'worker': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'worker',
+        }}
+        with override_settings(CACHES=caches, THUMBNAIL_CACHE='worker'):
+            thumbnails.render_thumbnail(post.image.name)
+        self.assertIsNone(thumbnails.post_image(post.image))
+        later = time.time() + settings.THUMBNAIL_MISS_TIMEOUT + 1
+        with mock.patch('time.time', return_value=later):
+            self.assertIsNotNone(thumbnails.post_image(post.image))
+            self.assertIsNotNone(thumbnails.cached_thumbnail(post.image))
+
+    def test_missing_file_is_skipped(self):
+        """Запись со ссылкой на несуществующий файл сохраняется."""
+        with self.assertLogs('posts.thumbnails', 'WARNING'):
+            post = Post.objects.create(text='Пост', author=self.author,
+                                       image='posts/missing.jpg')
+        self.assertIsNone(thumbnails.cached_thumbnail(post.image))
+
+    def test_feed_page_looks_up_thumbnails_in_one_query(self):
+        """Миниатюры страницы ленты читаются из хранилища одним запросом."""
+        posts = [self.create_post() for _ in range(3)]
+        cache.clear()
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('posts:main_page'))
+        for post in posts:
+            self.assertContains(
+                response, thumbnails.cached_thumbnail(post.image).url)
+
+    def test_feed_offers_derivative_widths(self):
+        """Лента предлагает производные в srcset, не шире оригинала."""
+        content = BytesIO()
+        Image.new('RGB', (1000, 400)).save(content, 'JPEG')
+        self.create_post('wide.jpg', content.getvalue())
+        response = self.client.get(reverse('posts:main_page'))
+        self.assertContains(response, '<picture>')
+        self.assertContains(response, ' 480w')
+        self.assertContains(response, ' 960w')
+        self.assertNotContains(response, ' 1440w')
@@ -0,0 +1,152 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.test import TestCase
+
+from .. import timeline
+from ..models import AuthorStats, Follow, Post, TimelineEntry
+from ..paginators import CursorPaginator
+
+User = get_user_model()
+
+
+class TimelineTest(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='author')
+        self.other = User.objects.create_user(username='other')
+
+    def test_new_post_is_fanned_out_to_followers(self):
+        """Новая запись попадает в ленту подписчика, но не в чужие."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        post = Post.objects.create(text='Новая запись', author=self.author)
+        self.assertTrue(
+            TimelineEntry.objects.filter(user=self.reader, post=post).exists()
+        )
+        self.assertFalse(
+            TimelineEntry.objects.filter(user=self.other).exists()
+        )
+
+    def test_follow_backfills_and_unfollow_removes(self):
+        """Подписка подтягивает старые записи, отписка их убирает."""
+        Post.objects.create(text='Старая запись', author=self.author)
+        Post.objects.create(text='Чужая запись', author=self.other)
+        Follow.objects.create(user=self.reader, author=self.other)
+        follow = Follow.objects.create(user=self.reader, author=self.author)
+        self.assertEqual(timeline.timeline_posts(self.reader).count(), 2)
+
+        follow.delete()
+        self.assertEqual(
+            list(timeline.timeline_posts(self.reader).values_list(
+                'author', flat=True)),
+            [self.other.pk]
+        )
+
+    def test_timeline_is_trimmed(self):
+        """Лента обрезается до TIMELINE_LENGTH последних записей."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        with mock.patch.object(timeline, 'TIMELINE_LENGTH', 3):
+            posts = [
+                Post.objects.create(text=f'Запись {i}', author=self.author)
+                for i in range(5)
+            ]
+        self.assertEqual(
+            set(timeline.timeline_posts(self.reader)), set(posts[2:])
+        )
+
+    def test_high_follower_author_is_merged_on_read(self):
+        """Записи популярного автора не раскладываются по лентам,
+        но видны в ленте подписок."""
+        with mock.patch.object(timeline, 'FANOUT_FOLLOWER_THRESHOLD', 1):
+            Follow.objects.create(user=self.reader, author=self.author)
+            Follow.objects.create(user=self.other, author=self.author)
+            post = Post.objects.create(text='Запись', author=self.author)
+            self.assertFalse(TimelineEntry.objects.filter(post=post).exists())
+            self.assertEqual(
+                list(timeline.timeline_posts(self.reader)), [post]
+            )
+
+    @mock.patch.object(timeline, 'FANOUT_FOLLOWER_THRESHOLD', 2)
+    @mock.patch.object(timeline, 'FANOUT_RESUME_THRESHOLD', 1)
+    def test_author_is_fanned_out_again_below_resume_threshold(self):
+        """Автор возвращается к раскладке по лентам только ниже нижнего
+        порога, и записи, вышедшие без раскладки, появляются в лентах."""
+        late = User.objects.create_user(username='late')
+        Follow.objects.create(user=self.reader, author=self.author)
+        old = Post.objects.create(text='old', author=self.author)
+        Follow.objects.create(user=self.other, author=self.author)
+        Follow.objects.create(user=late, author=self.author)
+        merged = Post.objects.create(text='while merged', author=self.author)
+        self.assertTrue(timeline.is_merged(self.author.pk))
+
+        with mock.patch.object(timeline.transaction, 'on_commit',
+                               lambda callback: callback()):
+            # Между порогами автор остаётся подмешиваемым
+            Follow.objects.unfollow(late, self.author)
+            self.assertTrue(timeline.is_merged(self.author.pk))
+            self.assertFalse(
+                TimelineEntry.objects.filter(post=merged).exists())
+            Follow.objects.unfollow(self.other, self.author)
+
+        self.assertFalse(timeline.is_merged(self.author.pk))
+        self.assertTrue(TimelineEntry.objects.filter(
+            user=self.reader, post=merged).exists())
+        self.assertEqual(list(timeline.timeline_posts(self.reader)),
+                         [merged, old])
+
+    def test_timeline_pages_follow_entries(self):
+        """Лента листается курсором по полям записей ленты."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        posts = [Post.objects.create(text=f'Запись {i}', author=self.author)
+                 for i in range(3)]
+        paginator = CursorPaginator(timeline.timeline_posts(self.reader), 2,
+                                    ordering=timeline.ORDERING)
+        self.assertEqual(list(paginator.page_for({})), posts[:0:-1])
+        after = CursorPaginator(timeline.timeline_posts(self.reader), 2,
+                                ordering=timeline.ORDERING)
+        self.assertEqual(
+            list(after.page_for({'after': paginator.next_cursor})),
+            posts[:1])
+
+    def test_fanoutstats_command(self):
+        """Команда fanoutstats выводит авторов и число вставок."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        Post.objects.create(text='Запись', author=self.author)
+        out = StringIO()
+        call_command('fanoutstats', threshold=0, stdout=out)
+        self.assertIn(self.author.username, out.getvalue())
+        self.assertIn('Авторов, подмешиваемых при чтении: 1', out.getvalue())
+
+
+class FollowConstraintTest(TestCase):
+    def setUp(self):
+        self.reader = User.objects.create_user(username='reader')
+        self.author = User.objects.create_user(username='author')
+
+    def test_follow_is_idempotent(self):
+        """Повторная подписка не создает дубликат."""
+        self.assertTrue(Follow.objects.follow(self.reader, self.author))
+        self.assertFalse(Follow.objects.follow(self.reader, self.author))
+        self.assertEqual(
+            Follow.objects.filter(user=self.reader,
+                                  author=self.author).count(),
+            1
+        )
+
+    def test_unfollow_is_idempotent(self):
+        """Повторная отписка не уменьшает счётчики второй раз."""
+        other = User.objects.create_user(username='other')
+        Follow.objects.follow(other, self.author)
+        Follow.objects.follow(self.reader, self.author)
+        self.assertTrue(Follow.objects.unfollow(self.reader, self.author))
+        with mock.patch.object(timeline, 'follower_removed') as removed:
+            self.assertFalse(Follow.objects.unfollow(self.reader,
+                                                     self.author))
+        removed.assert_not_called()
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.author).followers_count, 1)
+        self.assertEqual(AuthorStats.objects.get(
+            user=self.reader).following_count, 0)
+        self.assertTrue(Follow.objects.filter(author=self.author).exists())
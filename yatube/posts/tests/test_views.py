@@ -86,8 +86,6 @@ class PostsPagesTests(TestCase):
                 description='Тестовая группа'
             ),
         )
-        self.second_author_client.get(reverse('posts:profile_follow', kwargs={
-            'username': self.first_author.username}))
         cache.clear()
         new_second_author_content = self.second_author_client.get(
             reverse('posts:follow_index')).content
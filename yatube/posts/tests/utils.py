@@ -0,0 +1,22 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+
+class QueryBudgetMixin:
+    """Проверка, что страница укладывается в заданное число запросов.
+
+    Кеш перед запросом очищается, чтобы бюджет проверялся на холодном пути.
+    """
+
+    def assertQueryBudget(self, client, url, budget):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        executed = [query['sql'] for query in queries.captured_queries]
+        self.assertLessEqual(
+            len(executed), budget,
+            f'{url}: {len(executed)} запросов при бюджете {budget}:\n'
+            + '\n'.join(executed)
+        )
+        return response
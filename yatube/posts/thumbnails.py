@@ -0,0 +1,298 @@
+"""Фоновая генерация миниатюр картинок записей.
+
+Шаблоны только читают готовую миниатюру из key-value хранилища sorl и не
+запускают Pillow внутри запроса. Миниатюры создаются в пуле процессов после
+фиксации транзакции, а когда миниатюра готова, кеш лент сбрасывается, чтобы
+вместо оригинала показалась она.
+
+Процессы пула только пишут файлы миниатюр и не обращаются к базе: записи в
+key-value хранилище sorl и сброс кеша лент делает процесс сервера, когда
+файлы готовы.
+
+Найденные миниатюры кешируются надолго, а промахи — на
+``THUMBNAIL_MISS_TIMEOUT`` секунд (см. ``kvstore``), поэтому и без общего
+кеша (``CACHE_URL``) остальные процессы сервера увидят готовую миниатюру
+вскоре после того, как её создаст один из них.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+
+from PIL import features
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from sorl.thumbnail import default
+from sorl.thumbnail.base import ThumbnailBackend
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile, deserialize_image_file
+from sorl.thumbnail.kvstores.base import add_prefix
+from sorl.thumbnail.kvstores.cached_db_kvstore import EMPTY_VALUE
+from sorl.thumbnail.models import KVStore as KVStoreModel
+
+from . import worker
+from .feeds import invalidate_post_feeds
+from .kvstore import KVStore
+from .storage import post_images
+
+THUMBNAIL_GEOMETRY = '960x339'
+THUMBNAIL_OPTIONS = {'crop': 'center', 'upscale': True}
+# Ширины производных для srcset с тем же соотношением сторон, что и у
+# основной миниатюры. Шире оригинала производные не растягиваются.
+THUMBNAIL_WIDTHS = (480, 960, 1440)
+# WebP создаётся, только если Pillow собран с libwebp
+THUMBNAIL_FORMATS = (
+    ('WEBP', 'image/webp'),
+    ('JPEG', 'image/jpeg'),
+) if features.check('webp') else (('JPEG', 'image/jpeg'),)
+THUMBNAIL_SIZES = '(min-width: 992px) 960px, 100vw'
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+class CachedThumbnailBackend(ThumbnailBackend):
+    """Бэкенд sorl, который умеет искать миниатюры без их генерации."""
+
+    def _resolve(self, file_, geometry_string, options):
+        """Дополняет опции так же, как ``get_thumbnail``, и возвращает
+        исходник, опции и файл миниатюры с тем же именем."""
+        source = ImageFile(file_)
+        if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+            options.setdefault('format', self._get_format(source))
+        for key, value in self.default_options.items():
+            options.setdefault(key, value)
+        for key, attr in self.extra_options:
+            value = getattr(sorl_settings, attr)
+            if value != getattr(sorl_defaults, attr):
+                options.setdefault(key, value)
+        name = self._get_thumbnail_filename(source, geometry_string, options)
+        return source, options, ImageFile(name, default.storage)
+
+    def thumbnail_file(self, file_, geometry_string, **options):
+        return self._resolve(file_, geometry_string, options)[2]
+
+    def get_cached_thumbnail(self, file_, geometry_string, **options):
+        """Возвращает готовую миниатюру или ``None``."""
+        if not file_:
+            return None
+        return default.kvstore.get(
+            self.thumbnail_file(file_, geometry_string, **options))
+
+    def get_cached_thumbnails(self, thumbnails):
+        """Ищет несколько миниатюр сразу, возвращает словарь по именам.
+
+        Хранилище ``kvstore.KVStore`` опрашивается одним ``get_many`` к
+        кешу и одним запросом к базе для промахов; для других хранилищ
+        миниатюры ищутся по одной.
+        """
+        if not isinstance(default.kvstore, KVStore):
+            return {thumbnail.name: default.kvstore.get(thumbnail)
+                    for thumbnail in thumbnails}
+        keys = {thumbnail.name: add_prefix(thumbnail.key)
+                for thumbnail in thumbnails}
+        kv_cache = default.kvstore.cache
+        values = kv_cache.get_many(keys.values())
+        missing = set(keys.values()) - set(values)
+        if missing:
+            found = dict(KVStoreModel.objects.filter(
+                key__in=missing).values_list('key', 'value'))
+            default.kvstore.remember(found, missing - set(found))
+            values.update(found)
+            values.update(dict.fromkeys(missing - set(found), EMPTY_VALUE))
+        return {
+            name: (None if values[key] == EMPTY_VALUE
+                   else deserialize_image_file(values[key]))
+            for name, key in keys.items()
+        }
+
+    def _open(self, source):
+        try:
+            return default.engine.get_image(source)
+        except Exception as error:
+            logger.warning('Не удалось открыть картинку %s: %s',
+                           source.name, error)
+            return None
+
+    def create_thumbnails(self, file_, variants, store=True):
+        """Создаёт недостающие миниатюры, декодируя оригинал один раз.
+
+        ``variants`` — пары ``(геометрия, опции)``. Уже созданные файлы
+        только записываются в хранилище, поэтому повторный вызов дёшев.
+        Без ``store`` создаются только файлы, а база не используется.
+        """
+        source_image = source_size = None
+        try:
+            for geometry_string, options in variants:
+                source, options, thumbnail = self._resolve(
+                    file_, geometry_string, dict(options))
+                if store and default.kvstore.get(thumbnail):
+                    continue
+                if not thumbnail.exists():
+                    if source_image is None:
+                        source_image = self._open(source)
+                        if source_image is None:
+                            return
+                        source_size = default.engine.get_image_size(
+                            source_image)
+                        image_info = default.engine.get_image_info(
+                            source_image)
+                    width = int(geometry_string.split('x')[0])
+                    if width > source_size[0] and not options['upscale']:
+                        continue
+                    options['image_info'] = image_info
+                    self._create_thumbnail(source_image, geometry_string,
+                                           options, thumbnail)
+                if not store:
+                    continue
+                source.set_size(source_size)
+                default.kvstore.get_or_set(source)
+                default.kvstore.set(thumbnail, source)
+        finally:
+            if source_image is not None:
+                default.engine.cleanup(source_image)
+
+
+backend = CachedThumbnailBackend()
+
+
+def _variants():
+    """Форматы, ширины и параметры sorl всех производных картинки."""
+    base_width, base_height = map(int, THUMBNAIL_GEOMETRY.split('x'))
+    for image_format, mime_type in THUMBNAIL_FORMATS:
+        for width in THUMBNAIL_WIDTHS:
+            height = round(width * base_height / base_width)
+            yield mime_type, width, f'{width}x{height}', {
+                **THUMBNAIL_OPTIONS,
+                'format': image_format,
+                'upscale': width == base_width,
+            }
+
+
+class PostImage:
+    """Готовые производные картинки записи для тега ``<picture>``."""
+
+    sizes = THUMBNAIL_SIZES
+
+    def __init__(self, thumbnail, sources):
+        self.url = thumbnail.url
+        self.sources = sources
+
+
+def cached_thumbnail(image):
+    return backend.get_cached_thumbnail(image, THUMBNAIL_GEOMETRY,
+                                        **THUMBNAIL_OPTIONS)
+
+
+def _derivatives(image):
+    return [
+        (mime_type, width, backend.thumbnail_file(image, geometry, **options))
+        for mime_type, width, geometry, options in _variants()
+    ]
+
+
+def prefetch(posts):
+    """Находит производные картинок всех записей страницы одним обращением
+    к хранилищу и запоминает их в ``post.thumbnail``."""
+    derivatives = {post.pk: _derivatives(post.image)
+                   for post in posts if post.image}
+    found = backend.get_cached_thumbnails(
+        [thumbnail for files in derivatives.values()
+         for _, _, thumbnail in files])
+    for post in posts:
+        post.thumbnail = None
+        if post.image:
+            post.thumbnail = post_image(post.image, derivatives[post.pk],
+                                        found)
+
+
+def post_image(image, derivatives=None, found=None):
+    """Производные картинки записи или ``None``, пока они создаются."""
+    if not image:
+        return None
+    if derivatives is None:
+        derivatives = _derivatives(image)
+        found = backend.get_cached_thumbnails(
+            [thumbnail for _, _, thumbnail in derivatives])
+    base = backend.thumbnail_file(image, THUMBNAIL_GEOMETRY,
+                                  **THUMBNAIL_OPTIONS)
+    if found.get(base.name) is None:
+        return None
+    sources = {}
+    for mime_type, width, thumbnail in derivatives:
+        if found.get(thumbnail.name) is not None:
+            sources.setdefault(mime_type, []).append(
+                f'{found[thumbnail.name].url} {width}w')
+    return PostImage(found[base.name], [
+        (mime_type, ', '.join(srcset)) for mime_type, srcset in sources.items()
+    ])
+
+
+def render_thumbnail(name, store=True):
+    """Создаёт все производные картинки и записывает их в хранилище sorl;
+    без ``store`` — только файлы, как в процессе пула."""
+    backend.create_thumbnails(ImageFile(name, post_images), [
+        (geometry, options) for _, _, geometry, options in _variants()
+    ], store)
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            # spawn, а не fork: дочерний процесс не должен унаследовать
+            # открытые соединения с базой родителя
+            _executor = ProcessPoolExecutor(
+                max_workers=settings.THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=worker.setup,
+                initargs=(settings.MEDIA_ROOT,),
+            )
+        return _executor
+
+
+def _finished(post, future, done):
+    """Записывает готовые файлы в хранилище sorl; выполняется в служебном
+    потоке пула, поэтому его соединения с базой закрываются."""
+    try:
+        future.result()
+        # Промах до готовности миниатюры закеширован sorl в кеше этого
+        # процесса; вызов находит готовые файлы и только обновляет записи.
+        render_thumbnail(post.image.name)
+        invalidate_post_feeds(post.author_id, [post.group_id], post.pk)
+    except Exception as error:
+        logger.error('Не удалось создать миниатюру %s', post.image.name,
+                     exc_info=error)
+        done.set_exception(error)
+    else:
+        done.set_result(None)
+    finally:
+        close_old_connections()
+
+
+def generate(post):
+    """Создаёт миниатюру картинки записи в пуле процессов и возвращает
+    ``Future``, который завершается, когда она записана в хранилище.
+
+    Если пул отключён (``THUMBNAIL_WORKERS = 0``), миниатюра создаётся
+    сразу в текущем процессе.
+    """
+    done = Future()
+    if not settings.THUMBNAIL_WORKERS:
+        render_thumbnail(post.image.name)
+        invalidate_post_feeds(post.author_id, [post.group_id], post.pk)
+        done.set_result(None)
+        return done
+    future = _get_executor().submit(render_thumbnail, post.image.name,
+                                    store=False)
+    future.add_done_callback(lambda future: _finished(post, future, done))
+    return done
+
+
+def schedule(post):
+    """Ставит генерацию миниатюры в очередь после фиксации транзакции."""
+    if post.image:
+        transaction.on_commit(lambda: generate(post))
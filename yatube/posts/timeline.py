@@ -0,0 +1,241 @@
+"""Материализованная лента подписок (fan-out on write).
+
+Новая запись автора сразу раскладывается по лентам его подписчиков, поэтому
+чтение ``follow_index`` сводится к диапазонному чтению по индексу
+``(user, pub_date, post)`` вместо подзапроса по всем авторам из подписок:
+лента сортируется и листается по полям ``TimelineEntry`` (``ORDERING``),
+а записи подтягиваются по первичному ключу.
+
+Когда подписчиков у автора становится больше
+``FANOUT_FOLLOWER_THRESHOLD``, его записи перестают раскладываться по
+лентам и подмешиваются при чтении (``AuthorStats.merged``). Обратно автор
+переходит, только когда подписчиков становится не больше
+``FANOUT_RESUME_THRESHOLD``: после фиксации отписки его последние записи
+раскладываются по лентам всех подписчиков заново (``refan``). Разрыв между
+порогами не даёт подписке и отписке у границы повторять эту дорогую
+раскладку на каждом переключении.
+"""
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, OuterRef, Q, Subquery
+
+from .caching import bump_version, drop_versions
+from .models import AuthorStats, Follow, Post, TimelineEntry
+
+TIMELINE_LENGTH = settings.TIMELINE_LENGTH
+FANOUT_FOLLOWER_THRESHOLD = settings.FANOUT_FOLLOWER_THRESHOLD
+FANOUT_RESUME_THRESHOLD = settings.FANOUT_RESUME_THRESHOLD
+# Сортировка ленты по аннотациям из ``timeline_posts``
+ORDERING = ('-timeline_date', '-timeline_post')
+
+
+def timeline_posts(user):
+    """Записи ленты подписок, отсортированные по ``ORDERING``."""
+    merged_authors = list(high_follower_authors(user))
+    if not merged_authors:
+        # Аннотации переиспользуют JOIN из filter(), поэтому сортировка
+        # и курсор идут по индексу ленты, без сортировки во временном
+        # дереве
+        return Post.objects.filter(timeline_entries__user=user).annotate(
+            timeline_date=F('timeline_entries__pub_date'),
+            timeline_post=F('timeline_entries__post'),
+        ).order_by(*ORDERING)
+    entries = Post.objects.filter(timeline_entries__user=user)
+    return Post.objects.filter(
+        Q(pk__in=entries.values('pk')) | Q(author__in=merged_authors)
+    ).annotate(
+        timeline_date=F('pub_date'), timeline_post=F('pk'),
+    ).order_by(*ORDERING)
+
+
+def high_follower_authors(user):
+    """Авторы из подписок пользователя, чьи записи подмешиваются при
+    чтении ленты."""
+    return AuthorStats.objects.filter(
+        user__in=Follow.objects.filter(user=user).values('author'),
+        merged=True,
+    ).values_list('user', flat=True)
+
+
+def is_merged(author_id):
+    return AuthorStats.objects.filter(user_id=author_id, merged=True).exists()
+
+
+def update_merged():
+    """Переключает режим авторов по счётчикам подписчиков, например после
+    массовой вставки подписок в обход сигналов; между порогами режим не
+    меняется."""
+    AuthorStats.objects.filter(
+        merged=False, followers_count__gt=FANOUT_FOLLOWER_THRESHOLD,
+    ).update(merged=True)
+    AuthorStats.objects.filter(
+        merged=True, followers_count__lte=FANOUT_RESUME_THRESHOLD,
+    ).update(merged=False)
+
+
+def invalidate_feeds(author_id):
+    """Сбрасывает кеш лент подписок у подписчиков автора.
+
+    Ленты с подмешанными при чтении записями зависят от общей версии
+    ``('follow', 'merged')``, поэтому у популярных авторов сбрасывается она.
+    """
+    followers = list(
+        Follow.objects.filter(author_id=author_id).values_list(
+            'user_id', flat=True)[:FANOUT_FOLLOWER_THRESHOLD + 1]
+    )
+    if len(followers) > FANOUT_FOLLOWER_THRESHOLD or is_merged(author_id):
+        bump_version('follow', 'merged')
+    else:
+        drop_versions(('follow', user_id) for user_id in followers)
+
+
+def fan_out(post):
+    """Добавляет запись в ленты всех подписчиков автора."""
+    if is_merged(post.author_id):
+        return
+    followers = list(
+        Follow.objects.filter(author_id=post.author_id).values_list(
+            'user_id', flat=True)[:FANOUT_FOLLOWER_THRESHOLD + 1]
+    )
+    if not followers or len(followers) > FANOUT_FOLLOWER_THRESHOLD:
+        return
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post=post, pub_date=post.pub_date)
+         for user_id in followers),
+        ignore_conflicts=True,
+    )
+    trim(followers)
+
+
+def backfill(user_id, author_id):
+    """Заполняет ленту пользователя последними записями нового автора."""
+    if is_merged(author_id):
+        return
+    posts = Post.objects.filter(author_id=author_id).order_by(
+        '-pub_date').values_list('pk', 'pub_date')[:TIMELINE_LENGTH]
+    TimelineEntry.objects.bulk_create(
+        (TimelineEntry(user_id=user_id, post_id=pk, pub_date=pub_date)
+         for pk, pub_date in posts),
+        ignore_conflicts=True,
+    )
+    trim([user_id])
+
+
+def refan(author_id):
+    """Возвращает автора к раскладке по лентам: раскладывает его последние
+    записи по лентам всех подписчиков.
+
+    Записей, вышедших, пока автор подмешивался при чтении, нет ни в одной
+    ленте, а подписчикам, пришедшим за это время, ``backfill`` их не
+    добавлял.
+    """
+    followers = list(
+        Follow.objects.filter(author_id=author_id).values_list(
+            'user_id', flat=True)[:FANOUT_RESUME_THRESHOLD + 1]
+    )
+    if len(followers) > FANOUT_RESUME_THRESHOLD:
+        return
+    with transaction.atomic(), connection.cursor() as cursor:
+        # Флаг снимается до вставки, чтобы новые записи уже раскладывались
+        # при публикации; повторный вызов ничего не делает
+        if not AuthorStats.objects.filter(
+                user_id=author_id, merged=True).update(merged=False):
+            return
+        cursor.execute(f'''
+            INSERT INTO {TimelineEntry._meta.db_table}
+                (user_id, post_id, pub_date)
+            SELECT follow.user_id, post.id, post.pub_date
+            FROM {Follow._meta.db_table} follow
+            CROSS JOIN (
+                SELECT id, pub_date FROM {Post._meta.db_table}
+                WHERE author_id = %s
+                ORDER BY pub_date DESC, id DESC
+                LIMIT %s
+            ) post
+            WHERE follow.author_id = %s
+            ON CONFLICT DO NOTHING
+        ''', [author_id, TIMELINE_LENGTH, author_id])
+        trim(followers)
+    drop_versions(('follow', user_id) for user_id in followers)
+    bump_version('follow', 'merged')
+
+
+def follower_added(author_id):
+    """После подписки: если подписчиков у автора стало больше
+    ``FANOUT_FOLLOWER_THRESHOLD``, его записи начинают подмешиваться при
+    чтении."""
+    if is_merged(author_id):
+        return
+    followers = Follow.objects.filter(author_id=author_id)
+    if followers[FANOUT_FOLLOWER_THRESHOLD:].exists() and (
+            AuthorStats.objects.filter(user_id=author_id).update(
+                merged=True)):
+        bump_version('follow', 'merged')
+
+
+def follower_removed(author_id):
+    """После отписки: если подписчиков у автора стало не больше
+    ``FANOUT_RESUME_THRESHOLD``, его записи раскладываются по лентам заново
+    после фиксации транзакции, а не внутри неё."""
+    followers = Follow.objects.filter(author_id=author_id)
+    if is_merged(author_id) and not (
+            followers[FANOUT_RESUME_THRESHOLD:].exists()):
+        transaction.on_commit(lambda: refan(author_id))
+
+
+def remove(user_id, author_id):
+    """Убирает из ленты пользователя записи автора, от которого он
+    отписался."""
+    TimelineEntry.objects.filter(
+        user_id=user_id, post__author_id=author_id).delete()
+
+
+def trim(user_ids):
+    """Обрезает ленты до ``TIMELINE_LENGTH`` самых свежих записей."""
+    boundary = TimelineEntry.objects.filter(
+        user_id=OuterRef('user_id')
+    ).order_by('-pub_date').values('pub_date')[
+        TIMELINE_LENGTH - 1:TIMELINE_LENGTH]
+    TimelineEntry.objects.filter(
+        user_id__in=user_ids,
+        pub_date__lt=Subquery(boundary),
+    ).delete()
+
+
+def rebuild(users=None):
+    """Пересобирает ленты пользователей одним INSERT ... SELECT.
+
+    Нужна после массовой вставки записей и подписок в обход сигналов;
+    счётчики подписчиков (``AuthorStats``) должны быть уже пересчитаны.
+    ``users`` — выборка пользователей, чьи ленты пересобираются; по
+    умолчанию — все.
+    """
+    update_merged()
+    entries = TimelineEntry.objects.all()
+    readers, params = '', []
+    if users is not None:
+        users = users.values('pk')
+        entries = entries.filter(user__in=users)
+        sql, params = users.query.sql_with_params()
+        readers = f'AND follow.user_id IN ({sql})'
+    with transaction.atomic(), connection.cursor() as cursor:
+        entries.delete()
+        cursor.execute(f'''
+            INSERT INTO {TimelineEntry._meta.db_table}
+                (user_id, post_id, pub_date)
+            SELECT user_id, post_id, pub_date FROM (
+                SELECT follow.user_id, post.id AS post_id, post.pub_date,
+                       ROW_NUMBER() OVER (
+                           PARTITION BY follow.user_id
+                           ORDER BY post.pub_date DESC, post.id DESC
+                       ) AS position
+                FROM {Follow._meta.db_table} follow
+                JOIN {Post._meta.db_table} post
+                    ON post.author_id = follow.author_id
+                WHERE follow.author_id NOT IN (
+                    SELECT user_id FROM {AuthorStats._meta.db_table}
+                    WHERE merged = %s
+                ) {readers}
+            ) ranked
+            WHERE position <= %s
+        ''', [True, *params, TIMELINE_LENGTH])
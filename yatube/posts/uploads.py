@@ -0,0 +1,126 @@
+"""Нормализация загружаемых картинок.
+
+Django сохраняет большие загрузки во временный файл, а Pillow читает из него
+только заголовок, поэтому проверки размеров не требуют памяти. Картинка
+перекодируется, только если она больше ``IMAGE_MAX_SIDE``, содержит EXIF
+или сохранена в формате, который не отдаётся браузерам как есть. JPEG при
+этом декодируется сразу в уменьшенном масштабе (``Image.draft``), и память
+на загрузку ограничена размером результата, а не оригинала.
+
+Анимации (GIF, APNG, WebP) кадр за кадром не уменьшаются: больше
+``IMAGE_MAX_SIDE`` они отклоняются, а с EXIF — пересохраняются покадрово без
+метаданных, если все кадры вместе не больше ``IMAGE_MAX_PIXELS``.
+"""
+import os
+from io import BytesIO
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from PIL import Image, ImageOps, ImageSequence
+
+IMAGE_MAX_BYTES = settings.IMAGE_MAX_BYTES
+IMAGE_MAX_PIXELS = settings.IMAGE_MAX_PIXELS
+IMAGE_MAX_SIDE = settings.IMAGE_MAX_SIDE
+JPEG_QUALITY = 90
+EXIF_ORIENTATION = 0x0112
+
+# Форматы, которые хранятся без перекодирования
+KEPT_FORMATS = {'JPEG', 'PNG', 'GIF', 'WEBP'}
+EXTENSIONS = {'JPEG': '.jpg', 'PNG': '.png'}
+
+
+def _is_animation(image):
+    # Многокадровые файлы других форматов (MPO, TIFF) сводятся к первому
+    # кадру в _encode
+    return (getattr(image, 'is_animated', False)
+            and image.format in KEPT_FORMATS)
+
+
+def _needs_encoding(image):
+    return (image.format not in KEPT_FORMATS
+            or max(image.size) > IMAGE_MAX_SIDE
+            or bool(image.getexif()))
+
+
+def _encode(image, name):
+    """Уменьшает картинку, поворачивает её по EXIF и сохраняет без
+    метаданных в JPEG или, если есть прозрачность, в PNG."""
+    scale = min(IMAGE_MAX_SIDE / max(image.size), 1)
+    image.draft('RGB', (round(image.width * scale),
+                        round(image.height * scale)))
+    image.thumbnail((IMAGE_MAX_SIDE, IMAGE_MAX_SIDE), Image.LANCZOS)
+    if image.getexif().get(EXIF_ORIENTATION, 1) != 1:
+        image = ImageOps.exif_transpose(image)
+    transparent = (image.mode in ('RGBA', 'LA', 'PA')
+                   or 'transparency' in image.info)
+    output_format = 'PNG' if transparent else 'JPEG'
+    content = BytesIO()
+    if output_format == 'JPEG':
+        image.convert('RGB').save(content, 'JPEG', quality=JPEG_QUALITY,
+                                  optimize=True)
+    else:
+        image.convert('RGBA').save(content, 'PNG', optimize=True)
+    name = os.path.splitext(os.path.basename(name))[0]
+    return SimpleUploadedFile(name + EXTENSIONS[output_format],
+                              content.getvalue(),
+                              'image/' + output_format.lower())
+
+
+def _encode_animation(image, name):
+    """Пересохраняет анимацию в том же формате без EXIF, сохраняя
+    длительность кадров."""
+    if image.width * image.height * image.n_frames > IMAGE_MAX_PIXELS:
+        raise ValidationError(
+            'Анимация больше %(limit)d мегапикселей во всех кадрах.',
+            code='too_many_pixels',
+            params={'limit': IMAGE_MAX_PIXELS // 10 ** 6},
+        )
+    frames = []
+    for frame in ImageSequence.Iterator(image):
+        frame = frame.copy()
+        frame.info.pop('exif', None)
+        frames.append(frame)
+    content = BytesIO()
+    frames[0].save(
+        content, image.format, save_all=True, append_images=frames[1:],
+        duration=[frame.info.get('duration', 0) for frame in frames],
+        loop=image.info.get('loop', 0))
+    return SimpleUploadedFile(os.path.basename(name), content.getvalue(),
+                              Image.MIME[image.format])
+
+
+def normalize_image(upload):
+    """Проверяет загруженную картинку и возвращает файл для сохранения.
+
+    Слишком большие по весу или числу пикселей файлы отклоняются с
+    ``ValidationError``; подходящие возвращаются как есть или
+    перекодированными.
+    """
+    if upload.size > IMAGE_MAX_BYTES:
+        raise ValidationError(
+            'Файл больше %(limit)d МБ.',
+            code='file_too_large',
+            params={'limit': IMAGE_MAX_BYTES // 2 ** 20},
+        )
+    upload.seek(0)
+    with Image.open(upload) as image:
+        width, height = image.size
+        if width * height > IMAGE_MAX_PIXELS:
+            raise ValidationError(
+                'Картинка больше %(limit)d мегапикселей.',
+                code='too_many_pixels',
+                params={'limit': IMAGE_MAX_PIXELS // 10 ** 6},
+            )
+        if not _needs_encoding(image):
+            upload.seek(0)
+            return upload
+        if not _is_animation(image):
+            return _encode(image, upload.name)
+        if max(width, height) > IMAGE_MAX_SIDE:
+            raise ValidationError(
+                'Анимация больше %(limit)d пикселей по стороне.',
+                code='animation_too_large',
+                params={'limit': IMAGE_MAX_SIDE},
+            )
+        return _encode_animation(image, upload.name)
@@ -1,59 +1,118 @@
 from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.core.paginator import Paginator
+from django.db import transaction
+from django.http import JsonResponse
 from django.shortcuts import get_object_or_404, render, redirect
 from django.urls import reverse
+from django.utils.http import urlencode
+from django.views.decorators.cache import cache_control
+from django.views.decorators.http import condition
 
+from . import feeds, thumbnails
+from .caching import feed_cache_context, feed_etag
 from .forms import PostForm, CommentForm
-from .models import Group, Post, User, Follow
+from .models import AuthorStats, Group, Post, User, Follow
+from .paginators import CursorPaginator
 
 POSTS_LIMIT = settings.POSTS_LIMIT
+COMMENTS_LIMIT = settings.COMMENTS_LIMIT
 
 
-def paginate_queryset(request, query):
-    paginator = Paginator(query, POSTS_LIMIT)
-    page_number = request.GET.get('page')
+def paginate_queryset(request, query, ordering=('-pub_date', '-pk')):
+    paginator = CursorPaginator(query, POSTS_LIMIT, ordering=ordering,
+                                prepare=thumbnails.prefetch)
 
-    return paginator.get_page(page_number)
+    return paginator.page_for(request.GET)
 
 
+def paginate_comments(request, post):
+    paginator = CursorPaginator(feeds.post_comments(post), COMMENTS_LIMIT,
+                                ordering=('created', 'pk'))
+
+    return paginator.page_for(request.GET)
+
+
+# Страницы с ETag браузер перепроверяет при каждом показе и получает 304,
+# пока не изменилась ни одна из версий, из которых собран ETag
+revalidate = cache_control(private=True, no_cache=True)
+
+
+def index_etag(request):
+    return feed_etag(request, 'index')
+
+
+def group_etag(request, slug):
+    group_id = Group.objects.filter(slug=slug).values_list(
+        'pk', flat=True).first()
+    if group_id is None:
+        return None
+    return feed_etag(request, 'group', group_id)
+
+
+def profile_etag(request, username):
+    author_id = User.objects.filter(username=username).values_list(
+        'pk', flat=True).first()
+    if author_id is None:
+        return None
+    # От подписок читателя зависит кнопка «Подписаться»
+    depends_on = ([('follow', request.user.pk)]
+                  if request.user.is_authenticated else [])
+    return feed_etag(request, 'profile', author_id, depends_on=depends_on)
+
+
+def post_etag(request, post_id):
+    author_id = Post.objects.filter(pk=post_id).values_list(
+        'author_id', flat=True).first()
+    if author_id is None:
+        return None
+    return feed_etag(request, 'post', post_id,
+                     depends_on=[('profile', author_id)])
+
+
+@revalidate
+@condition(etag_func=index_etag)
 def index(request):
-    posts = Post.objects.select_related('group', 'author')
+    posts = feeds.index_feed()
 
     page_obj = paginate_queryset(request, posts)
 
     context = {
         'page_obj': page_obj,
+        **feed_cache_context(page_obj, 'index'),
     }
 
     return render(request, 'posts/index.html', context)
 
 
+@revalidate
+@condition(etag_func=group_etag)
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    posts = group.posts.select_related('author')
+    posts = feeds.group_feed(group)
 
     page_obj = paginate_queryset(request, posts)
 
     context = {
         'group': group,
         'page_obj': page_obj,
+        **feed_cache_context(page_obj, 'group', group.pk),
     }
 
     return render(request, 'posts/group_list.html', context)
 
 
+@revalidate
+@condition(etag_func=profile_etag)
 def profile(request, username):
-    author = get_object_or_404(User, username=username)
-    posts = author.posts.select_related('group')
-    posts_count = posts.count()
+    author = get_object_or_404(User.objects.select_related('stats'),
+                               username=username)
+    posts = feeds.profile_feed(author)
+    posts_count = AuthorStats.for_user(author).posts_count
 
     page_obj = paginate_queryset(request, posts)
 
-    following = False
-    if request.user.is_authenticated and Follow.objects.filter(
-            user=request.user, author=author):
-        following = True
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author=author).exists()
 
     context = {
         'page_obj': page_obj,
@@ -65,22 +124,67 @@ def profile(request, username):
     return render(request, 'posts/profile.html', context)
 
 
+@revalidate
+@condition(etag_func=post_etag)
 def post_detail(request, post_id):
     form = CommentForm()
-    current_post = get_object_or_404(Post, pk=post_id)
-    posts_count = current_post.author.posts.count()
-    comments = current_post.comments.all()
+    current_post = get_object_or_404(
+        Post.objects.select_related('author__stats', 'group'), pk=post_id)
+    posts_count = AuthorStats.for_user(current_post.author).posts_count
+    comments = paginate_comments(request, current_post)
 
     context = {
         'post': current_post,
         'posts_count': posts_count,
         'form': form,
         'comments': comments,
+        **feed_cache_context(comments, 'post', current_post.pk),
     }
 
     return render(request, 'posts/post_detail.html', context)
 
 
+def post_comments(request, post_id):
+    post = get_object_or_404(Post.objects.only('pk'), pk=post_id)
+    page_obj = paginate_comments(request, post)
+    next_cursor = page_obj.paginator.next_cursor
+
+    return JsonResponse({
+        'comments': [
+            {
+                'id': comment.pk,
+                'author': comment.author.username,
+                'author_url': reverse('posts:profile',
+                                      args=[comment.author.username]),
+                'text': comment.text,
+                'created': comment.created,
+            }
+            for comment in page_obj
+        ],
+        'next': (f'{request.path}?after={next_cursor}'
+                 if next_cursor else None),
+    })
+
+
+def search(request):
+    query = request.GET.get('q', '').strip()
+    page_obj = None
+
+    if query:
+        paginator = CursorPaginator(feeds.search_feed(query), POSTS_LIMIT,
+                                    ordering=('search_rank', '-pk'),
+                                    prepare=thumbnails.prefetch)
+        page_obj = paginator.page_for(request.GET)
+
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+        'page_params': urlencode({'q': query}),
+    }
+
+    return render(request, 'posts/search.html', context)
+
+
 @login_required
 def post_create(request):
     form = PostForm(request.POST or None, files=request.FILES or None)
@@ -88,7 +192,8 @@ def post_create(request):
     if form.is_valid():
         model = form.save(commit=False)
         model.author = request.user
-        model.save()
+        with transaction.atomic():
+            model.save()
 
         return redirect(reverse('posts:profile',
                                 args=[request.user.username]))
@@ -133,19 +238,21 @@ def add_comment(request, post_id):
         comment = form.save(commit=False)
         comment.author = request.user
         comment.post = get_object_or_404(Post, pk=post_id)
-        comment.save()
+        with transaction.atomic():
+            comment.save()
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    posts = Post.objects.filter(
-        author__in=Follow.objects.filter(user=request.user).values('author'))
+    posts = feeds.follow_feed(request.user)
 
-    page_obj = paginate_queryset(request, posts)
+    page_obj = paginate_queryset(request, posts, feeds.FOLLOW_ORDERING)
 
     context = {
         'page_obj': page_obj,
+        **feed_cache_context(page_obj, 'follow', request.user.pk,
+                             depends_on=[('follow', 'merged')]),
     }
     return render(request, 'posts/follow.html', context)
 
@@ -154,15 +261,12 @@ def follow_index(request):
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user != author:
-        Follow.objects.get_or_create(
-            user=request.user,
-            author=author
-        )
+        Follow.objects.follow(request.user, author)
     return redirect(reverse('posts:profile', kwargs={'username': username}))
 
 
 @login_required
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
-    Follow.objects.filter(user=request.user, author=author).delete()
+    Follow.objects.unfollow(request.user, author)
     return redirect(reverse('posts:profile', kwargs={'username': username}))
@@ -0,0 +1,13 @@
+"""Запуск процессов пула миниатюр.
+
+Модуль не импортирует моделей, поэтому процесс загружает его до
+``django.setup``.
+"""
+import django
+from django.conf import settings
+
+
+def setup(media_root):
+    # Каталог картинок берётся у сервера: в тестах он временный
+    settings.MEDIA_ROOT = media_root
+    django.setup()
@@ -0,0 +1,19 @@
+"""
+ASGI config for yatube project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+for example ``uvicorn yatube.asgi:application``.
+
+Django 2.2 has no ASGI support of its own, so requests are served by the
+regular WSGI handler in a bounded thread pool, see ``core.asgi``.
+"""
+
+import os
+
+from django.core.wsgi import get_wsgi_application
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'yatube.settings')
+
+from core.asgi import ASGIHandler  # noqa: E402
+
+application = ASGIHandler(get_wsgi_application())
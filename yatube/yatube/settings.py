@@ -18,6 +18,7 @@ INSTALLED_APPS = [
     'core.apps.CoreConfig',
     'users.apps.UsersConfig',
     'posts.apps.PostsConfig',
+    'api.apps.ApiConfig',
     'django.contrib.admin',
     'django.contrib.auth',
     'django.contrib.contenttypes',
@@ -29,6 +30,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -42,7 +45,7 @@ ROOT_URLCONF = 'yatube.urls'
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'core.template_backends.MeteredDjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -61,11 +64,31 @@ WSGI_APPLICATION = 'yatube.wsgi.application'
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # Обёртка над django.db.backends.sqlite3 с пулом и проверкой
+        # соединений (core.db.backends)
+        'ENGINE': 'core.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Сколько секунд соединение живёт между запросами; 0 — закрывать
+        # после каждого запроса
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', 60)),
+        # Проверять сохранённое соединение перед первым обращением к базе
+        # в запросе (core.db.health)
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Пул соединений, общий для потоков процесса (core.db.pool); 0 — у каждого
+# потока своё соединение
+DB_POOL_SIZE = int(os.getenv('DB_POOL_SIZE', 0))
+
+if DB_POOL_SIZE:
+    DATABASES['default'].update(
+        # Соединение возвращается в пул в конце каждого запроса
+        CONN_MAX_AGE=0,
+        POOL_SIZE=DB_POOL_SIZE,
+        POOL_TIMEOUT=float(os.getenv('DB_POOL_TIMEOUT', 10)),
+    )
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -101,6 +124,12 @@ STATICFILES_DIRS = (os.path.join(BASE_DIR, 'static'),)
 
 POSTS_LIMIT = 10
 
+COMMENTS_LIMIT = 20
+
+# Бэкенд полнотекстового поиска; пустой — по базе: FTS5 на SQLite,
+# 'posts.search.SimpleBackend' на остальных
+SEARCH_BACKEND = os.getenv('SEARCH_BACKEND', '')
+
 
 LOGIN_URL = 'users:login'
 
@@ -116,9 +145,79 @@ CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Ограничения загружаемых картинок; картинки больше IMAGE_MAX_SIDE по
+# длинной стороне уменьшаются при загрузке
+IMAGE_MAX_BYTES = 20 * 2 ** 20
+IMAGE_MAX_PIXELS = 40 * 10 ** 6
+IMAGE_MAX_SIDE = 2560
+
+# Хранилище sorl: промахи кешируются только на THUMBNAIL_MISS_TIMEOUT секунд,
+# чтобы миниатюру, созданную одним процессом, вскоре увидели остальные
+THUMBNAIL_KVSTORE = 'posts.kvstore.KVStore'
+THUMBNAIL_MISS_TIMEOUT = 10
+
+# Процессы, создающие миниатюры в фоне; 0 — создавать их сразу. Тесты
+# выключают пул (core.testing.TestRunner и conftest.py)
+THUMBNAIL_WORKERS = int(os.getenv('THUMBNAIL_WORKERS', 2))
+
+TEST_RUNNER = 'core.testing.TestRunner'
+
+# Потоки, в которых yatube.asgi выполняет представления; столько же
+# соединений с базой может быть открыто одновременно
+ASGI_THREADS = int(os.getenv('ASGI_THREADS', 8))
+# Сколько кусков ответа поток отдаёт медленному клиенту, не дожидаясь его
+ASGI_RESPONSE_BUFFER = 16
+
 
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
     }
 }
+
+# Общий кеш для всех воркеров, например redis://localhost:6379/0.
+# Перед ним ставится локальный LRU каждого процесса.
+CACHE_URL = os.getenv('CACHE_URL')
+
+if CACHE_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache.TieredCache',
+            'OPTIONS': {
+                'SHARED': 'shared',
+                'LOCAL_MAX_ENTRIES': 1000,
+                'LOCAL_TIMEOUT': 60,
+                'SHARED_ONLY_PREFIXES': ('feed-version:',),
+            },
+        },
+        'shared': {
+            'BACKEND': 'core.cache.RedisCache',
+            'LOCATION': CACHE_URL,
+        },
+    }
+
+# Чтения из кеша по умолчанию считаются в метриках запроса (core.metrics)
+CACHES['metered'] = CACHES['default']
+CACHES['default'] = {
+    'BACKEND': 'core.cache.MeteredCache',
+    'OPTIONS': {'CACHE': 'metered'},
+}
+
+# Токен сборщика метрик: /metrics доступны сотрудникам и запросам с
+# заголовком «Authorization: Bearer <токен>»; пустой — только сотрудникам
+METRICS_TOKEN = os.getenv('METRICS_TOKEN', '')
+
+# Максимальная длина материализованной ленты подписок одного пользователя;
+# более старые записи из ленты вытесняются.
+TIMELINE_LENGTH = 1000
+
+# Записи авторов, у которых больше подписчиков, не раскладываются по лентам
+# при публикации, а подмешиваются в ленту подписок при чтении.
+FANOUT_FOLLOWER_THRESHOLD = 5000
+# Обратно к раскладке по лентам автор переходит, только когда подписчиков
+# становится не больше этого порога.
+FANOUT_RESUME_THRESHOLD = 4000
+
+# Время жизни фрагментов лент в кеше, секунды. Фрагменты инвалидируются
+# сигналами при изменении записей, так что срок ограничивает только память.
+FEED_CACHE_TIMEOUT = 300